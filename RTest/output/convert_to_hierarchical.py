@@ -33,6 +33,8 @@ def convert_to_hierarchical(input_file, output_file):
         
         # Initialize hierarchical structure
         hierarchical_data = {"genes": {}}
+        # (gene, transcript) -> exon IDs already added, so the check below is O(1)
+        seen_exons = defaultdict(set)
         
         # Process each repeat
         for repeat in repeats_flat:
@@ -108,9 +110,10 @@ def convert_to_hierarchical(input_file, output_file):
                         exon_id = exon.get("exon_id", "")
                         if exon_id:
                             # Check if this exon is already in the transcript
-                            exon_exists = any(e.get("exon_id") == exon_id for e in gene["transcripts"][transcript_id]["exons"])
+                            transcript_exons = seen_exons[(gene_name, transcript_id)]
                             
-                            if not exon_exists:
+                            if exon_id not in transcript_exons:
+                                transcript_exons.add(exon_id)
                                 # Add exon without overlap information
                                 exon_entry = {
                                     "exon_number": exon.get("exon_number", 0),
@@ -1,56 +1,195 @@
-import json
+#!/usr/bin/env python3
+"""
+Merge the N-M_annotated_repeats.json chunks of a run into one file.
+
+The chunks are streamed (json_stream.iter_json_array) and their entries
+written straight to the output, so neither a chunk nor the merged result is
+ever held in memory. Chunks are merged in the order of the ranges in their
+file names, and the ranges are checked for gaps and overlaps first.
+
+With --dedup, repeats that occur in more than one chunk are written once.
+They are recognised by their natural key (DEDUP_KEY), of which only an
+8-byte hash is kept per repeat.
+
+Usage:
+    python RTest/output/merge_json.py [directory] [-o output.json] [--format json|jsonl] [--dedup] [--strict]
+"""
 import os
-import glob
 import re
+import sys
+import json
+import glob
+import hashlib
+import argparse
 
-def merge_json_files(directory_path, output_filename):
-    # Get all JSON files in the directory
-    json_files = glob.glob(os.path.join(directory_path, '*_annotated_repeats.json'))
-    
-    # Sort files based on the numerical range they contain
-    def get_start_number(file_path):
-        filename = os.path.basename(file_path)
-        # Extract numbers from the filename using regex
-        match = re.search(r'(\d+)-\d+_', filename)
-        if match:
-            return int(match.group(1))
-        return 0  # Default value if no match is found
-    
-    json_files.sort(key=get_start_number)  # Sort files by numerical order
-    
-    # Initialize an empty list or dict to store the merged data
-    merged_data = None
-    
-    # Process each file
-    for file_path in json_files:
-        with open(file_path, 'r') as file:
-            try:
-                data = json.load(file)
-                print(f"Processing {os.path.basename(file_path)}...")
-                
-                # Initialize merged_data based on the first file
-                if merged_data is None:
-                    merged_data = [] if isinstance(data, list) else {}
-                
-                # Merge data appropriately based on type
-                if isinstance(data, list) and isinstance(merged_data, list):
-                    merged_data.extend(data)
-                elif isinstance(data, dict) and isinstance(merged_data, dict):
-                    merged_data.update(data)
-                else:
-                    print(f"Warning: Data structure mismatch in {file_path}")
-            except json.JSONDecodeError:
-                print(f"Error: Could not parse JSON from {file_path}")
-    
-    # Write the merged data to a new file
-    if merged_data is not None:
-        output_path = os.path.join(directory_path, output_filename)
-        with open(output_path, 'w') as output_file:
-            json.dump(merged_data, output_file, indent=2)
-        print(f"Merged JSON saved to {output_path}")
-    else:
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(project_root, "scripts"))
+from json_stream import iter_json_array, NotAJsonArray
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "canonical_v2")
+DEFAULT_OUTPUT = "v2_all_cannonical_repeats_annotated.json"
+CHUNK_PATTERN = "*_annotated_repeats.json"
+
+# Fields identifying a repeat across chunks
+DEDUP_KEY = ("uniProtId", "repeatType", "position", "chrom", "chromStart", "chromEnd", "strand")
+
+COMPACT = (",", ":")
+
+def chunk_range(file_path):
+    """(start, end) from an N-M_ file name, or None"""
+    match = re.search(r'(\d+)-(\d+)_', os.path.basename(file_path))
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return None
+
+def find_chunks(directory_path, pattern=CHUNK_PATTERN):
+    """Chunk files of a directory, sorted by the start of their range"""
+    json_files = glob.glob(os.path.join(directory_path, pattern))
+    json_files.sort(key=lambda path: (chunk_range(path) or (0, 0), path))
+    return json_files
+
+def check_ranges(json_files):
+    """Problems with the chunk ranges, as a list of messages
+
+    Reports files without a range, a first chunk not starting at 1, and gaps
+    and overlaps between consecutive chunks.
+    """
+    problems = []
+    previous = None
+    for path in json_files:
+        name = os.path.basename(path)
+        file_range = chunk_range(path)
+        if file_range is None:
+            problems.append(f"{name}: no N-M_ range in the file name")
+            continue
+        start, end = file_range
+        if end < start:
+            problems.append(f"{name}: range ends before it starts")
+        if previous is None:
+            if start > 1:
+                problems.append(f"gap: 1-{start - 1} before {name}")
+        else:
+            previous_name, previous_end = previous
+            if start > previous_end + 1:
+                problems.append(f"gap: {previous_end + 1}-{start - 1} between {previous_name} and {name}")
+            elif start <= previous_end:
+                problems.append(f"overlap: {start}-{min(end, previous_end)} in {previous_name} and {name}")
+        if previous is None or end > previous[1]:
+            previous = (name, end)
+    return problems
+
+def repeat_key_hash(entry):
+    """8-byte hash of a repeat's natural key"""
+    key = json.dumps([entry.get(field) for field in DEDUP_KEY], separators=COMPACT)
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+class MergeWriter:
+    """Writes entries as one compact JSON array or as JSON Lines"""
+
+    def __init__(self, f, output_format):
+        self.f = f
+        self.jsonl = output_format == "jsonl"
+        self.count = 0
+        if not self.jsonl:
+            f.write("[")
+
+    def write(self, entry):
+        if self.jsonl:
+            self.f.write(json.dumps(entry, separators=COMPACT))
+            self.f.write("\n")
+        else:
+            if self.count:
+                self.f.write(",\n")
+            self.f.write(json.dumps(entry, separators=COMPACT))
+        self.count += 1
+
+    def close(self):
+        if not self.jsonl:
+            self.f.write("]\n")
+
+def merge_json_files(directory_path, output_filename, output_format="json", dedup=False, strict=False):
+    """Stream the chunk files of a directory into one output file
+
+    Returns a dict of counts, or None if the ranges are invalid and strict
+    is set. A chunk that is not a valid JSON array is reported and left out
+    entirely; the output is only put in place once it is complete.
+    """
+    output_path = os.path.join(directory_path, output_filename)
+    json_files = [path for path in find_chunks(directory_path)
+                  if os.path.abspath(path) != os.path.abspath(output_path)]
+    if not json_files:
         print("No valid data found to merge")
+        return None
+
+    problems = check_ranges(json_files)
+    for problem in problems:
+        print(f"Warning: {problem}")
+    if problems and strict:
+        print("Error: chunk ranges are not contiguous, nothing merged (drop --strict to merge anyway)")
+        return None
+
+    seen = set() if dedup else None
+    stats = {"files": 0, "skipped_files": 0, "entries": 0, "duplicates": 0}
+    tmp_path = f"{output_path}.part"
+    try:
+        with open(tmp_path, "w") as f:
+            writer = MergeWriter(f, output_format)
+            for file_path in json_files:
+                print(f"Processing {os.path.basename(file_path)}...")
+                # Where this chunk starts, to take it back out if it turns out invalid
+                position, count, added = f.tell(), writer.count, []
+                duplicates = 0
+                try:
+                    for entry in iter_json_array(file_path):
+                        if seen is not None:
+                            key = repeat_key_hash(entry)
+                            if key in seen:
+                                duplicates += 1
+                                continue
+                            seen.add(key)
+                            added.append(key)
+                        writer.write(entry)
+                except (json.JSONDecodeError, NotAJsonArray) as e:
+                    print(f"Error: Could not parse JSON array from {file_path}: {e}")
+                    f.seek(position)
+                    f.truncate()
+                    writer.count = count
+                    if seen is not None:
+                        seen.difference_update(added)
+                    stats["skipped_files"] += 1
+                    continue
+                stats["files"] += 1
+                stats["duplicates"] += duplicates
+            writer.close()
+            stats["entries"] = writer.count
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    print(f"Merged {stats['entries']} entries from {stats['files']} files into {output_path}"
+          + (f" ({stats['duplicates']} duplicates dropped)" if dedup else ""))
+    if stats["skipped_files"]:
+        print(f"Warning: {stats['skipped_files']} file(s) could not be read and were left out")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge *_annotated_repeats.json chunks into one file.")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_DIRECTORY,
+                        help="Directory with the chunk files (default: canonical_v2 next to this script)")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"Output file name in that directory (default {DEFAULT_OUTPUT})")
+    parser.add_argument("--format", choices=["json", "jsonl"], default="json",
+                        help="Compact JSON array (default) or JSON Lines")
+    parser.add_argument("--dedup", action="store_true", help="Write repeats found in several chunks once")
+    parser.add_argument("--strict", action="store_true", help="Merge nothing if the chunk ranges have gaps or overlaps")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: {args.directory} is not a directory")
+        sys.exit(1)
+    if merge_json_files(args.directory, args.output, args.format, args.dedup, args.strict) is None:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    directory = "/home/dogdorgesh/Documents/Github/Tandem-Repeat-Domain-Database/RTest/output/canonical_v2"
-    merge_json_files(directory, "v2_all_cannonical_repeats_annotated.json")
\ No newline at end of file
+    main()
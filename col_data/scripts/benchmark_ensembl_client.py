@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark Ensembl REST request latency against a local HTTPS stand-in.
+
+Starts an HTTPS server on localhost (self-signed certificate made with the
+openssl command) that answers every GET with an overlap-sized JSON payload,
+and times the same sequence of requests made two ways: a bare requests.get
+per call, as exon_info.py used to do, and EnsemblRestClient's pooled
+keep-alive session. The server counts the connections it accepted and the
+bytes it sent, which shows how many TCP and TLS handshakes each way costs.
+
+Usage:
+    python col_data/scripts/benchmark_ensembl_client.py [--requests 200] [--payload-items 40]
+"""
+import os
+import ssl
+import sys
+import json
+import gzip
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from exon_info import EnsemblRestClient
+
+class StandInStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.bytes_sent = 0
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.bytes_sent = 0
+
+def make_handler(payload, stats):
+    body = json.dumps(payload).encode()
+    gzipped = gzip.compress(body)
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep connections open between requests
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def setup(self):
+            super().setup()
+            with stats.lock:
+                stats.connections += 1
+
+        def do_GET(self):
+            data = body
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                data = gzipped
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            with stats.lock:
+                stats.bytes_sent += len(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+def make_certificate(directory):
+    """Self-signed certificate for localhost; returns (cert path, key path)"""
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+         "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+def start_server(payload, stats, cert, key):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(payload, stats))
+    httpd.daemon_threads = True
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def sample_payload(items):
+    """A list of transcript-like features, the size of a typical overlap response"""
+    return [
+        {
+            "id": f"ENST{i:011d}", "Parent": "ENSG00000000001", "feature_type": "transcript",
+            "biotype": "protein_coding", "start": 1000000 + i * 100, "end": 1050000 + i * 100,
+            "strand": 1, "seq_region_name": "1", "source": "ensembl_havana", "version": 5,
+            "external_name": f"GENE-{200 + i}", "transcript_support_level": "1",
+            "tag": ["basic", "Ensembl_canonical"] if i == 0 else ["basic"],
+            "description": "example gene [Source:HGNC Symbol;Acc:HGNC:00000]",
+            "assembly_name": "GRCh38", "logic_name": "ensembl_havana_transcript_homo_sapiens",
+        }
+        for i in range(items)
+    ]
+
+def timed(fn, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def print_result(label, latencies, stats):
+    latencies = sorted(latencies)
+    print(f"{label:<34} mean {statistics.mean(latencies) * 1000:6.2f} ms  "
+          f"p50 {statistics.median(latencies) * 1000:6.2f} ms  "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))] * 1000:6.2f} ms  "
+          f"connections {stats.connections:4d}  sent {stats.bytes_sent / 1e6:6.2f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request latency of bare requests.get and the pooled client.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per variant (default 200)")
+    parser.add_argument("--payload-items", type=int, default=40, help="Features in each response (default 40)")
+    args = parser.parse_args()
+
+    stats = StandInStats()
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = make_certificate(directory)
+        httpd = start_server(sample_payload(args.payload_items), stats, cert, key)
+        server = f"https://127.0.0.1:{httpd.server_address[1]}"
+        endpoint = "/overlap/region/human/1:1000000-1001000"
+        try:
+            print(f"\n{args.requests} sequential requests, {args.payload_items} features per response\n")
+
+            # A bare requests.get per call, as before
+            stats.reset()
+            latencies = timed(lambda: requests.get(
+                server + endpoint, headers={"Content-Type": "application/json"},
+                params={"feature": "transcript"}, timeout=15, verify=cert
+            ).json(), args.requests)
+            print_result("requests.get per call", latencies, stats)
+
+            # The shared pooled client (its own rate limit lifted, to time the transport only)
+            stats.reset()
+            client = EnsemblRestClient(server=server, reqs_per_sec=10 ** 9)
+            client.session.verify = cert
+            client.session.trust_env = False  # else REQUESTS_CA_BUNDLE would replace the stand-in's certificate
+            latencies = timed(lambda: client.perform_rest_action(endpoint, params={"feature": "transcript"}), args.requests)
+            print_result("EnsemblRestClient, pooled session", latencies, stats)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,21 @@
-import json
-from collections import defaultdict
 import os
+import sys
 
-def check_multiple_proteins(json_file_path):
-    # Read the JSON data
-    with open(json_file_path, 'r') as file:
-        repeats_data = json.load(file)
-
-    # Create a dictionary to map gene names to UniProt IDs
-    gene_to_uniprot = defaultdict(set)
+# The check is the multi_protein_genes metric of scripts/qc_report.py, which
+# also runs it together with the other dataset QC metrics in one pass
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(project_root, "scripts"))
+from json_stream import iter_json_array
+from qc_report import MultiProteinGeneMetric
 
-    # Populate the dictionary
-    for repeat in repeats_data:
-        # Skip entries that don't have both geneName and uniProtId fields
-        if "geneName" in repeat and "uniProtId" in repeat:
-            # Skip empty gene names
-            if repeat["geneName"]:
-                gene_to_uniprot[repeat["geneName"]].add(repeat["uniProtId"])
+def check_multiple_proteins(json_file_path):
+    # Stream the JSON data, mapping gene names to UniProt IDs
+    metric = MultiProteinGeneMetric()
+    for repeat in iter_json_array(json_file_path):
+        metric.observe(repeat)
 
     # Find genes with multiple UniProt IDs
-    multi_protein_genes = {gene: uniprot_ids for gene, uniprot_ids in gene_to_uniprot.items() 
-                        if len(uniprot_ids) > 1}
+    multi_protein_genes = metric.multi_protein_genes()
 
     # Print the results
     print(f"Found {len(multi_protein_genes)} genes associated with multiple proteins:")
@@ -30,8 +25,8 @@ def check_multiple_proteins(json_file_path):
     return multi_protein_genes
 
 if __name__ == "__main__":
-    # Path to the data file
-    file_path = r"c:\Users\ojfab\Documents\GitHub\Tandem-Repeat-Domain-Database\merge_test_small\data\gname_hg38_repeats.json"
+    # Path to the data file, and the directory for the results (default: next to the data)
+    file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(project_root, "data", "gname_hg38_repeats.json")
     
     if not os.path.exists(file_path):
         print(f"Error: File not found at {file_path}")
@@ -39,7 +34,7 @@ if __name__ == "__main__":
         multi_protein_genes = check_multiple_proteins(file_path)
         
         # Save results to a file
-        output_dir = r"c:\Users\ojfab\Documents\GitHub\Tandem-Repeat-Domain-Database\merge_test_small\data"
+        output_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(os.path.abspath(file_path))
         os.makedirs(output_dir, exist_ok=True)
         output_file = os.path.join(output_dir, "multi_protein_genes.txt")
         
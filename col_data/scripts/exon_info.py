@@ -1,18 +1,27 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import time
 from tqdm import tqdm
 import os
 import sys
 import logging
+import threading
 import datetime
 import pickle
 from pathlib import Path
+from collections import OrderedDict
 
 # First, determine project root directory
 script_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(script_dir)
 
+# Repeat types are cleaned with the shared rules table (scripts/repeat_type_rules.json)
+sys.path.insert(0, os.path.join(os.path.dirname(project_root), "scripts"))
+from normalize_repeat_types import clean_repeat_type
+from repeat_analytics import MIN_REPEATS
+from single_flight import SingleFlight
+
 # Create logs directory if it doesn't exist
 logs_dir = os.path.join(project_root, "logs")
 os.makedirs(logs_dir, exist_ok=True)
@@ -134,15 +143,132 @@ class PersistentCache:
             "memory_cache_size": len(self.memory_cache)
         }
 
+# Connection pool of the shared HTTP session: pools kept per host, and
+# connections kept open per pool (enough for concurrent callers to reuse)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    """
+    requests.Session with keep-alive connection pooling and compressed transfer.
+    
+    Connections (and their TLS sessions) are reused across requests instead of
+    being opened per call. Retries are left to EnsemblRestClient.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+# Self-imposed request rate (requests per second). Ensembl allows 15/s for
+# anonymous clients; the limiter starts there and backs off when told to.
+MAX_REQS_PER_SEC = 15
+MIN_REQS_PER_SEC = 0.5
+# Attempts per request when the server answers 429 Too Many Requests
+MAX_RATE_LIMIT_RETRIES = 5
+
+class RateLimiter:
+    """
+    Token bucket shared by every client in the process, with an adaptive rate.
+    
+    The rate is adjusted AIMD-style from the X-RateLimit-Remaining/Reset
+    headers Ensembl sends with each response: it is raised additively while
+    the remaining budget would last until the reset, halved when it would
+    not, and requests are held back entirely when the budget is used up or
+    the server answers 429.
+    """
+    def __init__(self, max_rate=MAX_REQS_PER_SEC, min_rate=MIN_REQS_PER_SEC, increase=0.5, decrease=0.5):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.rate = max_rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+    
+    def _refill(self, now):
+        # At most one second's worth of requests can be sent in a burst
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self):
+        """Block until a request may be sent; returns the time waited in seconds"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait_time = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+    
+    def pause(self, seconds):
+        """Send nothing for the given number of seconds"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+    
+    def _set_rate(self, rate):
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+    
+    def update(self, headers):
+        """Adapt the rate to the X-RateLimit headers of a response"""
+        try:
+            remaining = float(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if remaining <= 0:
+            self.pause(reset)
+            return
+        with self.lock:
+            # The rate the remaining budget affords until the period resets
+            affordable = remaining / reset if reset > 0 else self.max_rate
+            if affordable < self.rate:
+                self._set_rate(max(self.rate * self.decrease, affordable))
+            elif self.rate < self.max_rate:
+                self._set_rate(self.rate + self.increase)
+    
+    def throttled(self, retry_after):
+        """The server answered 429: back off multiplicatively and pause"""
+        with self.lock:
+            self._set_rate(self.rate * self.decrease)
+        self.pause(retry_after)
+
+# One limiter for the whole process, whichever client sends the request
+ensembl_rate_limiter = RateLimiter()
+
 class EnsemblRestClient(object):
     """
     Client for the Ensembl REST API with proper rate limiting
+    
+    All requests go through one pooled keep-alive session, so a single client
+    should be shared for the whole run (see ensembl_client below). Clients
+    share the process-wide rate limiter unless given their own.
     """
-    def __init__(self, server='https://rest.ensembl.org', reqs_per_sec=15):
+    def __init__(self, server='https://rest.ensembl.org', reqs_per_sec=None, session=None, rate_limiter=None):
         self.server = server
-        self.reqs_per_sec = reqs_per_sec
-        self.req_count = 0
-        self.last_req = 0
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(max_rate=reqs_per_sec) if reqs_per_sec else ensembl_rate_limiter
+        self.rate_limiter = rate_limiter
+        self.session = session if session is not None else create_session()
 
     def perform_rest_action(self, endpoint, hdrs=None, params=None):
         if hdrs is None:
@@ -154,153 +280,582 @@ class EnsemblRestClient(object):
         # Build URL with parameters
         url = self.server + endpoint
         
-        data = None
-
-        # Check if we need to rate limit ourselves
-        if self.req_count >= self.reqs_per_sec:
-            delta = time.time() - self.last_req
-            if delta < 1:
-                wait_time = 1 - delta
+        for attempt in range(1, MAX_RATE_LIMIT_RETRIES + 1):
+            # Wait for our own rate limit
+            waited = self.rate_limiter.acquire()
+            if waited >= 1:
                 api_stats["rate_limits"] += 1
-                logging.info(f"Rate limited: waiting {wait_time:.2f}s before requesting {endpoint}")
-                time.sleep(wait_time)
-            self.last_req = time.time()
-            self.req_count = 0
-        
-        try:
-            # Log the request
-            api_stats["requests"] += 1
-            logging.debug(f"API request: {endpoint}")
-            
-            # Use requests instead of urllib for consistency with the rest of your code
-            response = requests.get(url, headers=hdrs, params=params, timeout=15)
+                logging.info(f"Rate limited: waited {waited:.2f}s before requesting {endpoint}")
             
-            if response.status_code == 200:
-                data = response.json()
-                self.req_count += 1
+            try:
+                # Log the request
+                api_stats["requests"] += 1
+                logging.debug(f"API request: {endpoint}")
+                
+                response = self.session.get(url, headers=hdrs, params=params, timeout=15)
+                self.rate_limiter.update(response.headers)
                 
-            # Check if we are being rate limited by the server
-            elif response.status_code == 429:
-                if 'Retry-After' in response.headers:
-                    retry = response.headers['Retry-After']
+                if response.status_code == 200:
+                    return response.json()
+                
+                # Check if we are being rate limited by the server
+                if response.status_code == 429:
+                    retry = response.headers.get('Retry-After') or response.headers.get('X-RateLimit-Reset') or 1
                     api_stats["rate_limits"] += 1
-                    logging.warning(f"Server rate limit hit: waiting {retry}s before retrying {endpoint}")
-                    time.sleep(float(retry))
-                    return self.perform_rest_action(endpoint, hdrs, params)
-            else:
+                    logging.warning(f"Server rate limit hit: waiting {retry}s before retrying {endpoint} "
+                                    f"(attempt {attempt}/{MAX_RATE_LIMIT_RETRIES})")
+                    self.rate_limiter.throttled(float(retry))
+                    continue
+                
                 api_stats["errors"] += 1
                 logging.error(f"Request failed: {endpoint} (Status {response.status_code})")
-                
+                return None
+                    
+            except Exception as e:
+                api_stats["errors"] += 1
+                logging.error(f"Request error: {endpoint} - {str(e)}")
+                return None
+        
+        api_stats["errors"] += 1
+        logging.error(f"Request failed: {endpoint} (still rate limited after {MAX_RATE_LIMIT_RETRIES} attempts)")
+        return None
+
+# Version of the cached region format; older entries are migrated when read.
+# 2: projected regions (project_region), 3: transcript details moved to the
+# transcript store, regions keep their versioned IDs
+CACHE_FORMAT = 3
+
+# Fields kept from each kind of Ensembl record; everything else is dropped
+# before caching. Coordinates (start/end) are ints, strand is 1 or -1,
+# phases are 0-2 or -1 for non-coding.
+TRANSCRIPT_FIELDS = ("id", "Parent", "display_name", "biotype", "version", "strand", "is_canonical", "Tags")
+EXON_FIELDS = ("id",)
+OVERLAP_EXON_FIELDS = ("id", "ensembl_phase", "ensembl_end_phase")
+
+def project_fields(record, fields, offset):
+    """
+    Copy of record with only the given fields and its coordinates.
+    
+    start is shifted by offset: 1 turns Ensembl's 1-based starts into the
+    0-based starts used here, 0 keeps records that are converted already.
+    """
+    projected = {field: record[field] for field in fields if field in record}
+    if "start" in record:
+        projected["start"] = int(record["start"]) - offset
+    if "end" in record:
+        projected["end"] = int(record["end"])
+    return projected
+
+def translation_length(transcript, offset=1):
+    """
+    Protein length of a transcript: its coding bases (the parts of its exons
+    within the translation's bounds) // 3.
+    
+    Computed the same way for /lookup/id results and for transcripts built
+    from a window's features, so their lengths compare. Without exons, the
+    length Ensembl reports (or a projected seq_length) is used.
+    """
+    translation = transcript["Translation"]
+    exons = transcript.get("Exon")
+    if exons and "start" in translation and "end" in translation:
+        cds_start = int(translation["start"]) - offset
+        cds_end = int(translation["end"])
+        coding = sum(
+            max(0, min(int(exon["end"]), cds_end) - max(int(exon["start"]) - offset, cds_start))
+            for exon in exons
+        )
+        return coding // 3
+    return translation.get("seq_length", translation.get("length", 0))
+
+def project_transcript(transcript, offset=1):
+    """
+    Fields of a transcript (/lookup/id or overlap) that annotation uses.
+    
+    Exons keep their id and coordinates, the translation its CDS bounds and
+    its protein length (translation_length; the sequence itself is dropped).
+    """
+    projected = project_fields(transcript, TRANSCRIPT_FIELDS, offset)
+    if "Exon" in transcript:
+        projected["Exon"] = [project_fields(exon, EXON_FIELDS, offset) for exon in transcript["Exon"]]
+    translation = transcript.get("Translation")
+    if translation:
+        projected["Translation"] = project_fields(translation, ("id",), offset)
+        projected["Translation"]["seq_length"] = translation_length(transcript, offset)
+    return projected
+
+def project_region(region, offset=1):
+    """Projected copy of a region result (transcripts, exons, transcript_details)"""
+    return {
+        "transcripts": [project_transcript(t, offset) for t in region.get("transcripts", [])],
+        "exons": [project_fields(e, OVERLAP_EXON_FIELDS, offset) for e in region.get("exons", [])],
+        "transcript_details": {
+            transcript_id: project_transcript(detail, offset)
+            for transcript_id, detail in region.get("transcript_details", {}).items()
+        }
+    }
+
+def versioned_id(transcript):
+    """ENST00000338591.8, or the bare ID if the version is unknown"""
+    if transcript.get("version") is not None:
+        return f"{transcript['id']}.{transcript['version']}"
+    return transcript["id"]
+
+# After the api_stats declaration, initialize the persistent cache. Regions
+# hold the versioned IDs of their transcripts; the transcript documents are
+# stored once each, so a transcript overlapped by many repeats is kept once.
+ensembl_cache = PersistentCache()
+transcript_store = PersistentCache(Path(project_root) / "cache" / "ensembl_transcripts")
+
+def split_region(region):
+    """Cache entry for a region result: transcript details go to the transcript store"""
+    transcript_keys = {}
+    for transcript_id, detail in region["transcript_details"].items():
+        key = versioned_id(detail)
+        if not transcript_store.contains(key):
+            transcript_store.set(key, detail)
+        transcript_keys[transcript_id] = key
+    return {
+        "format": CACHE_FORMAT,
+        "transcripts": region["transcripts"],
+        "exons": region["exons"],
+        "transcript_keys": transcript_keys
+    }
+
+def join_region(entry):
+    """Region result from a cache entry and the transcript store; None if a transcript is missing"""
+    transcript_details = {}
+    for transcript_id, key in entry["transcript_keys"].items():
+        detail = transcript_store.get(key)
+        if detail is None:
+            return None
+        transcript_details[transcript_id] = detail
+    return {"transcripts": entry["transcripts"], "exons": entry["exons"], "transcript_details": transcript_details}
+
+def migrate_cached_region(entry):
+    """Cache entry in the current format; entries cached before projection are 0-based already"""
+    if entry.get("format") == CACHE_FORMAT:
+        return entry
+    return split_region(project_region(entry, offset=0))
+
+def migrate_cache(cache=None):
+    """
+    Rewrite every cached region still in an older format; returns (migrated, total).
+    
+    Entries are also migrated one by one when read, this does all at once.
+    """
+    cache = cache or ensembl_cache
+    migrated = 0
+    cache_files = sorted(cache.cache_dir.glob("*.pkl"))
+    for cache_path in tqdm(cache_files, desc="Migrating cache"):
+        try:
+            with open(cache_path, 'rb') as f:
+                entry = pickle.load(f)
         except Exception as e:
-            api_stats["errors"] += 1
-            logging.error(f"Request error: {endpoint} - {str(e)}")
-            
-        return data
+            logging.warning(f"Failed to load cache file {cache_path}: {e}")
+            continue
+        if not isinstance(entry, dict) or entry.get("format") == CACHE_FORMAT:
+            continue
+        tmp_path = cache_path.with_suffix(".part")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(migrate_cached_region(entry), f)
+        os.replace(tmp_path, cache_path)
+        migrated += 1
+    cache.memory_cache.clear()
+    return migrated, len(cache_files)
+
+# One client (and connection pool) for the whole run
+ensembl_client = EnsemblRestClient()
+
+# Region fetches that failed, waiting to be retried, and those given up on
+RETRY_QUEUE_FILE = os.path.join(project_root, "cache", "ensembl_retry_queue.json")
+DEAD_LETTER_FILE = os.path.join(project_root, "cache", "ensembl_dead_letter.jsonl")
+# Regions --plan found missing from the cache, for --prefetch
+PREFETCH_FILE = os.path.join(project_root, "cache", "ensembl_prefetch.jsonl")
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2  # seconds, doubled after every failed attempt
+RETRY_MAX_DELAY = 300
+
+class EnsemblFetchError(Exception):
+    """A region could not be fetched completely from Ensembl"""
+
+def region_key(chrom, start, end):
+    """Key of a region in the cache and the retry queue, e.g. 1:1000-2000"""
+    return f"{chrom.replace('chr', '')}:{start}-{end}"
+
+class TranscriptFilter:
+    """
+    Which of the transcripts overlapping a region are kept.
+    
+    Applied to the overlap results, before any transcript details are built
+    or looked up, so dropped transcripts cost nothing. strand is 1, -1 or
+    None (both), biotypes a collection of Ensembl biotypes or None (all).
+    """
+    def __init__(self, strand=None, biotypes=None, canonical_only=False):
+        self.strand = strand
+        self.biotypes = tuple(sorted(set(biotypes))) if biotypes else None
+        self.canonical_only = canonical_only
+    
+    def for_strand(self, strand):
+        """The same filter for another strand"""
+        return TranscriptFilter(strand, self.biotypes, self.canonical_only)
+    
+    def is_active(self):
+        return self.strand is not None or self.biotypes is not None or self.canonical_only
+    
+    def key(self):
+        """Suffix of the cache key, e.g. ;strand=-1;biotype=protein_coding;canonical ("" when inactive)"""
+        key = ""
+        if self.strand is not None:
+            key += f";strand={self.strand}"
+        if self.biotypes is not None:
+            key += f";biotype={','.join(self.biotypes)}"
+        if self.canonical_only:
+            key += ";canonical"
+        return key
+    
+    def keeps(self, transcript):
+        if self.strand is not None and transcript.get("strand") != self.strand:
+            return False
+        if self.biotypes is not None and transcript.get("biotype") not in self.biotypes:
+            return False
+        if self.canonical_only and transcript.get("is_canonical", 0) != 1:
+            return False
+        return True
+    
+    def apply(self, region):
+        """A region result with only the kept transcripts"""
+        transcripts = [t for t in region["transcripts"] if self.keeps(t)]
+        kept = {t["id"] for t in transcripts}
+        return {
+            "transcripts": transcripts,
+            "exons": region["exons"],
+            "transcript_details": {
+                transcript_id: detail for transcript_id, detail in region["transcript_details"].items()
+                if transcript_id in kept
+            }
+        }
+    
+    def to_dict(self):
+        return {"strand": self.strand, "biotypes": self.biotypes, "canonical_only": self.canonical_only}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data) if data else cls()
+
+NO_FILTER = TranscriptFilter()
 
-def convert_to_zero_based(data):
+class RetryQueue:
     """
-    Convert Ensembl 1-based coordinates to 0-based coordinates.
-    This function can be applied to a single object or a list of objects.
+    Failed region fetches, retried with exponential backoff.
+    
+    The queue is written to disk on every change, so regions still pending
+    when a run dies are retried by the next one. A region that fails
+    RETRY_MAX_ATTEMPTS times is moved to the dead-letter file (JSON Lines),
+    which --retry-failed replays.
     """
-    if isinstance(data, list):
-        for item in data:
-            convert_to_zero_based(item)
-        return data
+    def __init__(self, path=RETRY_QUEUE_FILE, dead_letter_path=DEAD_LETTER_FILE,
+                 max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.path = path
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.entries = {}
+        self.dead_letters = 0
+        # Keys in the dead-letter file, each written there only once
+        self.dead_keys = {
+            region_key(entry["chrom"], entry["start"], entry["end"])
+            + TranscriptFilter.from_dict(entry.get("filter")).key()
+            for entry in read_dead_letters(dead_letter_path)
+        }
+        
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.entries = json.load(f)
+                logging.info(f"Found {len(self.entries)} region(s) left in the retry queue")
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning(f"Failed to load retry queue {path}: {e}")
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def _save(self):
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".part"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
     
-    # Skip if not a dictionary
-    if not isinstance(data, dict):
-        return data
+    def add(self, chrom, start, end, species, error, transcript_filter=NO_FILTER):
+        """
+        Record a failed attempt at a region.
+        
+        Returns True if the region will be retried, False if it was moved to
+        the dead-letter file.
+        """
+        key = region_key(chrom, start, end) + transcript_filter.key()
+        entry = self.entries.get(key) or {"chrom": chrom, "start": start, "end": end, "species": species,
+                                          "filter": transcript_filter.to_dict(), "attempts": 0}
+        entry["attempts"] += 1
+        entry["last_error"] = str(error)
+        
+        if entry["attempts"] >= self.max_attempts:
+            self.entries.pop(key, None)
+            entry.pop("next_attempt", None)
+            entry["failed_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+            if key not in self.dead_keys:
+                os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+                with open(self.dead_letter_path, 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+                self.dead_keys.add(key)
+                self.dead_letters += 1
+            logging.error(f"Giving up on {key} after {entry['attempts']} attempts: {error}")
+            self._save()
+            return False
+        
+        delay = min(self.max_delay, self.base_delay * 2 ** (entry["attempts"] - 1))
+        entry["next_attempt"] = time.time() + delay
+        self.entries[key] = entry
+        logging.warning(f"Fetching {key} failed (attempt {entry['attempts']}), retrying in {delay}s: {error}")
+        self._save()
+        return True
     
-    # Convert start coordinate from 1-based to 0-based
-    if "start" in data:
-        data["start"] = data["start"] - 1
+    def remove(self, key):
+        if self.entries.pop(key, None) is not None:
+            self._save()
     
-    # Process nested objects
-    for key, value in data.items():
-        if isinstance(value, (dict, list)):
-            convert_to_zero_based(value)
+    def due(self):
+        """Entries whose next attempt is due"""
+        now = time.time()
+        return [entry for entry in self.entries.values() if entry["next_attempt"] <= now]
     
-    return data
+    def seconds_until_due(self):
+        if not self.entries:
+            return 0
+        return max(0, min(entry["next_attempt"] for entry in self.entries.values()) - time.time())
 
-# After the api_stats declaration, initialize the persistent cache
-ensembl_cache = PersistentCache()
+def read_dead_letters(dead_letter_path=DEAD_LETTER_FILE):
+    """Entries of the dead-letter file, which is left as it is"""
+    if not os.path.exists(dead_letter_path):
+        return []
+    with open(dead_letter_path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def take_dead_letters(dead_letter_path=DEAD_LETTER_FILE):
+    """Read and empty the dead-letter file; returns its entries"""
+    entries = read_dead_letters(dead_letter_path)
+    if os.path.exists(dead_letter_path):
+        os.remove(dead_letter_path)
+    return entries
+
+# Identical concurrent region fetches and transcript lookups share one request
+region_flight = SingleFlight("Ensembl regions")
+lookup_flight = SingleFlight("Ensembl transcript lookups")
+
+def cached_region(cache_key):
+    """Region result cached under a key (migrated if needed), or None"""
+    cached_entry = ensembl_cache.get(cache_key)
+    if not cached_entry:
+        return None
+    logging.debug(f"Cache hit for {cache_key}")
+    if cached_entry.get("format") != CACHE_FORMAT:
+        cached_entry = migrate_cached_region(cached_entry)
+        ensembl_cache.set(cache_key, cached_entry)
+    cached_result = join_region(cached_entry)
+    if cached_result is None:
+        logging.warning(f"Transcripts of {cache_key} missing from the transcript store, fetching it again")
+    return cached_result
 
-def get_ensembl_info(chrom, start, end, species="human"):
+def get_ensembl_info(chrom, start, end, species="human", client=None, transcript_filter=NO_FILTER):
     """
     Get transcript and exon information using the Ensembl API.
-    """
-    # Format chromosome correctly (Ensembl doesn't use "chr" prefix)
-    chrom_id = chrom.replace("chr", "")
     
+    Only the transcripts transcript_filter keeps are included; the filter is
+    part of the cache key. Raises EnsemblFetchError if any of the requests
+    failed; an incomplete result is never cached. Concurrent calls for the
+    same region share one fetch, and the result is shared with the cache, so
+    it must not be modified.
+    """
     # Create cache key
-    cache_key = f"{chrom_id}:{start}-{end}"
+    cache_key = region_key(chrom, start, end) + transcript_filter.key()
     
     # Check persistent cache first
-    cached_result = ensembl_cache.get(cache_key)
-    if cached_result:
-        logging.debug(f"Cache hit for {cache_key}")
+    cached_result = cached_region(cache_key)
+    if cached_result is not None:
         return cached_result
     
-    # If not in cache, proceed with API call
-    logging.debug(f"Cache miss for {cache_key}, fetching from API")
+    # An unfiltered entry of the region has all the transcripts a filter can keep
+    if transcript_filter.is_active() and ensembl_cache.contains(region_key(chrom, start, end)):
+        unfiltered = cached_region(region_key(chrom, start, end))
+        if unfiltered is not None:
+            result = transcript_filter.apply(unfiltered)
+            ensembl_cache.set(cache_key, split_region(result))
+            return result
     
-    # Initialize Ensembl REST client
-    client = EnsemblRestClient()
-    headers = {"Content-Type": "application/json"}
+    return region_flight.do(cache_key, fetch_ensembl_info, chrom, start, end, species,
+                            client or ensembl_client, transcript_filter)
+
+def fetch_transcript_detail(transcript_id, client):
+    """Projected transcript with all its exons and its translation (/lookup/id); None if the request failed"""
+    transcript_detail = client.perform_rest_action(
+        endpoint=f"/lookup/id/{transcript_id}",
+        hdrs={"Content-Type": "application/json"},
+        params={'expand': 1, 'format': 'full'}
+    )
+    if transcript_detail is not None:
+        transcript_detail = project_transcript(transcript_detail)
+    return transcript_detail
+
+# Ensembl's overlap endpoint accepts regions of at most 5 Mb
+MAX_WINDOW = 5000000
+# Gene windows kept in memory; input is sorted by position, so the repeats
+# of a gene come together and reuse their window
+WINDOW_CACHE_SIZE = 32
+
+window_flight = SingleFlight("Ensembl gene windows")
+window_cache = OrderedDict()
+
+def overlaps(feature, start, end):
+    """Whether a raw (1-based) Ensembl feature overlaps start-end, as the overlap endpoint decides it"""
+    return feature["start"] <= end and feature["end"] >= start
+
+def fetch_window(chrom_id, start, end, species, client):
+    """
+    Transcript, exon and cds features of a window from one overlap call.
     
-    result = {"transcripts": [], "exons": [], "transcript_details": {}}
+    Returns {"start", "end", "transcripts", "exons", "exons_by_parent",
+    "cds_by_parent"} with the features as Ensembl sends them (1-based), or
+    None if the request failed.
+    """
+    key = f"{species}/{chrom_id}:{start}-{end}"
+    if key in window_cache:
+        window_cache.move_to_end(key)
+        return window_cache[key]
     
-    # Get transcripts overlapping the region
-    transcripts = client.perform_rest_action(
+    features = window_flight.do(
+        key, client.perform_rest_action,
         endpoint=f"/overlap/region/{species}/{chrom_id}:{start}-{end}",
-        hdrs=headers,
-        params={'feature': 'transcript'}
+        hdrs={"Content-Type": "application/json"},
+        params={'feature': ['transcript', 'exon', 'cds']}
     )
+    if features is None:
+        return None
     
-    if transcripts:
-        # Convert coordinates to 0-based
-        result["transcripts"] = convert_to_zero_based(transcripts)
+    window = {"start": start, "end": end, "transcripts": [], "exons": [], "exons_by_parent": {}, "cds_by_parent": {}}
+    for feature in features:
+        feature_type = feature.get("feature_type")
+        if feature_type == "transcript":
+            window["transcripts"].append(feature)
+        elif feature_type == "exon":
+            window["exons"].append(feature)
+            window["exons_by_parent"].setdefault(feature.get("Parent"), []).append(feature)
+        elif feature_type == "cds":
+            window["cds_by_parent"].setdefault(feature.get("Parent"), []).append(feature)
     
-    # Get exons overlapping the region - this provides phase information
-    exons = client.perform_rest_action(
-        endpoint=f"/overlap/region/{species}/{chrom_id}:{start}-{end}",
-        hdrs=headers,
-        params={'feature': 'exon'}
-    )
+    window_cache[key] = window
+    if len(window_cache) > WINDOW_CACHE_SIZE:
+        window_cache.popitem(last=False)
+    return window
+
+def build_transcript(transcript, window):
+    """
+    Transcript detail, as /lookup/id would give it, from the features of a
+    window that contains the whole transcript: its exons, and its CDS
+    bounds from its cds features.
+    """
+    detail = dict(transcript)
+    detail["display_name"] = transcript.get("external_name", "")
+    detail["Exon"] = window["exons_by_parent"].get(transcript["id"], [])
+    cds = window["cds_by_parent"].get(transcript["id"])
+    if cds:
+        detail["Translation"] = {
+            "id": cds[0].get("protein_id", cds[0].get("id")),
+            "start": min(c["start"] for c in cds),
+            "end": max(c["end"] for c in cds)
+        }
+    return project_transcript(detail)
+
+def fetch_ensembl_info(chrom, start, end, species, client, transcript_filter=NO_FILTER):
+    """
+    Fetch a region from the API and cache it (see get_ensembl_info).
     
-    if exons:
-        # Convert coordinates to 0-based
-        result["exons"] = convert_to_zero_based(exons)
+    The genes overlapping the region give a window spanning all their
+    transcripts, whose transcript, exon and cds features come in one overlap
+    call shared by every region of those genes. Exon lists and CDS bounds
+    are rebuilt from them; /lookup/id is only used for transcripts reaching
+    beyond the window (genes longer than MAX_WINDOW).
+    """
+    # Format chromosome correctly (Ensembl doesn't use "chr" prefix)
+    chrom_id = chrom.replace("chr", "")
+    cache_key = region_key(chrom, start, end) + transcript_filter.key()
     
-    # We still need transcript details because the overlap endpoint doesn't provide:
-    # 1. Complete list of exons for each transcript
-    # 2. Translation information (CDS coordinates)
-    # 3. Detailed transcript metadata
-    transcript_details = {}
+    # A fetch of the same region may have finished since the cache was checked
+    if cache_key in ensembl_cache.memory_cache:
+        cached_result = join_region(ensembl_cache.memory_cache[cache_key])
+        if cached_result is not None:
+            return cached_result
     
-    for transcript in result["transcripts"]:
-        try:
-            transcript_id = transcript["id"]
+    logging.debug(f"Cache miss for {cache_key}, fetching from API")
+    
+    result = {"transcripts": [], "exons": [], "transcript_details": {}}
+    
+    # Genes overlapping the region, for the span of their transcripts
+    genes = client.perform_rest_action(
+        endpoint=f"/overlap/region/{species}/{chrom_id}:{start}-{end}",
+        hdrs={"Content-Type": "application/json"},
+        params={'feature': 'gene'}
+    )
+    if genes is None:
+        raise EnsemblFetchError(f"{cache_key}: gene overlap failed")
+    
+    if genes:
+        window_start = min(int(gene["start"]) for gene in genes)
+        window_end = max(int(gene["end"]) for gene in genes)
+        if window_end - window_start + 1 > MAX_WINDOW:
+            # Cut to MAX_WINDOW, still containing the region
+            window_start = max(window_start, min(start, end - MAX_WINDOW + 1))
+            window_end = min(window_end, max(end, window_start + MAX_WINDOW - 1))
+        
+        window = fetch_window(chrom_id, window_start, window_end, species, client)
+        if window is None:
+            raise EnsemblFetchError(f"{cache_key}: overlap of window {window_start}-{window_end} failed")
+        
+        # The features overlapping the region itself, with exons for their phase information;
+        # transcripts the filter drops get no details
+        transcripts = [t for t in window["transcripts"] if overlaps(t, start, end) and transcript_filter.keeps(t)]
+        result["transcripts"] = [project_transcript(t) for t in transcripts]
+        result["exons"] = [project_fields(e, OVERLAP_EXON_FIELDS, 1) for e in window["exons"] if overlaps(e, start, end)]
+        
+        failed = []
+        for transcript in transcripts:
+            transcript_id = transcript.get("id")
             
-            # Get detailed transcript information with all exons and version information
-            transcript_detail = client.perform_rest_action(
-                endpoint=f"/lookup/id/{transcript_id}",
-                hdrs=headers,
-                params={'expand': 1, 'format': 'full'}
-            )
+            # A transcript of the same version already stored for another region is reused
+            transcript_detail = transcript_store.get(versioned_id(transcript))
             
-            # Convert all coordinates to 0-based
-            if transcript_detail:
-                convert_to_zero_based(transcript_detail)
-                transcript_details[transcript_id] = transcript_detail
-                
-        except Exception as e:
-            print(f"Error querying Ensembl transcript details for {transcript_id}: {e}")
-    
-    result["transcript_details"] = transcript_details
+            if transcript_detail is None:
+                if transcript["start"] >= window["start"] and transcript["end"] <= window["end"]:
+                    transcript_detail = build_transcript(transcript, window)
+                else:
+                    # Reaches beyond the window, so its exon list would be incomplete
+                    transcript_detail = lookup_flight.do(transcript_id, fetch_transcript_detail, transcript_id, client)
+            
+            if transcript_detail is None:
+                failed.append(f"lookup {transcript_id}")
+                continue
+            
+            result["transcript_details"][transcript_id] = transcript_detail
+        
+        if failed:
+            raise EnsemblFetchError(f"{cache_key}: {', '.join(failed)} failed")
     
     # Store in persistent cache before returning
-    ensembl_cache.set(cache_key, result)
+    ensembl_cache.set(cache_key, split_region(result))
     
     return result
 
@@ -331,7 +886,7 @@ def is_canonical_transcript(transcript, all_transcripts):
         translation_lengths = []
         for t in gene_transcripts:
             if "Translation" in t:
-                translation_lengths.append((t["id"], len(t.get("Translation", {}).get("seq", ""))))
+                translation_lengths.append((t["id"], t["Translation"].get("seq_length", 0)))
             else:
                 translation_lengths.append((t["id"], t.get("end", 0) - t.get("start", 0)))
                 
@@ -416,37 +971,436 @@ def get_coding_status(exon, transcript, repeat_start, repeat_end):
     # Fully coding exon
     return "fully_coding", "none", 100
 
-def clean_repeat_type(repeat_type):
+# ensembl_exon_info of a repeat whose region could not be fetched; --retry-failed fills it in later
+FAILED_EXON_INFO = {
+    "transcripts_count": 0,
+    "has_canonical_transcript": False,
+    "location_summary": "unknown",
+    "annotation_status": "failed",
+    "transcripts": []
+}
+
+# ensembl_exon_info of a repeat left out by --prune only; --fill-skipped annotates it later
+SKIPPED_EXON_INFO = dict(FAILED_EXON_INFO, annotation_status="skipped")
+
+def candidate_repeats(repeats, min_repeats=MIN_REPEATS):
+    """
+    The repeats that can be exon skipping candidates, as a set of list indices.
+    
+    Same criteria as scripts/repeat_analytics.py (count_json.py): blockCount
+    is 1, and the gene has at least min_repeats such repeats of the same
+    (cleaned) repeat type. Annotation does not change either, so they are
+    known before any request is made.
+    """
+    single_block = [
+        i for i, r in enumerate(repeats)
+        if r.get("blockCount") == 1 and "geneName" in r and "repeatType" in r
+    ]
+    counts = {}
+    for i in single_block:
+        key = (repeats[i]["geneName"], clean_repeat_type(repeats[i]["repeatType"]))
+        counts[key] = counts.get(key, 0) + 1
+    return {
+        i for i in single_block
+        if counts[(repeats[i]["geneName"], clean_repeat_type(repeats[i]["repeatType"]))] >= min_repeats
+    }
+
+def ensembl_strand(repeat):
+    """The repeat's strand in Ensembl format (1, -1), or None if unknown"""
+    repeat_strand = repeat.get("strand", "")
+    return 1 if repeat_strand == "+" else -1 if repeat_strand == "-" else None
+
+def annotate_repeat(repeat, api_data, both_strands=False):
+    """
+    Set repeat["ensembl_exon_info"] from the Ensembl data of its region
+    
+    Transcripts on the other strand than the repeat are skipped unless
+    both_strands is set.
+    """
+    start = int(repeat["chromStart"])
+    end = int(repeat["chromEnd"])
+
+    # Get the repeat's strand in Ensembl format for comparison
+    expected_ensembl_strand = None if both_strands else ensembl_strand(repeat)
+    
+    if not api_data or not api_data["transcripts"]:
+        repeat["ensembl_exon_info"] = {
+            "transcripts_count": 0,
+            "has_canonical_transcript": False,
+            "location_summary": "unknown",
+            "transcripts": []
+        }
+        return
+    
+    # Create a dictionary of exon IDs to exon objects from the overlap endpoint results
+    exon_phase_map = {}
+    if "exons" in api_data and api_data["exons"]:
+        for exon in api_data["exons"]:
+            if "id" in exon:
+                exon_phase_map[exon["id"]] = exon
+    
+    # Transcript details needed for:
+    # 1. Complete list of exons (overlap only shows exons that overlap the region)
+    # 2. Translation/CDS information to determine coding status
+    # 3. Additional transcript metadata
+    all_transcripts = []
+    transcript_details = api_data["transcript_details"]
+    
+    for transcript_id, transcript in transcript_details.items():
+        all_transcripts.append(transcript)
+    
+    transcript_info = []
+    locations = set()
+    
+    for transcript in all_transcripts:
+        try:
+            # Skip transcripts with different strand if repeat strand is specified
+            if expected_ensembl_strand is not None and transcript.get("strand") != expected_ensembl_strand:
+                continue
+
+            # Check if this is likely the canonical transcript
+            is_canonical = is_canonical_transcript(transcript, all_transcripts)
+            
+            # Classify location (exonic, intronic, outside)
+            location = classify_repeat_location(repeat, transcript)
+            locations.add(location)
+            
+            # Get basic transcript info
+            transcript_id = transcript["id"]
+            gene_name = transcript.get("display_name", "").split('-')[0]
+            strand = "+" if transcript.get("strand") == 1 else "-"
+            
+            # Find exons in this transcript
+            exons = transcript.get("Exon", [])
+            exon_count = len(exons)
+            
+            # Sort exons by genomic order
+            if strand == "+":
+                # For + strand, exons are ordered from 5' to 3'
+                exons = sorted(exons, key=lambda e: e.get("start", 0))
+            else:
+                # For - strand, exons are ordered from 3' to 5'
+                exons = sorted(exons, key=lambda e: e.get("start", 0), reverse=True)
+            
+            containing_exons = []
+            for i, exon in enumerate(exons):
+                exon_start = int(exon.get("start", 0))
+                exon_end = int(exon.get("end", 0))
+                
+                # Check if the repeat overlaps this exon
+                if max(start, exon_start) < min(end, exon_end):  # Overlap
+                    exon_number = i + 1  # 1-based exon numbering
+                    
+                    overlap_start = max(start, exon_start)
+                    overlap_end = min(end, exon_end)
+
+                    # Add this adjustment for BED format
+                    if exon_end == end:
+                        overlap_end += 1  # Adjust for BED's exclusive end coordinate
+
+                    overlap_length = overlap_end - overlap_start
+                    exon_length = exon_end - exon_start
+                    overlap_percentage = (overlap_length / exon_length) * 100
+                    
+                    # Determine position in transcript
+                    if exon_count == 1:
+                        position = "single_exon"
+                    elif i == 0:
+                        position = "first_exon"
+                    elif i == exon_count - 1:
+                        position = "last_exon"
+                    else:
+                        position = f"middle_exon_{exon_number}"
+                    
+                    # Get coding status
+                    coding_status, utr_status, coding_percentage = get_coding_status(exon, transcript, start, end)
+                    
+                    # Look up the exon in our phase map from the overlap endpoint
+                    exon_id = exon.get("id", "")
+                    overlap_exon = exon_phase_map.get(exon_id, {})
+                    
+                    # Get phase and end_phase from the overlap endpoint data
+                    phase = overlap_exon.get("ensembl_phase", -1)
+                    end_phase = overlap_exon.get("ensembl_end_phase", -1)
+                    
+                    frame_status = "non_coding"
+                    if coding_status != "non_coding":
+                        if phase == end_phase and phase != -1:
+                            frame_status = "in_frame"  # Exon contains complete codons or maintains reading frame
+                        elif phase == -1 or end_phase == -1:
+                            frame_status = "non_coding"  # Non-coding exon
+                        else:
+                            frame_status = "out_of_frame"  # Exon contains partial codons
+                    
+                    exon_info = {
+                        "exon_number": exon_number,
+                        "exon_id": exon.get("id", ""),
+                        "overlap_bp": overlap_length,
+                        "position": position,
+                        "overlap_percentage": round(overlap_percentage, 2),
+                        "coding_status": coding_status,
+                        "utr_status": utr_status,
+                        "coding_percentage": coding_percentage,
+                        "phase": phase,  # Store the direct value
+                        "end_phase": end_phase,  # Store the direct value
+                        "frame_status": frame_status
+                    }
+                    
+                    containing_exons.append(exon_info)
+            
+            # Get transcript biotype
+            biotype = transcript.get("biotype", "unknown")
+            
+            # Create versioned transcript ID
+            versioned_transcript_id = transcript_id
+            if "version" in transcript:
+                versioned_transcript_id = f"{transcript_id}.{transcript['version']}"
+            
+            transcript_info.append({
+                "transcript_id": transcript_id,  # Keep the unversioned ID for API queries
+                "versioned_transcript_id": versioned_transcript_id,  # Add this new field
+                "transcript_name": transcript.get("display_name", ""),
+                "is_canonical": is_canonical,
+                "biotype": biotype,
+                "location": location,
+                "exon_count": exon_count,
+                "containing_exons": containing_exons
+            })
+        except Exception as e:
+            print(f"Error processing transcript {transcript.get('id', 'unknown')}: {e}")
+            continue
+    
+    # Summarize location (prioritize exonic > intronic > outside/unknown)
+    location_summary = "unknown"
+    if "exonic" in locations:
+        location_summary = "exonic"
+    elif "intronic" in locations:
+        location_summary = "intronic"
+    elif "outside" in locations:
+        location_summary = "intergenic"
+    
+    has_canonical = any(t["is_canonical"] for t in transcript_info) if transcript_info else False
+    
+    # Add exon information to the repeat
+    repeat["ensembl_exon_info"] = {
+        "transcripts_count": len(transcript_info),
+        "has_canonical_transcript": has_canonical,
+        "location_summary": location_summary,
+        "transcripts": transcript_info
+    }
+
+def retry_failed_regions(queue, pending, both_strands=False):
+    """
+    Retry the queued regions until each succeeds or is given up on.
+    
+    pending maps region keys (with their filter) to the repeats waiting for
+    that region; they are annotated as soon as it has been fetched.
+    """
+    while len(queue):
+        wait_time = queue.seconds_until_due()
+        if wait_time > 0:
+            logging.info(f"{len(queue)} region(s) in the retry queue, next attempt in {wait_time:.0f}s")
+            time.sleep(wait_time)
+        
+        for entry in queue.due():
+            transcript_filter = TranscriptFilter.from_dict(entry.get("filter"))
+            key = region_key(entry["chrom"], entry["start"], entry["end"]) + transcript_filter.key()
+            try:
+                api_data = get_ensembl_info(entry["chrom"], entry["start"], entry["end"], species=entry["species"],
+                                            transcript_filter=transcript_filter)
+            except EnsemblFetchError as e:
+                queue.add(entry["chrom"], entry["start"], entry["end"], entry["species"], e, transcript_filter)
+                continue
+            queue.remove(key)
+            for repeat in pending.pop(key, []):
+                annotate_repeat(repeat, api_data, both_strands)
+
+def select_repeats(repeats, limit=None, retry_failed=False, fill_skipped=False, prune=None,
+                   min_repeats=MIN_REPEATS, dead_letters=None):
+    """
+    The repeats a run annotates, in order (see process_repeat_data for the
+    options), and those --prune only leaves out, as (selected, skipped).
+    
+    Nothing is modified, so --plan selects exactly what a run would.
+    dead_letters are the entries --retry-failed replays.
     """
-    Clean repeat type by removing everything after a semicolon or space
-    e.g. "ANK 1" -> "ANK", "TNFR-Cys; trunk" -> "TNFR-Cys", "LRR 1; degenerate" -> "LRR"
+    # Filter out entries that don't have proper coordinate data
+    valid_repeats = [r for r in repeats if "chrom" in r and "chromStart" in r and "chromEnd" in r]
+    
+    # Candidates are decided on the whole dataset, before any selection
+    if prune:
+        candidates = candidate_repeats(valid_repeats, min_repeats)
+        candidate_ids = {id(valid_repeats[i]) for i in candidates}
+        print(f"{len(candidates)} of {len(valid_repeats)} repeats are possible exon skipping candidates "
+              f"(blockCount = 1, at least {min_repeats} of a type in the gene)")
+    
+    if fill_skipped:
+        valid_repeats = [
+            r for r in valid_repeats
+            if r.get("ensembl_exon_info", {}).get("annotation_status") == "skipped"
+        ]
+        print(f"Annotating {len(valid_repeats)} repeats skipped by pruning...")
+    
+    if retry_failed:
+        dead_keys = {region_key(entry["chrom"], entry["start"], entry["end"]) for entry in dead_letters or []}
+        valid_repeats = [
+            r for r in valid_repeats
+            if r.get("ensembl_exon_info", {}).get("annotation_status") == "failed"
+            or region_key(r["chrom"], int(r["chromStart"]), int(r["chromEnd"])) in dead_keys
+        ]
+        print(f"Retrying {len(valid_repeats)} repeats whose annotation failed...")
+    
+    # Apply limit if specified
+    if limit and isinstance(limit, int) and limit > 0:
+        valid_repeats = valid_repeats[:limit]
+        print(f"Processing first {limit} out of {len(repeats)} repeats...")
+    elif not (retry_failed or fill_skipped):
+        print(f"Processing {len(valid_repeats)} out of {len(repeats)} repeats with valid coordinates...")
     
-    If the resulting repeat type is just a number, replace it with "Unknown"
-    to indicate the repeat type is unnamed.
+    skipped = []
+    if prune == "only":
+        skipped = [r for r in valid_repeats if id(r) not in candidate_ids]
+        valid_repeats = [r for r in valid_repeats if id(r) in candidate_ids]
+        print(f"Annotating the {len(valid_repeats)} candidates, the others are marked as skipped")
+    elif prune == "first":
+        valid_repeats = ([r for r in valid_repeats if id(r) in candidate_ids]
+                         + [r for r in valid_repeats if id(r) not in candidate_ids])
+    
+    return valid_repeats, skipped
+
+def repeat_filter_for(repeat, transcript_filter, both_strands=False):
+    """The filter a repeat's region is fetched with: transcript_filter plus the repeat's strand"""
+    return transcript_filter if both_strands else transcript_filter.for_strand(ensembl_strand(repeat))
+
+def cached_transcript_keys(cache_key, unfiltered_key=None):
+    """
+    Transcript store keys of the entry a run would read for a region (its
+    own, else unfiltered_key's), without any request; None if neither is
+    cached.
+    """
+    for key in (cache_key, unfiltered_key):
+        if key is None or not ensembl_cache.contains(key):
+            continue
+        entry = ensembl_cache.get(key)
+        if not entry:
+            continue
+        if entry.get("format") != CACHE_FORMAT:
+            # Older entries hold their transcripts themselves and are migrated when read
+            return []
+        return list(entry["transcript_keys"].values())
+    return None
+
+def plan_requests(repeats, species="human", transcript_filter=NO_FILTER, both_strands=False):
     """
-    if not repeat_type:
-        return repeat_type
+    Estimate the Ensembl requests annotating repeats would take, from the
+    cache alone.
     
-    cleaned_type = repeat_type
+    Each region to fetch costs a gene overlap call, and each gene a window
+    call shared by its regions (repeats without a gene name are counted as
+    their own gene). Transcripts reaching beyond MAX_WINDOW need a lookup
+    each, which is not known before the fetch, so the estimate is a lower
+    bound for the rare genes longer than that.
     
-    # First check for semicolon
-    if ";" in cleaned_type:
-        cleaned_type = cleaned_type.split(";")[0].strip()
+    A cached region whose transcripts are missing from the transcript store
+    is fetched again, unless a region fetched before it stores them again.
+    
+    Returns a dict with the counts and "prefetch", the regions to fetch in
+    input order, as {"chrom", "start", "end", "species", "filter"}.
+    """
+    seen = set()
+    prefetch = []
+    genes = set()
+    cached = 0
+    refetch = 0
+    missing_transcripts = set()
+    # Transcripts stored again by the refetches before, as the run would
+    restored = set()
     
-    # Then check for space (now on the already semicolon-cleaned string)
-    if " " in cleaned_type:
-        # Look for the first space followed by a number
-        parts = cleaned_type.split(" ")
-        if len(parts) > 1 and any(part.isdigit() or (part.replace('.', '', 1).isdigit() and part.count('.') <= 1) for part in parts[1:]):
-            cleaned_type = parts[0]
+    for repeat in repeats:
+        chrom = repeat["chrom"]
+        start = int(repeat["chromStart"])
+        end = int(repeat["chromEnd"])
+        repeat_filter = repeat_filter_for(repeat, transcript_filter, both_strands)
+        cache_key = region_key(chrom, start, end) + repeat_filter.key()
+        if cache_key in seen:
+            continue
+        seen.add(cache_key)
+        
+        unfiltered_key = region_key(chrom, start, end) if repeat_filter.is_active() else None
+        transcript_keys = cached_transcript_keys(cache_key, unfiltered_key)
+        if transcript_keys is not None:
+            missing = [k for k in transcript_keys if k not in restored and not transcript_store.contains(k)]
+            if not missing:
+                cached += 1
+                continue
+            # Fetched again, which stores its transcripts for the regions after it
+            refetch += 1
+            missing_transcripts.update(missing)
+            restored.update(transcript_keys)
+        
+        genes.add((chrom, repeat.get("geneName") or cache_key))
+        prefetch.append({"chrom": chrom, "start": start, "end": end, "species": species,
+                         "filter": repeat_filter.to_dict()})
+    
+    return {
+        "repeats": len(repeats),
+        "regions": len(seen),
+        "cached": cached,
+        "refetch": refetch,
+        "missing_transcripts": len(missing_transcripts),
+        "to_fetch": len(prefetch),
+        "gene_requests": len(prefetch),
+        "window_requests": len(genes),
+        "requests": len(prefetch) + len(genes),
+        "prefetch": prefetch
+    }
+
+def print_plan(plan, reqs_per_sec=MAX_REQS_PER_SEC):
+    """Report a plan and its runtime at reqs_per_sec"""
+    seconds = plan["requests"] / reqs_per_sec
+    print(f"{plan['repeats']} repeats in {plan['regions']} distinct regions")
+    print(f"  cached:            {plan['cached']}")
+    print(f"  to fetch:          {plan['to_fetch']} ({plan['refetch']} cached with "
+          f"{plan['missing_transcripts']} transcripts missing from the store)")
+    print(f"Estimated requests:  {plan['requests']} ({plan['gene_requests']} gene overlaps, "
+          f"~{plan['window_requests']} gene windows)")
+    print(f"Estimated runtime:   {datetime.timedelta(seconds=round(seconds))} at {reqs_per_sec:g} requests/s "
+          f"(longer if Ensembl lowers the rate)")
+
+def write_prefetch_list(prefetch, path=PREFETCH_FILE):
+    """Write the regions to fetch as JSON Lines, for --prefetch"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        for entry in prefetch:
+            f.write(json.dumps(entry) + "\n")
+
+def prefetch_regions(path=PREFETCH_FILE):
+    """
+    Fetch the regions of a prefetch list into the cache, so a later run
+    finds them there. Failed regions go through the retry queue. Returns
+    the number of regions listed.
+    """
+    with open(path, 'r') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
     
-    # Check if the resulting type is just a number
-    if cleaned_type.isdigit() or (cleaned_type.replace('.', '', 1).isdigit() and cleaned_type.count('.') <= 1):
-        return "Unknown"
+    queue = RetryQueue()
+    for entry in tqdm(entries):
+        transcript_filter = TranscriptFilter.from_dict(entry.get("filter"))
+        try:
+            get_ensembl_info(entry["chrom"], entry["start"], entry["end"], species=entry["species"],
+                             transcript_filter=transcript_filter)
+        except EnsemblFetchError as e:
+            queue.add(entry["chrom"], entry["start"], entry["end"], entry["species"], e, transcript_filter)
     
-    return cleaned_type
+    if len(queue):
+        retry_failed_regions(queue, {})
+    if queue.dead_letters:
+        print(f"Warning: {queue.dead_letters} region(s) could not be fetched (see {queue.dead_letter_path})")
+    return len(entries)
 
-def process_repeat_data(repeat_data_file, output_file, limit=None):
+def process_repeat_data(repeat_data_file, output_file, limit=None, retry_failed=False, species="human",
+                        transcript_filter=NO_FILTER, both_strands=False, prune=None, fill_skipped=False,
+                        min_repeats=MIN_REPEATS):
     """
     Process the repeat data JSON and add exon information using Ensembl API.
     
@@ -454,21 +1408,36 @@ def process_repeat_data(repeat_data_file, output_file, limit=None):
         repeat_data_file: Input JSON file with repeat data
         output_file: Output file to save the updated data
         limit: Optional. If set, process only this many entries
+        retry_failed: Only annotate repeats whose annotation failed before
+            (marked "annotation_status": "failed", or in the dead-letter file)
+        species: Ensembl species name
+        transcript_filter: Biotype and canonical filters (TranscriptFilter);
+            each repeat adds its own strand unless both_strands is set
+        both_strands: Also annotate transcripts on the other strand
+        prune: "only" to annotate only possible exon skipping candidates
+            (candidate_repeats) and mark the others "annotation_status":
+            "skipped", "first" to annotate the candidates before the others
+        fill_skipped: Only annotate repeats a pruned run skipped
+        min_repeats: Repeats of a type a gene needs for its repeats to be candidates
     """
     
     # Load repeat data
     with open(repeat_data_file, 'r') as f:
         repeats = json.load(f)
     
-    # Filter out entries that don't have proper coordinate data
-    valid_repeats = [r for r in repeats if "chrom" in r and "chromStart" in r and "chromEnd" in r]
+    # Clean the repeat types of all repeats, so the output never mixes cleaned
+    # types with raw ones (e.g. of the repeats --prune only skips)
+    for repeat in repeats:
+        if "repeatType" in repeat:
+            repeat["repeatType"] = clean_repeat_type(repeat["repeatType"])
     
-    # Apply limit if specified
-    if limit and isinstance(limit, int) and limit > 0:
-        valid_repeats = valid_repeats[:limit]
-        print(f"Processing first {limit} out of {len(repeats)} repeats...")
-    else:
-        print(f"Processing {len(valid_repeats)} out of {len(repeats)} repeats with valid coordinates...")
+    dead_letters = take_dead_letters() if retry_failed else None
+    valid_repeats, skipped = select_repeats(repeats, limit, retry_failed, fill_skipped, prune, min_repeats, dead_letters)
+    for repeat in skipped:
+        repeat["ensembl_exon_info"] = dict(SKIPPED_EXON_INFO)
+    
+    queue = RetryQueue()
+    pending = {}
     
     # Process each repeat
     for repeat_idx, repeat in enumerate(tqdm(valid_repeats)):
@@ -477,193 +1446,47 @@ def process_repeat_data(repeat_data_file, output_file, limit=None):
             with open(output_file + ".temp", 'w') as f:
                 json.dump(repeats, f, indent=2)
         
-        # Clean the repeat type before adding to the output
-        if "repeatType" in repeat:
-            repeat["repeatType"] = clean_repeat_type(repeat["repeatType"])
-        
         chrom = repeat["chrom"]
         start = int(repeat["chromStart"])
         end = int(repeat["chromEnd"])
-
-        # Get the repeat's strand
-        repeat_strand = repeat.get("strand", "")
-        # Convert to Ensembl format for comparison
-        expected_ensembl_strand = 1 if repeat_strand == "+" else -1 if repeat_strand == "-" else None
-        
-        # Get transcript and exon information from Ensembl
-        api_data = get_ensembl_info(chrom, start, end)
-        
-        if not api_data or not api_data["transcripts"]:
-            repeat["ensembl_exon_info"] = {
-                "transcripts_count": 0,
-                "has_canonical_transcript": False,
-                "location_summary": "unknown",
-                "transcripts": []
-            }
-            continue
         
-        # Create a dictionary of exon IDs to exon objects from the overlap endpoint results
-        exon_phase_map = {}
-        if "exons" in api_data and api_data["exons"]:
-            for exon in api_data["exons"]:
-                if "id" in exon:
-                    exon_phase_map[exon["id"]] = exon
-        
-        # Transcript details needed for:
-        # 1. Complete list of exons (overlap only shows exons that overlap the region)
-        # 2. Translation/CDS information to determine coding status
-        # 3. Additional transcript metadata
-        all_transcripts = []
-        transcript_details = api_data["transcript_details"]
-        
-        for transcript_id, transcript in transcript_details.items():
-            all_transcripts.append(transcript)
-        
-        transcript_info = []
-        locations = set()
-        
-        for transcript in all_transcripts:
-            try:
-                # Skip transcripts with different strand if repeat strand is specified
-                if expected_ensembl_strand is not None and transcript.get("strand") != expected_ensembl_strand:
-                    continue
-
-                # Check if this is likely the canonical transcript
-                is_canonical = is_canonical_transcript(transcript, all_transcripts)
-                
-                # Classify location (exonic, intronic, outside)
-                location = classify_repeat_location(repeat, transcript)
-                locations.add(location)
-                
-                # Get basic transcript info
-                transcript_id = transcript["id"]
-                gene_name = transcript.get("display_name", "").split('-')[0]
-                strand = "+" if transcript.get("strand") == 1 else "-"
-                
-                # Find exons in this transcript
-                exons = transcript.get("Exon", [])
-                exon_count = len(exons)
-                
-                # Sort exons by genomic order
-                if strand == "+":
-                    # For + strand, exons are ordered from 5' to 3'
-                    exons = sorted(exons, key=lambda e: e.get("start", 0))
-                else:
-                    # For - strand, exons are ordered from 3' to 5'
-                    exons = sorted(exons, key=lambda e: e.get("start", 0), reverse=True)
-                
-                containing_exons = []
-                for i, exon in enumerate(exons):
-                    exon_start = int(exon.get("start", 0))
-                    exon_end = int(exon.get("end", 0))
-                    
-                    # Check if the repeat overlaps this exon
-                    if max(start, exon_start) < min(end, exon_end):  # Overlap
-                        exon_number = i + 1  # 1-based exon numbering
-                        
-                        overlap_start = max(start, exon_start)
-                        overlap_end = min(end, exon_end)
-
-                        # Add this adjustment for BED format
-                        if exon_end == end:
-                            overlap_end += 1  # Adjust for BED's exclusive end coordinate
-
-                        overlap_length = overlap_end - overlap_start
-                        exon_length = exon_end - exon_start
-                        overlap_percentage = (overlap_length / exon_length) * 100
-                        
-                        # Determine position in transcript
-                        if exon_count == 1:
-                            position = "single_exon"
-                        elif i == 0:
-                            position = "first_exon"
-                        elif i == exon_count - 1:
-                            position = "last_exon"
-                        else:
-                            position = f"middle_exon_{exon_number}"
-                        
-                        # Get coding status
-                        coding_status, utr_status, coding_percentage = get_coding_status(exon, transcript, start, end)
-                        
-                        # Look up the exon in our phase map from the overlap endpoint
-                        exon_id = exon.get("id", "")
-                        overlap_exon = exon_phase_map.get(exon_id, {})
-                        
-                        # Get phase and end_phase from the overlap endpoint data
-                        phase = overlap_exon.get("ensembl_phase", -1)
-                        end_phase = overlap_exon.get("ensembl_end_phase", -1)
-                        
-                        frame_status = "non_coding"
-                        if coding_status != "non_coding":
-                            if phase == end_phase and phase != -1:
-                                frame_status = "in_frame"  # Exon contains complete codons or maintains reading frame
-                            elif phase == -1 or end_phase == -1:
-                                frame_status = "non_coding"  # Non-coding exon
-                            else:
-                                frame_status = "out_of_frame"  # Exon contains partial codons
-                        
-                        exon_info = {
-                            "exon_number": exon_number,
-                            "exon_id": exon.get("id", ""),
-                            "overlap_bp": overlap_length,
-                            "position": position,
-                            "overlap_percentage": round(overlap_percentage, 2),
-                            "coding_status": coding_status,
-                            "utr_status": utr_status,
-                            "coding_percentage": coding_percentage,
-                            "phase": phase,  # Store the direct value
-                            "end_phase": end_phase,  # Store the direct value
-                            "frame_status": frame_status
-                        }
-                        
-                        containing_exons.append(exon_info)
-                
-                # Get transcript biotype
-                biotype = transcript.get("biotype", "unknown")
-                
-                # Create versioned transcript ID
-                versioned_transcript_id = transcript_id
-                if "version" in transcript:
-                    versioned_transcript_id = f"{transcript_id}.{transcript['version']}"
-                
-                transcript_info.append({
-                    "transcript_id": transcript_id,  # Keep the unversioned ID for API queries
-                    "versioned_transcript_id": versioned_transcript_id,  # Add this new field
-                    "transcript_name": transcript.get("display_name", ""),
-                    "is_canonical": is_canonical,
-                    "biotype": biotype,
-                    "location": location,
-                    "exon_count": exon_count,
-                    "containing_exons": containing_exons
-                })
-            except Exception as e:
-                print(f"Error processing transcript {transcript.get('id', 'unknown')}: {e}")
-                continue
+        # Transcripts on the other strand are dropped before their details are fetched
+        repeat_filter = repeat_filter_for(repeat, transcript_filter, both_strands)
+        key = region_key(chrom, start, end) + repeat_filter.key()
         
-        # Summarize location (prioritize exonic > intronic > outside/unknown)
-        location_summary = "unknown"
-        if "exonic" in locations:
-            location_summary = "exonic"
-        elif "intronic" in locations:
-            location_summary = "intronic"
-        elif "outside" in locations:
-            location_summary = "intergenic"
+        # A region that failed (or is queued from an earlier run) is not fetched again
+        # for every repeat in it; the repeat waits for the region's retry instead
+        if key in pending or key in queue.entries:
+            repeat["ensembl_exon_info"] = dict(FAILED_EXON_INFO)
+            pending.setdefault(key, []).append(repeat)
+            continue
         
-        has_canonical = any(t["is_canonical"] for t in transcript_info) if transcript_info else False
+        # Get transcript and exon information from Ensembl
+        try:
+            api_data = get_ensembl_info(chrom, start, end, species=species, transcript_filter=repeat_filter)
+        except EnsemblFetchError as e:
+            # Marked as failed until a retry succeeds
+            repeat["ensembl_exon_info"] = dict(FAILED_EXON_INFO)
+            queue.add(chrom, start, end, species, e, repeat_filter)
+            pending.setdefault(key, []).append(repeat)
+            continue
         
-        # Add exon information to the repeat
-        repeat["ensembl_exon_info"] = {
-            "transcripts_count": len(transcript_info),
-            "has_canonical_transcript": has_canonical,
-            "location_summary": location_summary,
-            "transcripts": transcript_info
-        }
+        annotate_repeat(repeat, api_data, both_strands)
+    
+    # Retry failed regions with backoff; what still fails goes to the dead-letter file
+    if len(queue):
+        retry_failed_regions(queue, pending, both_strands)
     
     # Save updated repeat data
     with open(output_file, 'w') as f:
         json.dump(repeats, f, indent=2)
     print(f"Updated repeat data saved to {output_file}")
     
+    if queue.dead_letters:
+        failed_count = sum(1 for r in valid_repeats if r["ensembl_exon_info"].get("annotation_status") == "failed")
+        print(f"Warning: {queue.dead_letters} region(s) could not be fetched; {failed_count} repeats are marked "
+              f"\"annotation_status\": \"failed\" (see {queue.dead_letter_path}, rerun with --retry-failed)")
+    
     # Remove temp file if exists
     if os.path.exists(output_file + ".temp"):
         os.remove(output_file + ".temp")
@@ -678,16 +1501,70 @@ if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Process repeats and add Ensembl exon information.")
     parser.add_argument("--input", "-i", 
-                        default="output/DEF_gname_hg38_repeats.json",
-                        help="Input JSON file containing repeat data")
+                        default=None,
+                        help="Input JSON file containing repeat data (default output/DEF_gname_hg38_repeats.json, "
+                             "or the output file with --retry-failed)")
     parser.add_argument("--output", "-o", 
                         default="output/DEF_exon_info_hg38_repeats.json",
                         help="Output JSON file to save results")
     parser.add_argument("--limit", "-l", type=int, default=None,
                         help="Limit processing to first N entries (e.g., 10, 100)")
+    parser.add_argument("--biotype", action="append", default=None,
+                        help="Only annotate transcripts of this biotype, e.g. protein_coding (repeatable)")
+    parser.add_argument("--canonical-only", action="store_true",
+                        help="Only annotate Ensembl canonical transcripts")
+    parser.add_argument("--both-strands", action="store_true",
+                        help="Also annotate transcripts on the other strand than the repeat")
+    parser.add_argument("--prune", choices=["only", "first"], default=None,
+                        help="Annotate only the possible exon skipping candidates (blockCount = 1, at least "
+                             "--min-repeats of a type in the gene) and mark the rest skipped, or annotate them first")
+    parser.add_argument("--min-repeats", type=int, default=MIN_REPEATS,
+                        help=f"Repeats of a type a gene needs for --prune (default {MIN_REPEATS})")
+    parser.add_argument("--fill-skipped", action="store_true",
+                        help="Annotate the repeats a --prune only run skipped (reads and updates the output file)")
+    parser.add_argument("--migrate-cache", action="store_true",
+                        help="Rewrite all cached regions in the current (projected) format and exit")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-annotate only the repeats of a previous run whose regions failed "
+                             f"(replays {DEAD_LETTER_FILE})")
+    parser.add_argument("--plan", action="store_true",
+                        help="Dry run: estimate the requests and runtime of the run the other options describe "
+                             "from the cache alone, write the regions missing from it to --prefetch-list and exit")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="Fetch the regions of --prefetch-list into the cache and exit")
+    parser.add_argument("--prefetch-list", default=PREFETCH_FILE,
+                        help=f"Prefetch list written by --plan and read by --prefetch (default {PREFETCH_FILE})")
     args = parser.parse_args()
     
-    input_file = args.input
+    if args.migrate_cache:
+        migrated, total = migrate_cache()
+        print(f"Migrated {migrated} of {total} cached regions to format {CACHE_FORMAT}")
+        sys.exit(0)
+    
+    if args.prefetch:
+        start_time = time.time()
+        count = prefetch_regions(args.prefetch_list)
+        logging.info(f"Prefetched {count} regions with {api_stats['requests']} requests "
+                     f"in {time.time() - start_time:.2f} seconds")
+        sys.exit(0)
+    
+    input_file = args.input or (args.output if args.retry_failed or args.fill_skipped
+                                else "output/DEF_gname_hg38_repeats.json")
+    
+    if args.plan:
+        with open(input_file, 'r') as f:
+            repeats = json.load(f)
+        dead_letters = read_dead_letters() if args.retry_failed else None
+        selected, _ = select_repeats(repeats, args.limit, args.retry_failed, args.fill_skipped, args.prune,
+                                     args.min_repeats, dead_letters)
+        transcript_filter = TranscriptFilter(biotypes=args.biotype, canonical_only=args.canonical_only)
+        plan = plan_requests(selected, transcript_filter=transcript_filter, both_strands=args.both_strands)
+        print_plan(plan, ensembl_rate_limiter.max_rate)
+        write_prefetch_list(plan["prefetch"], args.prefetch_list)
+        print(f"Prefetch list of {len(plan['prefetch'])} regions written to {args.prefetch_list} "
+              f"(fetch them with --prefetch)")
+        sys.exit(0)
+    
     output_file = args.output
     limit = args.limit
     
@@ -702,7 +1579,10 @@ if __name__ == "__main__":
         start_time = time.time()
         
         # Run the processing with the specified limit
-        process_repeat_data(input_file, output_file, limit=limit)
+        transcript_filter = TranscriptFilter(biotypes=args.biotype, canonical_only=args.canonical_only)
+        process_repeat_data(input_file, output_file, limit=limit, retry_failed=args.retry_failed,
+                            transcript_filter=transcript_filter, both_strands=args.both_strands,
+                            prune=args.prune, fill_skipped=args.fill_skipped, min_repeats=args.min_repeats)
         
         # Calculate duration AFTER processing
         duration = time.time() - start_time
@@ -718,6 +1598,10 @@ if __name__ == "__main__":
         logging.info(f"Cache hits: {cache_stats['hits']}")
         logging.info(f"Cache misses: {cache_stats['misses']}")
         logging.info(f"Total cached items: {cache_stats['cache_size']}")
+        logging.info(f"Stored transcripts: {transcript_store.get_stats()['cache_size']}")
+        logging.info(region_flight.summary())
+        logging.info(lookup_flight.summary())
+        logging.info(window_flight.summary())
         
         logging.info(f"Total runtime: {duration:.2f} seconds")
         logging.info("========================")
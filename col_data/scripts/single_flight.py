@@ -0,0 +1,66 @@
+"""
+Coalescing of identical in-flight calls ("single flight").
+
+When several threads ask for the same key while a call for it is running,
+only the first makes the call; the others wait for it and get the same
+result, or the same exception. Used in front of the Ensembl and UniProt
+clients so concurrent repeats in one gene share their requests.
+
+Results are shared between the callers, so they must be treated as
+read-only.
+"""
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    stats counts the calls made ("calls") and the callers that waited for
+    another caller's call instead of making their own ("coalesced").
+    """
+    def __init__(self, name=""):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return fn(*args, **kwargs), sharing the call with concurrent callers of the same key"""
+        with self.lock:
+            call = self.in_flight.get(key)
+            if call is None:
+                call = self.in_flight[key] = _Call()
+                self.stats["calls"] += 1
+                leader = True
+            else:
+                self.stats["coalesced"] += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+
+    def summary(self):
+        """One line for the run summary"""
+        total = self.stats["calls"] + self.stats["coalesced"]
+        share = self.stats["coalesced"] / total * 100 if total else 0
+        return f"{self.name}: {self.stats['calls']} calls made, {self.stats['coalesced']} coalesced ({share:.1f}%)"
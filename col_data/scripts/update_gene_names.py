@@ -4,6 +4,7 @@ import os
 import requests
 from requests.adapters import HTTPAdapter, Retry
 from tqdm import tqdm
+from single_flight import SingleFlight
 
 # Constants
 API_URL = "https://rest.uniprot.org"
@@ -23,6 +24,9 @@ uniprot_cache = {}
 cache_hits = 0
 api_calls = 0
 
+# Concurrent lookups of the same UniProt ID share one request
+uniprot_flight = SingleFlight("UniProt lookups")
+
 def check_response(response):
     """Check if the API response is valid"""
     try:
@@ -36,7 +40,7 @@ def check_response(response):
 
 def get_uniprot_gene_info(uniprot_id):
     """Fetch gene name and aliases from UniProt API for a given UniProt ID"""
-    global cache_hits, api_calls
+    global cache_hits
     
     if not uniprot_id:
         return None, None
@@ -46,6 +50,17 @@ def get_uniprot_gene_info(uniprot_id):
         cache_hits += 1
         return uniprot_cache[uniprot_id]
     
+    return uniprot_flight.do(uniprot_id, fetch_uniprot_gene_info, uniprot_id)
+
+
+def fetch_uniprot_gene_info(uniprot_id):
+    """Query UniProt for an ID and cache the result (see get_uniprot_gene_info)"""
+    global api_calls
+    
+    # A lookup of the same ID may have finished since the cache was checked
+    if uniprot_id in uniprot_cache:
+        return uniprot_cache[uniprot_id]
+    
     url = f"{API_URL}/uniprotkb/{uniprot_id}.json"
     api_calls += 1
     
@@ -136,6 +151,7 @@ def main():
     print(f"Unique UniProt IDs: {unique_proteins}")
     print(f"API calls made: {api_calls}")
     print(f"Cache hits: {cache_hits}")
+    print(uniprot_flight.summary())
     if api_calls > 0:
         print(f"API call reduction: {cache_hits/(api_calls+cache_hits)*100:.2f}%")
     
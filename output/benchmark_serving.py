@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark the viewer's static serving with concurrent local clients.
+
+Serves a JSON file from a temporary directory twice, once with the old
+single-threaded socketserver.TCPServer + SimpleHTTPRequestHandler and once
+with serving.py's threaded StaticFileHandler (precompressed, with ETags), and
+fires the same concurrent download workload at both. Optionally one slow
+client sends its request headers over two seconds at the same time, which
+stalls every other client on the single-threaded server.
+
+Usage:
+    python output/benchmark_serving.py [json_file] [--clients 8] [--requests 20] [--slow-client]
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import http.client
+import http.server
+import socketserver
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from serving import StaticFileHandler, ThreadingHTTPServer, precompress_assets
+
+DEFAULT_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dynamic2', 'first500hierarch.json')
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class QuietStaticHandler(StaticFileHandler):
+    def log_message(self, format, *args):
+        pass
+
+class QuietTCPServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+def start_server(server_class, handler_class, directory):
+    """Start a server on a free port in a background thread"""
+    handler = partial(handler_class, directory=directory)
+    httpd = server_class(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+def fetch(port, path, headers):
+    """Download a path once; return (seconds, status, body bytes)"""
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    try:
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        return time.perf_counter() - start, response.status, len(body)
+    finally:
+        conn.close()
+
+def slow_client(port, path, duration=2.0):
+    """Dribble a request's headers over `duration` seconds, then read the reply
+
+    A single-threaded server is stuck reading this request the whole time.
+    """
+    request = f"GET {path} HTTP/1.0\r\nHost: localhost\r\nUser-Agent: slow-client\r\n\r\n".encode()
+    pause = duration / len(request)
+    sock = socket.create_connection(("127.0.0.1", port))
+    try:
+        for i in range(len(request)):
+            sock.sendall(request[i:i + 1])
+            time.sleep(pause)
+        while sock.recv(64 * 1024):
+            pass
+    finally:
+        sock.close()
+
+def run_workload(port, path, clients, requests, headers, with_slow_client):
+    """Run clients x requests downloads; return a summary dict"""
+    slow_thread = None
+    if with_slow_client:
+        slow_thread = threading.Thread(target=slow_client, args=(port, path), daemon=True)
+        slow_thread.start()
+        time.sleep(0.1)  # let the slow client occupy the server first
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(lambda _: fetch(port, path, headers), range(clients * requests)))
+    elapsed = time.perf_counter() - start
+
+    if slow_thread:
+        slow_thread.join()
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        'requests': len(results),
+        'elapsed': elapsed,
+        'rps': len(results) / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(0.95 * (len(latencies) - 1))],
+        'max': latencies[-1],
+        'bytes': sum(r[2] for r in results),
+        'statuses': sorted(set(r[1] for r in results)),
+    }
+
+def print_result(label, result):
+    print(f"{label:<38} {result['rps']:8.1f} req/s  p50 {result['p50'] * 1000:7.1f} ms  "
+          f"p95 {result['p95'] * 1000:7.1f} ms  max {result['max'] * 1000:7.1f} ms  {result['bytes'] / 1e6:8.1f} MB  status {result['statuses']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the viewer servers with concurrent local clients.")
+    parser.add_argument("json_file", nargs="?", default=DEFAULT_JSON, help="JSON file to serve")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients (default 8)")
+    parser.add_argument("--requests", type=int, default=20, help="Downloads per client (default 20)")
+    parser.add_argument("--slow-client", action="store_true", help="Add one client that sends its request slowly")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json_file):
+        print(f"File not found: {args.json_file}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.basename(args.json_file)
+        shutil.copy(args.json_file, os.path.join(directory, name))
+        precompress_assets(directory)
+        path = f"/{name}"
+
+        print(f"\n{args.clients} clients x {args.requests} downloads of {name} "
+              f"({os.path.getsize(args.json_file) / 1e6:.1f} MB)"
+              f"{', with one slow client' if args.slow_client else ''}\n")
+
+        baseline = start_server(QuietTCPServer, QuietHandler, directory)
+        threaded = start_server(ThreadingHTTPServer, QuietStaticHandler, directory)
+        try:
+            port = baseline.server_address[1]
+            print_result("TCPServer, identity", run_workload(
+                port, path, args.clients, args.requests, {}, args.slow_client))
+
+            port = threaded.server_address[1]
+            print_result("ThreadingHTTPServer, identity", run_workload(
+                port, path, args.clients, args.requests, {}, args.slow_client))
+            print_result("ThreadingHTTPServer, gzip", run_workload(
+                port, path, args.clients, args.requests, {'Accept-Encoding': 'gzip'}, args.slow_client))
+
+            etag = http.client.HTTPConnection("127.0.0.1", port)
+            etag.request("GET", path, headers={'Accept-Encoding': 'gzip'})
+            response = etag.getresponse()
+            response.read()
+            headers = {'Accept-Encoding': 'gzip', 'If-None-Match': response.getheader('ETag')}
+            etag.close()
+            print_result("ThreadingHTTPServer, revalidation", run_workload(
+                port, path, args.clients, args.requests, headers, args.slow_client))
+        finally:
+            baseline.shutdown()
+            threaded.shutdown()
+            baseline.server_close()
+            threaded.server_close()
+
+if __name__ == "__main__":
+    main()
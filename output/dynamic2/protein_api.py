@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+JSON API for the TandemSkip viewer, backed by the repeats SQLite database.
+
+Used by serve.py. The protein table endpoint speaks the DataTables
+server-side processing protocol, so the browser only ever receives one page
+of rows. The protein endpoint returns the same chromosome > gene >
+transcript > protein > repeat type structure as all_hierarchical.json,
+limited to a single protein, so detail.html can parse it unchanged.
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "scripts"))
+from normalize_repeat_types import normalize_repeat_type
+
+# Table columns in the order index.html declares them, mapped to SQL columns
+TABLE_COLUMNS = [
+    ("gene", "gene_name"),
+    ("uniprotId", "protein_id"),
+    ("repeatType", "repeat_type"),
+    ("repeatCount", "repeat_count"),
+    ("chromosome", "chrom"),
+    ("status", "status"),
+]
+
+STATUS_FILTERS = {
+    "reviewed": "status LIKE 'Manually reviewed%'",
+    "unreviewed": "status LIKE 'Unreviewed%'",
+}
+
+DEFAULT_PAGE_LENGTH = 15
+MAX_PAGE_LENGTH = 500
+
+
+def _first(params, key, default=None):
+    """Return the first value of a parse_qs() parameter"""
+    values = params.get(key)
+    return values[0] if values else default
+
+
+def _int_param(params, key, default):
+    try:
+        return int(_first(params, key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _is_set(params, key):
+    return _first(params, key, "").lower() in ("1", "true", "on")
+
+
+def is_available(service):
+    """Check that the database has the tables the API reads"""
+    return service.table_exists("protein_repeat_summary")
+
+
+def list_repeat_types(service):
+    """Distinct repeat types for the table's filter dropdown"""
+    rows = service.fetch_all(
+        "SELECT DISTINCT repeat_type FROM protein_repeat_summary "
+        "WHERE repeat_type IS NOT NULL ORDER BY repeat_type"
+    )
+    return {"repeat_types": [row.repeat_type for row in rows]}
+
+
+def query_protein_table(service, params):
+    """One page of the protein table for a DataTables server-side request
+
+    params is a parse_qs() dict. Besides the standard DataTables parameters
+    (draw, start, length, search[value], order[0][column], order[0][dir])
+    it accepts the viewer's filters: repeatType, status, minRepeats,
+    inFrame and nonSpanning.
+    """
+    where_clauses = []
+    where_params = []
+
+    search_value = _first(params, "search[value]", "").strip()
+    if search_value:
+        where_clauses.append("(gene_name LIKE ? OR protein_id LIKE ? OR repeat_type LIKE ?)")
+        where_params.extend([f"%{search_value}%"] * 3)
+
+    repeat_type = _first(params, "repeatType", "")
+    if repeat_type:
+        where_clauses.append("repeat_type = ?")
+        where_params.append(repeat_type)
+
+    status = _first(params, "status", "")
+    if status in STATUS_FILTERS:
+        where_clauses.append(STATUS_FILTERS[status])
+
+    min_repeats = _int_param(params, "minRepeats", 0)
+    if min_repeats > 0:
+        where_clauses.append("repeat_count >= ?")
+        where_params.append(min_repeats)
+
+    if _is_set(params, "inFrame"):
+        where_clauses.append("has_in_frame_exons = 1")
+
+    if _is_set(params, "nonSpanning"):
+        where_clauses.append("has_non_spanning_repeats = 1")
+
+    where_sql = ("WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+
+    # Only ever order by a whitelisted column
+    order_index = _int_param(params, "order[0][column]", 0)
+    if not 0 <= order_index < len(TABLE_COLUMNS):
+        order_index = 0
+    order_column = TABLE_COLUMNS[order_index][1]
+    order_dir = "DESC" if _first(params, "order[0][dir]", "asc").lower() == "desc" else "ASC"
+
+    start = max(_int_param(params, "start", 0), 0)
+    length = _int_param(params, "length", DEFAULT_PAGE_LENGTH)
+    if length < 0 or length > MAX_PAGE_LENGTH:
+        length = MAX_PAGE_LENGTH
+
+    records_total = service.scalar("SELECT COUNT(*) FROM protein_repeat_summary")
+    records_filtered = records_total
+    if where_clauses:
+        records_filtered = service.scalar(
+            f"SELECT COUNT(*) FROM protein_repeat_summary {where_sql}", where_params
+        )
+
+    rows = service.fetch_all(
+        f"""
+        SELECT gene_name, protein_id, repeat_type, repeat_count, chrom, status,
+               has_in_frame_exons, has_non_spanning_repeats
+        FROM protein_repeat_summary
+        {where_sql}
+        ORDER BY {order_column} {order_dir}, protein_id, repeat_type
+        LIMIT ? OFFSET ?
+        """,
+        where_params + [length, start]
+    )
+
+    return {
+        "draw": _int_param(params, "draw", 0),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "data": [
+            {
+                "gene": row.gene_name,
+                "uniprotId": row.protein_id,
+                "repeatType": row.repeat_type,
+                "repeatCount": row.repeat_count,
+                "chromosome": row.chrom or "",
+                "status": row.status or "",
+                "hasInFrameExons": bool(row.has_in_frame_exons),
+                "hasNonSpanningRepeats": bool(row.has_non_spanning_repeats),
+            }
+            for row in rows
+        ],
+    }
+
+
+def _split_list(value):
+    """Turn a comma separated column back into a list"""
+    if not value:
+        return []
+    return value.split(",")
+
+
+def get_protein_detail(service, protein_id):
+    """The hierarchical subtree for one protein, or None if it is unknown
+
+    Each repeat is filed under its canonical transcript (or its first
+    transcript if none is canonical), as convert_to_hierarchical.py does,
+    and grouped by normalize_repeat_type like protein_repeat_summary.
+    Transcripts and exons of all the repeats come from one query each.
+    """
+    protein = service.fetch_one(
+        """
+        SELECT p.protein_id, p.status, g.gene_id, g.gene_name, g.gene_type
+        FROM proteins p
+        JOIN genes g ON p.gene_id = g.gene_id
+        WHERE p.protein_id = ?
+        """,
+        (protein_id,)
+    )
+    if protein is None:
+        return None
+
+    aliases = [row.alias_name for row in service.fetch_all(
+        "SELECT alias_name FROM gene_aliases WHERE gene_id = ? ORDER BY alias_id",
+        (protein.gene_id,)
+    )]
+
+    repeats = service.fetch_all(
+        """
+        SELECT repeat_id, repeat_type, start_pos, end_pos, chrom, chrom_start, chrom_end,
+               strand, repeat_length, position, reserved, block_count, block_sizes, block_starts
+        FROM repeats
+        WHERE protein_id = ?
+        ORDER BY start_pos, repeat_id
+        """,
+        (protein_id,)
+    )
+
+    # Each repeat's canonical (else first) transcript: the first row per repeat
+    repeat_transcripts = {}
+    for row in service.fetch_all(
+        """
+        SELECT rt.repeat_id, t.transcript_id, t.versioned_transcript_id, t.transcript_name,
+               t.is_canonical, t.biotype, t.exon_count, rt.location
+        FROM repeats r
+        JOIN repeat_transcripts rt ON rt.repeat_id = r.repeat_id
+        JOIN transcripts t ON rt.transcript_id = t.transcript_id
+        WHERE r.protein_id = ?
+        ORDER BY rt.repeat_id, t.is_canonical DESC, rt.rowid
+        """,
+        (protein_id,)
+    ):
+        repeat_transcripts.setdefault(row.repeat_id, row)
+
+    # Exons of each repeat, per transcript they belong to
+    repeat_exons = {}
+    for row in service.fetch_all(
+        """
+        SELECT re.repeat_id, te.transcript_id, te.exon_number, e.ensembl_exon_id, te.overlap_bp,
+               te.exon_position_in_transcript, te.overlap_percentage,
+               e.coding_status, e.utr_status, e.coding_percentage,
+               e.phase, e.end_phase, e.frame_status
+        FROM repeats r
+        JOIN repeat_exons re ON re.repeat_id = r.repeat_id
+        JOIN exons e ON re.exon_id = e.exon_id
+        JOIN transcript_exons te ON te.exon_id = e.exon_id
+        WHERE r.protein_id = ?
+        ORDER BY te.exon_number
+        """,
+        (protein_id,)
+    ):
+        repeat_exons.setdefault((row.repeat_id, row.transcript_id), []).append(row)
+
+    gene_slot = {
+        "gene_metadata": {"aliases": aliases, "geneType": protein.gene_type},
+        "transcripts": {},
+    }
+    chrom = None
+
+    for repeat in repeats:
+        chrom = chrom or repeat.chrom
+
+        transcript = repeat_transcripts.get(repeat.repeat_id)
+        transcript_id = transcript.transcript_id if transcript else "unknown_transcript"
+
+        transcript_slot = gene_slot["transcripts"].setdefault(transcript_id, {
+            "transcript": {
+                "transcript_id": transcript.transcript_id,
+                "versioned_transcript_id": transcript.versioned_transcript_id,
+                "transcript_name": transcript.transcript_name,
+                "is_canonical": bool(transcript.is_canonical),
+                "biotype": transcript.biotype,
+                "location": transcript.location,
+                "exon_count": transcript.exon_count,
+                "strand": repeat.strand,
+            } if transcript else None,
+            "proteins": {},
+        })
+        protein_slot = transcript_slot["proteins"].setdefault(protein_id, {
+            "protein_metadata": {"uniProtId": protein_id, "status": protein.status},
+            "repeat_types": {},
+        })
+        repeat_type = normalize_repeat_type(repeat.repeat_type)
+        repeat_type_slot = protein_slot["repeat_types"].setdefault(
+            repeat_type, {"repeats": [], "exons": [], "_exon_ids": set()}
+        )
+
+        exons = repeat_exons.get((repeat.repeat_id, transcript_id), []) if transcript else []
+
+        for exon in exons:
+            if exon.ensembl_exon_id in repeat_type_slot["_exon_ids"]:
+                continue
+            repeat_type_slot["_exon_ids"].add(exon.ensembl_exon_id)
+            repeat_type_slot["exons"].append({
+                "exon_number": exon.exon_number,
+                "exon_id": exon.ensembl_exon_id,
+                "overlap_bp": exon.overlap_bp,
+                "position": exon.exon_position_in_transcript,
+                "overlap_percentage": exon.overlap_percentage,
+                "coding_status": exon.coding_status,
+                "utr_status": exon.utr_status,
+                "coding_percentage": exon.coding_percentage,
+                "phase": exon.phase,
+                "end_phase": exon.end_phase,
+                "frame_status": exon.frame_status,
+            })
+
+        try:
+            reserved = json.loads(repeat.reserved) if repeat.reserved else []
+        except ValueError:
+            reserved = []
+
+        repeat_type_slot["repeats"].append({
+            "chromStart": repeat.chrom_start,
+            "chromEnd": repeat.chrom_end,
+            "strand": repeat.strand,
+            "reserved": reserved,
+            "blockCount": repeat.block_count,
+            "blockSizes": _split_list(repeat.block_sizes),
+            "chromStarts": _split_list(repeat.block_starts),
+            "position": repeat.position,
+            "repeatLength": repeat.repeat_length,
+            "protein_start": repeat.start_pos,
+            "protein_end": repeat.end_pos,
+            "containing_exons": [exon.ensembl_exon_id for exon in exons],
+            "repeatType": repeat_type,
+        })
+
+    # Drop the dedup helpers before serialising
+    for transcript_slot in gene_slot["transcripts"].values():
+        for protein_slot in transcript_slot["proteins"].values():
+            for repeat_type_slot in protein_slot["repeat_types"].values():
+                del repeat_type_slot["_exon_ids"]
+
+    return {chrom or "unknown_chrom": {protein.gene_name: gene_slot}}
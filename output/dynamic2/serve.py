@@ -2,89 +2,228 @@
 """
 Simple HTTP server to serve the Tandem Repeat Domain Database files.
 This helps avoid CORS issues when accessing the JSON data.
+
+When the repeats SQLite database is available the server also offers a
+paginated JSON API (see protein_api.py), which index.html and detail.html
+use instead of downloading all_hierarchical.json.
+
+Files are served by a threaded server with ETags, byte ranges and
+precompressed variants (see output/serving.py).
 """
 
-import http.server
-import socketserver
 import os
 import sys
 import json
+import argparse
+import sqlite3
+import threading
+from urllib.parse import urlparse, parse_qs, unquote
+
+import protein_api
 
 # Default port
 PORT = 8020
 
-class CustomHandler(http.server.SimpleHTTPRequestHandler):
-    """Custom HTTP request handler with JSON file info endpoint"""
-    
+# Project root, two levels up from output/dynamic2
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DB_PATH = os.path.join(PROJECT_ROOT, 'test_sqlite', 'repeats.db')
+
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'test_sqlite'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'output'))
+from query_service import QueryService
+from serving import StaticFileHandler, ThreadingHTTPServer, precompress_assets
+
+# Sidecar next to a JSON file holding its /fileinfo metadata
+FILEINFO_SIDECAR_SUFFIX = '.fileinfo.json'
+PREVIEW_CHARS = 1000
+
+# In-memory metadata per JSON path: (mtime_ns, size, metadata)
+_file_metadata_cache = {}
+_file_metadata_lock = threading.Lock()
+
+def compute_file_metadata(json_path):
+    """Parse the hierarchical JSON once and summarise it"""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+
+    chromosomes = [k for k in data.keys() if k.startswith('chr')]
+    gene_counts = {chrom: len(data[chrom]) for chrom in chromosomes}
+    metadata = {
+        'valid_json': True,
+        'top_level_keys': list(data.keys()),
+        'chromosome_count': len(chromosomes),
+        'gene_counts': gene_counts,
+        'total_gene_count': sum(gene_counts.values()),
+    }
+    if chromosomes:
+        metadata['first_chromosome'] = chromosomes[0]
+        metadata['gene_count_in_first_chrom'] = gene_counts[chromosomes[0]]
+    return metadata
+
+def read_metadata_sidecar(sidecar_path, mtime_ns, size):
+    """Return the sidecar's metadata if it was computed for this version of the file"""
+    try:
+        with open(sidecar_path, 'r') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if sidecar.get('source_mtime_ns') != mtime_ns or sidecar.get('source_size') != size:
+        return None
+    return sidecar.get('metadata')
+
+def write_metadata_sidecar(sidecar_path, mtime_ns, size, metadata):
+    """Write the sidecar atomically; a read-only directory just means no sidecar"""
+    tmp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'source_mtime_ns': mtime_ns, 'source_size': size, 'metadata': metadata}, f)
+        os.replace(tmp_path, sidecar_path)
+    except OSError as e:
+        print(f"⚠️  Could not write {sidecar_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_file_metadata(json_path, mtime_ns, size):
+    """Metadata for the given version of json_path, parsing the file at most once
+
+    Looks in memory first, then in the sidecar file, and only parses the
+    JSON when the file changed since either was written.
+    """
+    cached = _file_metadata_cache.get(json_path)
+    if cached and cached[:2] == (mtime_ns, size):
+        return cached[2]
+
+    with _file_metadata_lock:
+        cached = _file_metadata_cache.get(json_path)
+        if cached and cached[:2] == (mtime_ns, size):
+            return cached[2]
+
+        sidecar_path = json_path + FILEINFO_SIDECAR_SUFFIX
+        metadata = read_metadata_sidecar(sidecar_path, mtime_ns, size)
+        if metadata is None:
+            try:
+                metadata = compute_file_metadata(json_path)
+            except Exception as e:
+                metadata = {'valid_json': False, 'error': str(e)}
+            write_metadata_sidecar(sidecar_path, mtime_ns, size, metadata)
+
+        _file_metadata_cache[json_path] = (mtime_ns, size, metadata)
+        return metadata
+
+def get_file_info(json_path):
+    """The /fileinfo response: a stat, a short preview and the cached metadata"""
+    try:
+        stat = os.stat(json_path)
+    except OSError:
+        return {'exists': False, 'size': 0, 'modified': 0}
+
+    file_info = {
+        'exists': True,
+        'size': stat.st_size,
+        'modified': stat.st_mtime,
+    }
+    if stat.st_size > 0:
+        try:
+            with open(json_path, 'r') as f:
+                file_info['preview'] = f.read(PREVIEW_CHARS)
+        except Exception as e:
+            file_info['valid_json'] = False
+            file_info['error'] = str(e)
+            return file_info
+        file_info.update(load_file_metadata(json_path, stat.st_mtime_ns, stat.st_size))
+    return file_info
+
+class CustomHandler(StaticFileHandler):
+    """Static file handler with JSON file info endpoint and the protein API"""
+
+    # Shared QueryService, set by run_server when the database is usable
+    query_service = None
+
+    def send_json(self, payload, status=200):
+        """Send a compact JSON response"""
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        self.send_bytes(body, 'application/json', status)
+
+    def handle_api(self, url):
+        """Dispatch /api/ requests to protein_api"""
+        if self.query_service is None:
+            self.send_json({'error': 'No database available, serve.py runs in static mode'}, 404)
+            return
+
+        params = parse_qs(url.query)
+        try:
+            if url.path == '/api/proteins':
+                self.send_json(protein_api.query_protein_table(self.query_service, params))
+            elif url.path == '/api/repeat-types':
+                self.send_json(protein_api.list_repeat_types(self.query_service))
+            elif url.path.startswith('/api/protein/'):
+                protein_id = unquote(url.path[len('/api/protein/'):])
+                detail = protein_api.get_protein_detail(self.query_service, protein_id)
+                if detail is None:
+                    self.send_json({'error': f'Unknown protein: {protein_id}'}, 404)
+                else:
+                    self.send_json(detail)
+            else:
+                self.send_json({'error': f'Unknown endpoint: {url.path}'}, 404)
+        except sqlite3.Error as e:
+            self.send_json({'error': f'Database error: {e}'}, 500)
+
     def do_GET(self):
         """Handle GET requests"""
+        url = urlparse(self.path)
+        if url.path.startswith('/api/'):
+            return self.handle_api(url)
+
         # Add an endpoint to check JSON file info
-        if self.path == '/fileinfo':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
-            # Get the path to the hierarchical JSON file
+        if url.path == '/fileinfo':
             current_dir = os.path.dirname(os.path.abspath(__file__))
             json_path = os.path.join(current_dir, 'all_hierarchical.json')
-            
-            # Collect file info
-            file_info = {
-                'exists': os.path.exists(json_path),
-                'size': os.path.getsize(json_path) if os.path.exists(json_path) else 0,
-                'modified': os.path.getmtime(json_path) if os.path.exists(json_path) else 0,
-            }
-            
-            # Try to read the first few bytes to check format
-            if file_info['exists'] and file_info['size'] > 0:
-                try:
-                    with open(json_path, 'r') as f:
-                        # Read first 1000 characters
-                        file_start = f.read(1000)
-                        file_info['preview'] = file_start
-                        
-                        # Try to parse the entire file to verify it's valid JSON
-                        f.seek(0)  # Go back to start of file
-                        data = json.load(f)
-                        file_info['valid_json'] = True
-                        file_info['top_level_keys'] = list(data.keys())
-                        
-                        # Count chromosomes, genes, etc.
-                        chromosomes = [k for k in data.keys() if k.startswith('chr')]
-                        file_info['chromosome_count'] = len(chromosomes)
-                        
-                        # Count genes for first chromosome
-                        if chromosomes:
-                            first_chrom = chromosomes[0]
-                            gene_count = len(data[first_chrom])
-                            file_info['first_chromosome'] = first_chrom
-                            file_info['gene_count_in_first_chrom'] = gene_count
-                        
-                except Exception as e:
-                    file_info['valid_json'] = False
-                    file_info['error'] = str(e)
-            
-            self.wfile.write(json.dumps(file_info, indent=2).encode())
+            self.send_json(get_file_info(json_path))
             return
             
         # For all other requests, use the default handler
-        return http.server.SimpleHTTPRequestHandler.do_GET(self)
+        return super().do_GET()
+
+def open_query_service(db_path):
+    """Open the database for the API, or return None to serve static files only"""
+    if not os.path.exists(db_path):
+        print(f"⚠️  Database not found at {db_path}, the /api/ endpoints are disabled")
+        return None
+    try:
+        service = QueryService(db_path)
+        if not protein_api.is_available(service):
+            print(f"⚠️  {db_path} has no protein_repeat_summary table, the /api/ endpoints are disabled")
+            print("   Build it with: python test_sqlite/populate_database.py --rebuild-derived <db_file>")
+            service.close()
+            return None
+        return service
+    except sqlite3.Error as e:
+        print(f"⚠️  Could not open {db_path}: {e}")
+        return None
 
-def run_server(port):
-    """Run a simple HTTP server on the specified port"""
+def run_server(port, db_path=DEFAULT_DB_PATH, precompress=False):
+    """Run a threaded HTTP server on the specified port"""
     
     # Set directory to script directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(current_dir)
+
+    if precompress:
+        print("🗜️  Precompressing assets...")
+        precompress_assets(current_dir)
+
+    CustomHandler.query_service = open_query_service(db_path)
     
     # Create and configure the server with our custom handler
-    with socketserver.TCPServer(("", port), CustomHandler) as httpd:
+    with ThreadingHTTPServer(("", port), CustomHandler) as httpd:
         print(f"\n✅ Server started at http://localhost:{port}")
         print("📂 Serving files from:", os.getcwd())
         print("🧬 To view the Tandem Repeat Domain Database:")
         print(f"   - Main viewer: http://localhost:{port}/index.html")
         print(f"   - Detail pages: http://localhost:{port}/detail.html?id=[UNIPROT_ID]")
         print(f"   - JSON file info: http://localhost:{port}/fileinfo")
+        if CustomHandler.query_service:
+            print(f"   - Protein API: http://localhost:{port}/api/proteins (database: {db_path})")
         print("\nPress Ctrl+C to stop the server.\n")
         
         try:
@@ -93,14 +232,19 @@ def run_server(port):
             print("\nServer stopped.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the TandemSkip viewer and its protein API.")
+    parser.add_argument("port", nargs="?", default=str(PORT), help=f"Port to listen on (default {PORT})")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database backing the /api/ endpoints")
+    parser.add_argument("--precompress", action="store_true",
+                        help="Write .gz/.br variants of the JSON and HTML assets before serving")
+    args = parser.parse_args()
+
     # Get port from command line args or use default
-    port = PORT
-    if len(sys.argv) > 1:
-        try:
-            port = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid port: {sys.argv[1]}")
-            print(f"Using default port {PORT}")
-            port = PORT
+    try:
+        port = int(args.port)
+    except ValueError:
+        print(f"Invalid port: {args.port}")
+        print(f"Using default port {PORT}")
+        port = PORT
     
-    run_server(port)
\ No newline at end of file
+    run_server(port, os.path.abspath(args.db), args.precompress)
\ No newline at end of file
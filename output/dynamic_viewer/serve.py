@@ -2,28 +2,41 @@
 """
 Simple HTTP server to serve the Tandem Repeat Domain Database files.
 This helps avoid CORS issues when accessing the JSON data.
+
+Files are served by a threaded server with ETags, byte ranges and
+precompressed variants (see output/serving.py).
 """
 
-import http.server
-import socketserver
 import os
 import sys
+import argparse
+
+# Project root, two levels up from output/dynamic_viewer
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'output'))
+from serving import StaticFileHandler, ThreadingHTTPServer, precompress_assets
 
 # Default port
 PORT = 8021
 
-def run_server(port):
-    """Run a simple HTTP server on the specified port"""
-    handler = http.server.SimpleHTTPRequestHandler
+# Directories holding the assets the viewer downloads
+ASSET_DIRS = ['docs', os.path.join('output', 'protein_pages')]
+
+def run_server(port, precompress=False):
+    """Run a threaded HTTP server on the specified port"""
     
     # Set directory to project root instead of script directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # Go up two levels: from output/dynamic_viewer to project root
-    project_root = os.path.dirname(os.path.dirname(current_dir))
-    os.chdir(project_root)
+    os.chdir(PROJECT_ROOT)
+
+    if precompress:
+        print("🗜️  Precompressing assets...")
+        for directory in ASSET_DIRS:
+            if os.path.isdir(directory):
+                precompress_assets(directory)
     
     # Create and configure the server
-    with socketserver.TCPServer(("", port), handler) as httpd:
+    with ThreadingHTTPServer(("", port), StaticFileHandler) as httpd:
         print(f"\n✅ Server started at http://localhost:{port}")
         print("📂 Serving files from:", os.getcwd())
         print("🧬 To view the Tandem Repeat Domain Database:")
@@ -37,11 +50,17 @@ def run_server(port):
             print("\nServer stopped.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Tandem Repeat Domain Database viewer.")
+    parser.add_argument("port", nargs="?", default=str(PORT), help=f"Port to listen on (default {PORT})")
+    parser.add_argument("--precompress", action="store_true",
+                        help="Write .gz/.br variants of the viewer assets before serving")
+    args = parser.parse_args()
+
     # Use command line argument for port if provided
-    if len(sys.argv) > 1:
-        try:
-            PORT = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid port: {sys.argv[1]}. Using default port {PORT}.")
+    try:
+        port = int(args.port)
+    except ValueError:
+        print(f"Invalid port: {args.port}. Using default port {PORT}.")
+        port = PORT
     
-    run_server(PORT)
\ No newline at end of file
+    run_server(port, args.precompress)
@@ -1,54 +1,31 @@
-import json
 import os
+import sys
 
-# Use absolute path or correct relative path
-file_path = '/home/dogdorgesh/Documents/Github/Tandem-Repeat-Domain-Database/output/DEF_gname_hg38_repeats.json'
+# The counts come from the gene_names metric of scripts/qc_report.py, which
+# also runs it together with the other dataset QC metrics in one pass
+output_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(output_dir), 'scripts'))
+from json_stream import iter_json_array
+from qc_report import GeneNameMetric
 
-# Load the JSON data
-with open(file_path, 'r') as f:
-    data = json.load(f)
+# Dataset and directory for the ID lists, from the command line or next to this script
+file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(output_dir, 'DEF_gname_hg38_repeats.json')
+if len(sys.argv) > 2:
+    output_dir = sys.argv[2]
 
-# Initialize counters
-missing_gene_name_count = 0
-missing_aliases_count = 0
-unreviewed_count = 0
-missing_gene_and_unreviewed = 0
-total_entries = len(data)
+# Stream the JSON data through the metric
+metric = GeneNameMetric()
+for entry in iter_json_array(file_path):
+    metric.observe(entry)
 
-# Track unique proteins without gene names
-proteins_without_gene_names = set()
-unreviewed_proteins = set()
-unreviewed_without_gene_names = set()
-
-# Check each entry
-for entry in data:
-    # Check for missing or empty geneName
-    has_no_gene_name = 'geneName' not in entry or entry.get('geneName', '') == ""
-    is_unreviewed = 'status' in entry and 'Unreviewed' in entry['status']
-    
-    if has_no_gene_name:
-        missing_gene_name_count += 1
-        
-        # Add the UniProtId to our set if it exists
-        if 'uniProtId' in entry and entry['uniProtId']:
-            proteins_without_gene_names.add(entry['uniProtId'])
-    
-    if is_unreviewed:
-        unreviewed_count += 1
-        if 'uniProtId' in entry and entry['uniProtId']:
-            unreviewed_proteins.add(entry['uniProtId'])
-            
-    if has_no_gene_name and is_unreviewed:
-        missing_gene_and_unreviewed += 1
-        if 'uniProtId' in entry and entry['uniProtId']:
-            unreviewed_without_gene_names.add(entry['uniProtId'])
-    
-    # Check for missing or empty aliases - handle different formats
-    if ('aliases' not in entry or 
-        entry.get('aliases', '') == "" or 
-        entry.get('aliases', []) == [] or
-        (isinstance(entry.get('aliases', []), list) and len(entry.get('aliases', [])) == 0)):
-        missing_aliases_count += 1
+total_entries = metric.total
+missing_gene_name_count = metric.missing_gene_name
+missing_aliases_count = metric.missing_aliases
+unreviewed_count = metric.unreviewed
+missing_gene_and_unreviewed = metric.missing_gene_and_unreviewed
+proteins_without_gene_names = metric.proteins_without_gene_names
+unreviewed_proteins = metric.unreviewed_proteins
+unreviewed_without_gene_names = metric.unreviewed_without_gene_names
 
 # Print results
 print(f"Total entries: {total_entries}")
@@ -60,19 +37,19 @@ print(f"Unique unreviewed proteins without gene names: {len(unreviewed_without_g
 print(f"Entries without aliases: {missing_aliases_count} ({missing_aliases_count/total_entries*100:.2f}%)")
 
 # Save proteins without gene names to a text file
-output_file = '/home/dogdorgesh/Documents/Github/Tandem-Repeat-Domain-Database/output/proteins_without_gene_names.txt'
+output_file = os.path.join(output_dir, 'proteins_without_gene_names.txt')
 with open(output_file, 'w') as f:
     for protein in sorted(proteins_without_gene_names):
         f.write(f"{protein}\n")
 
 # Save unreviewed proteins list
-unreviewed_file = '/home/dogdorgesh/Documents/Github/Tandem-Repeat-Domain-Database/output/unreviewed_proteins.txt'
+unreviewed_file = os.path.join(output_dir, 'unreviewed_proteins.txt')
 with open(unreviewed_file, 'w') as f:
     for protein in sorted(unreviewed_proteins):
         f.write(f"{protein}\n")
 
 # Save unreviewed proteins without gene names
-unreviewed_no_gene_file = '/home/dogdorgesh/Documents/Github/Tandem-Repeat-Domain-Database/output/unreviewed_proteins_without_gene_names.txt'
+unreviewed_no_gene_file = os.path.join(output_dir, 'unreviewed_proteins_without_gene_names.txt')
 with open(unreviewed_no_gene_file, 'w') as f:
     for protein in sorted(unreviewed_without_gene_names):
         f.write(f"{protein}\n")
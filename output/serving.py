@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Shared static file serving for the viewer servers (dynamic2 and dynamic_viewer).
+
+http.server's SimpleHTTPRequestHandler on a socketserver.TCPServer handles one
+request at a time and always sends whole, uncompressed files. This module adds:
+
+- ThreadingHTTPServer, so a slow client downloading a large JSON file does not
+  block everyone else
+- precompressed .gz (and .br, when the brotli package is installed) variants
+  of JSON, HTML, JS and CSS assets, served when the client accepts them
+- ETag / If-None-Match revalidation (304 Not Modified)
+- single byte range requests (206 Partial Content)
+
+Precompress a directory ahead of time with:
+    python output/serving.py precompress output/dynamic2
+"""
+
+import os
+import sys
+import gzip
+import shutil
+import argparse
+import http.server
+from email.utils import formatdate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions worth compressing, and the smallest file worth it
+COMPRESSIBLE_EXTENSIONS = ('.json', '.html', '.js', '.css', '.svg', '.txt')
+MIN_COMPRESS_SIZE = 1024
+
+# Content-Encoding -> suffix of the precompressed variant, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+class ThreadingHTTPServer(http.server.ThreadingHTTPServer):
+    """Threaded server that does not wait for open connections on shutdown"""
+    daemon_threads = True
+    allow_reuse_address = True
+    # socketserver's default listen backlog of 5 drops bursts of connections
+    request_queue_size = 128
+
+def make_etag(stat, encoding=None):
+    """Strong ETag from the file's size and modification time"""
+    etag = f'{stat.st_size:x}-{stat.st_mtime_ns:x}'
+    if encoding:
+        etag += f'-{encoding}'
+    return f'"{etag}"'
+
+def parse_range(header, size):
+    """Parse a single 'bytes=' range into (start, end) inclusive
+
+    Returns None when the header should be ignored (missing, malformed or a
+    multi-range request) and 'unsatisfiable' when no byte of it exists.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start_text, _, end_text = header[len('bytes='):].strip().partition('-')
+    try:
+        if start_text == '':
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+def accepted_encodings(header):
+    """Content-Encodings the client accepts (ignoring q=0)"""
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+class StaticFileHandler(http.server.SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler with precompressed variants, ETags and ranges"""
+
+    # Clients may cache, but must revalidate with the ETag
+    cache_control = 'no-cache'
+
+    def end_headers(self):
+        # Every response on this server may differ by Accept-Encoding
+        self.send_header('Vary', 'Accept-Encoding')
+        super().end_headers()
+
+    def find_variant(self, path, stat):
+        """Pick a fresh precompressed variant of path the client accepts"""
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+            return path, stat, None
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(path + suffix)
+            except OSError:
+                continue
+            # A variant older than its source is stale
+            if variant_stat.st_mtime_ns >= stat.st_mtime_ns:
+                return path + suffix, variant_stat, encoding
+        return path, stat, None
+
+    def send_head(self):
+        """Serve files ourselves; directories keep the default behaviour"""
+        self.byte_range = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or path.endswith('/'):
+            return super().send_head()
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        content_type = self.guess_type(path)
+        file_path, file_stat, encoding = self.find_variant(path, stat)
+        etag = make_etag(stat, encoding)
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in if_none_match):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', self.cache_control)
+            self.end_headers()
+            return None
+
+        try:
+            f = open(file_path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        size = file_stat.st_size
+        byte_range = None
+        # Ranges only apply to the identity encoding, and If-Range must still match
+        if encoding is None and 'Range' in self.headers:
+            if_range = self.headers.get('If-Range')
+            if if_range is None or if_range.strip() == etag:
+                byte_range = parse_range(self.headers['Range'], size)
+
+        try:
+            if byte_range == 'unsatisfiable':
+                f.close()
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                self.send_header('Content-Length', str(end - start + 1))
+                f.seek(start)
+                self.byte_range = (start, end)
+            else:
+                self.send_response(200)
+                self.send_header('Content-Length', str(size))
+
+            self.send_header('Content-type', content_type)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            else:
+                self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(stat.st_mtime, usegmt=True))
+            self.send_header('Cache-Control', self.cache_control)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+    def copyfile(self, source, outputfile):
+        """Copy the whole file, or only the requested byte range"""
+        if not getattr(self, 'byte_range', None):
+            return super().copyfile(source, outputfile)
+        start, end = self.byte_range
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+    def send_bytes(self, body, content_type, status=200):
+        """Send an in-memory body, gzip-compressed if the client accepts it"""
+        encoding = None
+        if len(body) >= MIN_COMPRESS_SIZE and 'gzip' in accepted_encodings(self.headers.get('Accept-Encoding')):
+            body = gzip.compress(body, compresslevel=5)
+            encoding = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def _write_variant(source_path, variant_path, data):
+    """Write a variant atomically, with the source's timestamps marking it fresh"""
+    tmp_path = f"{variant_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    shutil.copystat(source_path, tmp_path)
+    os.replace(tmp_path, variant_path)
+
+def precompress_file(path):
+    """Write the .gz (and .br) variants of one file if they are missing or stale
+
+    Returns the list of variants written.
+    """
+    stat = os.stat(path)
+    written = []
+    data = None
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        variant = path + suffix
+        try:
+            if os.stat(variant).st_mtime_ns >= stat.st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        _write_variant(path, variant, compressed)
+        written.append(variant)
+    return written
+
+def precompress_assets(directory, recursive=False):
+    """Precompress every compressible asset in a directory
+
+    Returns the number of variants written.
+    """
+    count = 0
+    for root, dirs, files in os.walk(directory):
+        if not recursive:
+            dirs[:] = []
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d != '__pycache__']
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            variants = precompress_file(path)
+            for variant in variants:
+                print(f"   {variant}: {os.path.getsize(path)} -> {os.path.getsize(variant)} bytes")
+            count += len(variants)
+    if brotli is None:
+        print("   (install the brotli package to also write .br variants)")
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Helpers for serving the viewer's static assets.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    precompress = subparsers.add_parser('precompress', help="Write .gz/.br variants of JSON, HTML, JS and CSS files")
+    precompress.add_argument('directories', nargs='+', help="Directories to precompress")
+    precompress.add_argument('--recursive', action='store_true', help="Include subdirectories")
+    args = parser.parse_args()
+
+    if args.command == 'precompress':
+        total = 0
+        for directory in args.directories:
+            if not os.path.isdir(directory):
+                print(f"Not a directory: {directory}")
+                sys.exit(1)
+            total += precompress_assets(directory, args.recursive)
+        print(f"Wrote {total} compressed variants")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Convert flat annotated repeat JSON into the viewer's hierarchical layout:
+chromosome > gene > transcript > protein > repeat type.
+
+The input files are streamed (json_stream.iter_json_array) and every entry
+is spooled to a JSON Lines file for its chromosome. The chromosomes are then
+converted in parallel worker processes, each holding only the chromosome it
+works on, and written as compact JSON shards with an index.json listing
+them. Memory is therefore bounded by the largest chromosome rather than by
+the whole dataset.
+
+--combined additionally writes the single all_hierarchical.json file the
+viewers load, by concatenating the shards (chromosomes in first-seen order).
+
+--viewer-dir writes the files output/dynamic2 loads instead of that single
+file: summary.json with the rows of the protein table, and one
+proteins/<UniProt ID>.json per protein holding only its part of the
+hierarchy, so the detail page downloads a few KB instead of the whole set.
+
+Usage:
+    python scripts/convert_to_hierarchical.py input.json [more.json ...] -o out_dir [--workers N]
+        [--combined all_hierarchical.json] [--viewer-dir output/dynamic2]
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from json_stream import iter_json_array
+from normalize_repeat_types import normalize_repeat_type
+
+INDEX_FILE = "index.json"
+SUMMARY_FILE = "summary.json"
+PROTEIN_DIR = "proteins"
+COMPACT = (",", ":")
+
+# Entry fields that are represented by the hierarchy itself
+HIERARCHY_KEYS = {
+    "geneName", "uniProtId", "repeatType", "status", "aliases", "geneType",
+    "chrom", "ensembl_exon_info"
+}
+
+def get_transcript_obj(repeat):
+    transcripts = repeat.get("ensembl_exon_info", {}).get("transcripts", [])
+    for t in transcripts:
+        if t.get("is_canonical"):
+            return t
+    if transcripts:
+        return transcripts[0]
+    return None
+
+def get_transcript_id(transcript):
+    if not transcript:
+        return "unknown_transcript"
+    return transcript.get("transcript_id") or transcript.get("transcript_name") or "unknown_transcript"
+
+def get_gene_name(repeat):
+    return repeat.get("geneName") or "unknown_gene"
+
+def get_gene_metadata(repeat):
+    return {
+        "aliases": repeat.get("aliases"),
+        "geneType": repeat.get("geneType"),
+    }
+
+def get_protein_id(repeat):
+    return repeat.get("uniProtId") or "unknown_protein"
+
+def get_protein_metadata(repeat):
+    return {
+        "uniProtId": repeat.get("uniProtId"),
+        "status": repeat.get("status"),
+    }
+
+def get_chrom(repeat):
+    return repeat.get("chrom") or "unknown_chrom"
+
+def get_repeat_specific_info(repeat):
+    return {k: v for k, v in repeat.items() if k not in HIERARCHY_KEYS}
+
+def shard_file_name(name):
+    """File name of the shard of a chromosome or protein"""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".json"
+
+class ChromosomeBuilder:
+    """Builds the gene > transcript > protein > repeat type tree of one chromosome
+
+    Exons are deduplicated per repeat type through a dict keyed on exon_id,
+    so adding a repeat costs the same however many exons were seen before.
+    """
+
+    def __init__(self):
+        self.genes = {}
+        self.repeat_count = 0
+        # id(repeat type slot) -> {exon_id: exon}, kept out of the tree
+        self._exons = {}
+
+    def add(self, repeat):
+        transcript_obj = get_transcript_obj(repeat)
+        transcript_id = get_transcript_id(transcript_obj)
+
+        gene = get_gene_name(repeat)
+        gene_slot = self.genes.get(gene)
+        if gene_slot is None:
+            gene_slot = self.genes[gene] = {
+                "gene_metadata": get_gene_metadata(repeat),
+                "transcripts": {},
+            }
+
+        transcript_slot = gene_slot["transcripts"].get(transcript_id)
+        if transcript_slot is None:
+            transcript_slot = gene_slot["transcripts"][transcript_id] = {"transcript": None, "proteins": {}}
+        if transcript_slot["transcript"] is None and transcript_obj:
+            transcript_meta = dict(transcript_obj)
+            transcript_meta.pop("containing_exons", None)
+            transcript_slot["transcript"] = transcript_meta
+
+        protein_id = get_protein_id(repeat)
+        protein_slot = transcript_slot["proteins"].get(protein_id)
+        if protein_slot is None:
+            protein_slot = transcript_slot["proteins"][protein_id] = {
+                "protein_metadata": get_protein_metadata(repeat),
+                "repeat_types": {},
+            }
+
+        # Group by normalized repeat type
+        repeat_type = normalize_repeat_type(repeat.get("repeatType"))
+        repeat_type_slot = protein_slot["repeat_types"].get(repeat_type)
+        if repeat_type_slot is None:
+            repeat_type_slot = protein_slot["repeat_types"][repeat_type] = {"repeats": [], "exons": []}
+            self._exons[id(repeat_type_slot)] = {}
+        exon_id_to_obj = self._exons[id(repeat_type_slot)]
+
+        repeat_exon_ids = []
+        exon_info = repeat.get("ensembl_exon_info") or {}
+        for t in exon_info.get("transcripts", []):
+            if get_transcript_id(t) == transcript_id and t.get("containing_exons"):
+                for exon in t["containing_exons"]:
+                    exon_id = exon.get("exon_id")
+                    if exon_id:
+                        if exon_id not in exon_id_to_obj:
+                            exon_id_to_obj[exon_id] = exon
+                            repeat_type_slot["exons"].append(exon)
+                        repeat_exon_ids.append(exon_id)
+                break
+
+        repeat_info = get_repeat_specific_info(repeat)
+        repeat_info["containing_exons"] = repeat_exon_ids
+        # Store the *normalized* repeatType for reference
+        repeat_info["repeatType"] = repeat_type
+        repeat_type_slot["repeats"].append(repeat_info)
+        self.repeat_count += 1
+
+def protein_trees(chrom, genes):
+    """Split a chromosome into {protein ID: the protein's part of the hierarchy}
+
+    Each tree keeps the full chromosome > gene > transcript > protein layout,
+    so the viewer reads it exactly like all_hierarchical.json.
+    """
+    trees = {}
+    for gene_name, gene_slot in genes.items():
+        for transcript_id, transcript_slot in gene_slot["transcripts"].items():
+            for protein_id, protein_slot in transcript_slot["proteins"].items():
+                chrom_genes = trees.setdefault(protein_id, {chrom: {}})[chrom]
+                gene_tree = chrom_genes.get(gene_name)
+                if gene_tree is None:
+                    gene_tree = chrom_genes[gene_name] = {
+                        "gene_metadata": gene_slot["gene_metadata"],
+                        "transcripts": {},
+                    }
+                gene_tree["transcripts"][transcript_id] = {
+                    "transcript": transcript_slot["transcript"],
+                    "proteins": {protein_id: protein_slot},
+                }
+    return trees
+
+def summary_rows(chrom, genes):
+    """Rows of the viewer's protein table for one chromosome
+
+    One row per protein and repeat type, with the flags index.html filters
+    on, derived the way index.html does from all_hierarchical.json.
+    """
+    rows = []
+    if not chrom.startswith("chr"):
+        return rows
+    for gene_name, gene_slot in genes.items():
+        if gene_name == "unknown_gene":
+            continue
+        for transcript_slot in gene_slot["transcripts"].values():
+            for protein_id, protein_slot in transcript_slot["proteins"].items():
+                status = (protein_slot["protein_metadata"] or {}).get("status") or "Unknown"
+                for repeat_type, repeat_type_slot in protein_slot["repeat_types"].items():
+                    repeats = repeat_type_slot["repeats"]
+                    block_counts = [r["blockCount"] for r in repeats if r.get("blockCount")]
+                    rows.append({
+                        "gene": gene_name,
+                        "uniprotId": protein_id,
+                        "repeatType": repeat_type,
+                        "status": status,
+                        "chromosome": chrom,
+                        "repeatCount": len(repeats),
+                        "hasInFrameExons": any(
+                            exon.get("frame_status") in ("in_frame", "in-frame")
+                            for exon in repeat_type_slot["exons"]
+                        ),
+                        "hasSpanningExons": any(count > 1 for count in block_counts),
+                        "hasNonSpanningRepeats": any(count == 1 for count in block_counts),
+                    })
+    return rows
+
+def _write_compact(data, path):
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, separators=COMPACT)
+    os.replace(tmp_path, path)
+
+def convert_shard(spool_path, shard_path, chrom=None, protein_dir=None):
+    """Build one chromosome from its spooled entries and write it as compact JSON
+
+    With protein_dir, also write one file per protein there and return the
+    chromosome's summary rows. Runs in a worker process. Returns
+    (gene count, repeat count, summary rows or None).
+    """
+    builder = ChromosomeBuilder()
+    with open(spool_path) as f:
+        for line in f:
+            builder.add(json.loads(line))
+    _write_compact(builder.genes, shard_path)
+
+    rows = None
+    if protein_dir:
+        os.makedirs(protein_dir, exist_ok=True)
+        for protein_id, tree in protein_trees(chrom, builder.genes).items():
+            _write_compact(tree, os.path.join(protein_dir, shard_file_name(protein_id)))
+        rows = summary_rows(chrom, builder.genes)
+    return len(builder.genes), builder.repeat_count, rows
+
+def spool_by_chromosome(input_files, spool_dir):
+    """Stream the entries of input_files into one JSON Lines file per chromosome
+
+    Returns {chrom: spool path} in first-seen order.
+    """
+    spools = {}
+    handles = {}
+    try:
+        for input_file in input_files:
+            for repeat in iter_json_array(input_file):
+                chrom = get_chrom(repeat)
+                handle = handles.get(chrom)
+                if handle is None:
+                    spools[chrom] = os.path.join(spool_dir, f"{len(spools)}.jsonl")
+                    handle = handles[chrom] = open(spools[chrom], "w")
+                handle.write(json.dumps(repeat, separators=COMPACT))
+                handle.write("\n")
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return spools
+
+def write_viewer_files(viewer_dir, staging_dir, chromosome_results):
+    """Publish summary.json and the proteins/ directory from the staged shards
+
+    chromosome_results holds (staged protein directory, summary rows) per
+    chromosome in first-seen order. A protein annotated on more than one
+    chromosome (such as X and Y) gets the trees of all of them in its file.
+    The new proteins/ directory replaces the old one as a whole, so files of
+    proteins that are gone do not linger.
+    """
+    rows = []
+    staged = {}
+    for protein_dir, chrom_rows in chromosome_results:
+        rows.extend(chrom_rows)
+        for name in os.listdir(protein_dir):
+            staged.setdefault(name, []).append(os.path.join(protein_dir, name))
+
+    new_dir = os.path.join(staging_dir, PROTEIN_DIR)
+    os.makedirs(new_dir)
+    for name, paths in staged.items():
+        if len(paths) == 1:
+            os.replace(paths[0], os.path.join(new_dir, name))
+            continue
+        merged = {}
+        for path in paths:
+            with open(path) as f:
+                merged.update(json.load(f))
+        _write_compact(merged, os.path.join(new_dir, name))
+
+    summary = {
+        "repeatTypes": sorted({row["repeatType"] for row in rows}),
+        "proteins": rows,
+    }
+    _write_compact(summary, os.path.join(viewer_dir, SUMMARY_FILE))
+
+    protein_dir = os.path.join(viewer_dir, PROTEIN_DIR)
+    if os.path.isdir(protein_dir):
+        os.replace(protein_dir, os.path.join(staging_dir, "previous"))
+    os.replace(new_dir, protein_dir)
+    return len(staged)
+
+def convert(input_files, output_dir, workers=None, viewer_dir=None):
+    """Convert flat repeat files into per-chromosome shards plus index.json
+
+    With viewer_dir, also write the viewer's summary.json and per-protein
+    files there (see write_viewer_files). Returns the index as a dict.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    spool_dir = tempfile.mkdtemp(prefix=".spool-", dir=output_dir)
+    staging_dir = None
+    if viewer_dir:
+        os.makedirs(viewer_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=".staging-", dir=viewer_dir)
+    try:
+        spools = spool_by_chromosome(input_files, spool_dir)
+        jobs = {
+            chrom: (
+                spools[chrom],
+                os.path.join(output_dir, shard_file_name(chrom)),
+                chrom,
+                os.path.join(staging_dir, str(i)) if staging_dir else None,
+            )
+            for i, chrom in enumerate(spools)
+        }
+
+        # Largest chromosomes first, so one big chromosome does not finish last
+        order = sorted(spools, key=lambda chrom: os.path.getsize(spools[chrom]), reverse=True)
+        counts = {}
+        if workers == 1:
+            for chrom in order:
+                counts[chrom] = convert_shard(*jobs[chrom])
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {chrom: executor.submit(convert_shard, *jobs[chrom]) for chrom in order}
+                for chrom, future in futures.items():
+                    counts[chrom] = future.result()
+
+        if viewer_dir:
+            write_viewer_files(viewer_dir, staging_dir, [(jobs[chrom][3], counts[chrom][2]) for chrom in spools])
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    index = {
+        "layout": "chromosome > gene > transcript > protein > repeat type",
+        "chromosomes": {
+            chrom: {
+                "file": shard_file_name(chrom),
+                "genes": counts[chrom][0],
+                "repeats": counts[chrom][1],
+            }
+            for chrom in spools
+        },
+    }
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+def write_combined(output_dir, combined_file, index=None):
+    """Write all shards as one {chrom: genes} JSON file without loading them"""
+    if index is None:
+        with open(os.path.join(output_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+
+    tmp_path = f"{combined_file}.part"
+    with open(tmp_path, "w") as out:
+        out.write("{")
+        for i, (chrom, info) in enumerate(index["chromosomes"].items()):
+            if i:
+                out.write(",")
+            out.write(json.dumps(chrom))
+            out.write(":")
+            with open(os.path.join(output_dir, info["file"])) as shard:
+                shutil.copyfileobj(shard, out)
+        out.write("}")
+    os.replace(tmp_path, combined_file)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert flat repeat JSON files to per-chromosome hierarchical shards."
+    )
+    parser.add_argument("inputs", nargs="+", help="Flat repeat JSON files (merged in the order given)")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directory for the shards and index.json")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per CPU, 1 converts in this process)")
+    parser.add_argument("--combined", help="Also write every chromosome to this single JSON file")
+    parser.add_argument("--viewer-dir", help="Also write summary.json and proteins/ for the viewer to this directory")
+    args = parser.parse_args()
+
+    for input_file in args.inputs:
+        if not os.path.exists(input_file):
+            print(f"Error: Input file {input_file} does not exist.")
+            sys.exit(1)
+
+    start = time.time()
+    try:
+        index = convert(args.inputs, args.output_dir, args.workers, args.viewer_dir)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    chromosomes = index["chromosomes"]
+    print(f"Converted {sum(c['repeats'] for c in chromosomes.values())} repeats in "
+          f"{sum(c['genes'] for c in chromosomes.values())} genes on {len(chromosomes)} chromosomes "
+          f"to {args.output_dir} in {time.time() - start:.1f} s")
+
+    if args.combined:
+        write_combined(args.output_dir, args.combined, index)
+        print(f"Combined file written to {args.combined}")
+    if args.viewer_dir:
+        print(f"Viewer summary and protein files written to {args.viewer_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Incremental reading of large JSON dataset files.
+
+iter_json_array() yields the elements of a top-level JSON array one at a
+time, so a dataset is never held in memory as a whole. Only the standard
+library is used: the file is read in chunks and each element is decoded
+with json.JSONDecoder.raw_decode.
+"""
+import re
+import json
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = ' \t\n\r'
+# Rest of the buffer holding nothing but number characters (possibly none)
+NUMBER_TAIL = re.compile(r'[0-9eE.+-]*\Z')
+
+class NotAJsonArray(ValueError):
+    """Raised when the file's top-level value is not an array"""
+
+class _ChunkReader:
+    """A text buffer over a file that is refilled on demand"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, dropping the consumed part of the buffer"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, characters):
+        """Consume the next non-whitespace character, which must be one of characters"""
+        char = self.peek()
+        if not char or char not in characters:
+            raise json.JSONDecodeError(f"Expecting one of {characters!r}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def decode_value(self, decoder):
+        """Decode the next JSON value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk, also
+            # when what was read of it is a shorter valid number ("7" of "7e" or "1.")
+            if not self.eof and NUMBER_TAIL.match(self.buffer, end) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """Yield the elements of the JSON array stored in path, one at a time
+
+    Raises NotAJsonArray if the top-level value is not an array and
+    json.JSONDecodeError if the file is not valid JSON.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        reader = _ChunkReader(f, chunk_size)
+        if reader.peek() != '[':
+            if reader.peek() == '':
+                raise json.JSONDecodeError("Expecting value", reader.buffer, reader.pos)
+            raise NotAJsonArray(f"{path}: JSON root is not a list")
+        reader.pos += 1
+
+        if reader.peek() == ']':
+            return
+        while True:
+            yield reader.decode_value(decoder)
+            if reader.expect(',]') == ']':
+                return
@@ -4,30 +4,154 @@ import re
 import sys
 import os
 import glob
+import hashlib
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repeat_type_rules.json")
+
+class RuleStage:
+    """One stage of the rules table, compiled into a single regex
+
+    The rules become alternatives of one pattern that has to match the
+    whole value; the first rule that matches gives the output.
+    """
+
+    def __init__(self, rules):
+        alternatives = []
+        self.outputs = []  # (group of the rule, number of its own groups, output)
+        group = 1
+        for rule in rules:
+            rule_groups = re.compile(rule["pattern"]).groups
+            alternatives.append(f"({rule['pattern']})")
+            self.outputs.append((group, rule_groups, rule["output"]))
+            group += 1 + rule_groups
+        self.regex = re.compile("|".join(alternatives), re.DOTALL)
+
+    def apply(self, value):
+        match = self.regex.fullmatch(value)
+        if match is None:
+            return value
+        for group, rule_groups, output in self.outputs:
+            if match.group(group) is not None:
+                return output.format(value, *match.groups()[group:group + rule_groups])
+        return value
+
+class RepeatTypeRules:
+    """Repeat type cleaning and grouping as defined by repeat_type_rules.json
+
+    Results are memoised per raw value: a dataset has a few hundred distinct
+    repeat types, so each is matched against the rules only once.
+    """
+
+    def __init__(self, rules_file=RULES_FILE):
+        with open(rules_file) as f:
+            table = json.load(f)
+        self.unknown = table["unknown"]
+        self.clean_stages = [RuleStage(stage) for stage in table["clean"]]
+        self.group_stages = [RuleStage(stage) for stage in table["group"]]
+        self._cleaned = {}
+        self._normalized = {}
+
+    def clean(self, repeat_type):
+        """Drop qualifiers and numbering: "ANK 1" -> "ANK", "LRR 1; degenerate" -> "LRR"
+
+        Empty values are returned as they are; a bare number becomes "Unknown".
+        """
+        if not repeat_type:
+            return repeat_type
+        cleaned = self._cleaned.get(repeat_type)
+        if cleaned is None:
+            cleaned = repeat_type
+            for stage in self.clean_stages:
+                cleaned = stage.apply(cleaned)
+            self._cleaned[repeat_type] = cleaned
+        return cleaned
+
+    def normalize(self, repeat_type):
+        """Clean a repeat type, then group it: "WD 1-1" -> "WD", "PUR repeat II" -> "PUR"
+
+        Empty and unnamed repeat types become "Unknown".
+        """
+        if not repeat_type:
+            return self.unknown
+        normalized = self._normalized.get(repeat_type)
+        if normalized is None:
+            normalized = self.clean(repeat_type.strip()).strip()
+            for stage in self.group_stages:
+                normalized = stage.apply(normalized)
+            normalized = normalized or self.unknown
+            self._normalized[repeat_type] = normalized
+        return normalized
+
+    def normalize_entries(self, entries, field="repeatType"):
+        """Normalize the repeat type of every entry in place, in one pass
+
+        Returns a Counter of the (old, new) mappings that changed a value.
+        """
+        changes = Counter()
+        normalize = self.normalize
+        for entry in entries:
+            if field in entry:
+                old = entry[field]
+                new = normalize(old)
+                if new != old:
+                    entry[field] = new
+                    changes[(old, new)] += 1
+        return changes
+
+_rules = None
+
+def get_rules():
+    """The rules of repeat_type_rules.json, loaded once"""
+    global _rules
+    if _rules is None:
+        _rules = RepeatTypeRules()
+    return _rules
+
+def clean_repeat_type(repeat_type):
+    return get_rules().clean(repeat_type)
 
 def normalize_repeat_type(repeat_type):
-    if not repeat_type:
-        return "Unknown"
-    repeat_type = repeat_type.strip()
-    if repeat_type.startswith("WD"):
-        return "WD"
-    if repeat_type.startswith("Alpha"):
-        return "Alpha"
-    if repeat_type.startswith("PUR"):
-        return "PUR"
-    if repeat_type.startswith("RCC1"):
-        return "RCC1"
-    if repeat_type.startswith("SVP"):
-        return "SVP"
-    if repeat_type.startswith("Spectrin"):
-        return "Spectrin"
-    # If starts with a number
-    if repeat_type and repeat_type[0].isdigit():
-        return "Unknown"
-    # If the entire string is a roman numeral I-X (case-insensitive)
-    if re.match(r"^(I|II|III|IV|V|VI|VII|VIII|IX|X)$", repeat_type, re.IGNORECASE):
-        return "Unknown"
-    return repeat_type
+    return get_rules().normalize(repeat_type)
+
+MANIFEST_FILE = ".normalize_manifest.json"
+
+def file_hash(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_atomic(data, output_file):
+    """Write JSON through a temporary file renamed into place"""
+    tmp_file = f"{output_file}.part"
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def _normalize_file(input_file, output_file):
+    """Normalize one file; returns the Counter of mappings applied
+
+    The output is only written when something changed or it is a different
+    file. Raises ValueError if the file is not a JSON array.
+    """
+    with open(input_file, 'r') as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a JSON array, but got {type(data).__name__}")
+
+    changes = get_rules().normalize_entries(data)
+    if changes or output_file != input_file:
+        _write_atomic(data, output_file)
+    return changes
 
 def normalize_json_file(input_file, output_file=None):
     """
@@ -42,25 +166,9 @@ def normalize_json_file(input_file, output_file=None):
         output_file = input_file
     
     try:
-        # Read the JSON file
-        with open(input_file, 'r') as f:
-            data = json.load(f)
-        
-        # Ensure the data is a list (array)
-        if not isinstance(data, list):
-            print(f"Error: Expected a JSON array, but got {type(data).__name__}")
-            return False
-        
-        # Normalize each repeat type
-        for item in data:
-            if "repeatType" in item:
-                item["repeatType"] = normalize_repeat_type(item["repeatType"])
+        changes = _normalize_file(input_file, output_file)
         
-        # Write the modified JSON back to the file
-        with open(output_file, 'w') as f:
-            json.dump(data, f, indent=2)
-        
-        print(f"Successfully normalized repeat types in {input_file}")
+        print(f"Successfully normalized repeat types in {input_file} ({sum(changes.values())} changed)")
         if output_file != input_file:
             print(f"Saved to {output_file}")
         
@@ -70,40 +178,104 @@ def normalize_json_file(input_file, output_file=None):
         print(f"Error: {e}")
         return False
 
-def normalize_directory(input_dir, pattern="*_annotated_repeats.json"):
+def _normalize_directory_file(path, known_hash):
+    """Worker: normalize one file in place unless its hash shows it is already done
+
+    Returns (path, status, mappings applied, hash of the file afterwards, error).
+    """
+    try:
+        current_hash = file_hash(path)
+        if current_hash == known_hash:
+            return path, "skipped", Counter(), current_hash, None
+        changes = _normalize_file(path, path)
+        return path, "changed" if changes else "unchanged", changes, file_hash(path) if changes else current_hash, None
+    except Exception as e:
+        return path, "failed", Counter(), None, str(e)
+
+def normalize_directory(input_dir, pattern="*_annotated_repeats.json", workers=None):
     """
     Normalize repeat types in all JSON files in a directory that match a pattern.
     
+    Files are processed in parallel (workers processes, default one per CPU)
+    and rewritten atomically, and only when a repeat type changes. The hash
+    of every normalized file is kept in .normalize_manifest.json together
+    with a hash of the rules, so later runs skip files that are unchanged
+    since without parsing them.
+    
     Args:
         input_dir (str): Path to the directory containing JSON files
         pattern (str, optional): Glob pattern to match files
+        workers (int, optional): Number of worker processes; 1 runs in this process
+    
+    Returns:
+        Counter: The (old, new) repeat type mappings applied, with counts
     """
     # Get all files matching the pattern
-    files = glob.glob(os.path.join(input_dir, pattern))
+    files = sorted(glob.glob(os.path.join(input_dir, pattern)))
     
-    success_count = 0
-    for file in files:
-        print(f"Processing {file}...")
-        if normalize_json_file(file):
-            success_count += 1
+    manifest_path = os.path.join(input_dir, MANIFEST_FILE)
+    rules_hash = file_hash(RULES_FILE)
+    known = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("rules") == rules_hash:
+                known = manifest.get("files", {})
+        except (OSError, ValueError):
+            pass
     
-    print(f"Normalized {success_count} out of {len(files)} files")
-
-if __name__ == "__main__":
-    # Check command line arguments
-    if len(sys.argv) < 2:
-        print("Usage: python normalize_repeat_types.py <input_file_or_directory> [output_file]")
-        sys.exit(1)
+    known_hashes = [known.get(os.path.basename(file)) for file in files]
+    if workers == 1:
+        results = list(map(_normalize_directory_file, files, known_hashes))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_normalize_directory_file, files, known_hashes))
+    
+    mappings = Counter()
+    statuses = Counter()
+    hashes = {}
+    for path, status, changes, new_hash, error in results:
+        statuses[status] += 1
+        mappings.update(changes)
+        if error:
+            print(f"Error: {path}: {error}")
+        else:
+            hashes[os.path.basename(path)] = new_hash
+    
+    manifest_tmp = f"{manifest_path}.part"
+    with open(manifest_tmp, 'w') as f:
+        json.dump({"rules": rules_hash, "files": hashes}, f, indent=2)
+    os.replace(manifest_tmp, manifest_path)
     
-    input_path = sys.argv[1]
+    print(f"Normalized {len(files) - statuses['failed']} out of {len(files)} files: "
+          f"{statuses['changed']} rewritten, {statuses['unchanged']} already normalized, "
+          f"{statuses['skipped']} skipped as unchanged since the last run, {statuses['failed']} failed")
+    if mappings:
+        print("Repeat type mappings applied:")
+        for (old, new), count in mappings.most_common():
+            print(f"  {count:>7}  {old!r} -> {new!r}")
+    return mappings
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize the repeatType of annotated repeat JSON files.")
+    parser.add_argument("input", help="JSON file, or directory of *_annotated_repeats.json files")
+    parser.add_argument("output", nargs="?", help="Output file for a single input file (default: overwrite it)")
+    parser.add_argument("--pattern", default="*_annotated_repeats.json", help="File pattern in a directory")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for a directory (default: one per CPU)")
+    args = parser.parse_args()
     
     # If input is a directory, process all JSON files in it
-    if os.path.isdir(input_path):
-        normalize_directory(input_path)
+    if os.path.isdir(args.input):
+        normalize_directory(args.input, args.pattern, args.workers)
     # If input is a file, process just that file
-    elif os.path.isfile(input_path):
-        output_file = sys.argv[2] if len(sys.argv) > 2 else None
-        normalize_json_file(input_path, output_file)
+    elif os.path.isfile(args.input):
+        if not normalize_json_file(args.input, args.output):
+            sys.exit(1)
     else:
-        print(f"Error: {input_path} is not a valid file or directory")
+        print(f"Error: {args.input} is not a valid file or directory")
         sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Quality-control report for annotated repeat datasets.
+
+All metrics observe the entries of one streamed pass over the dataset
+(json_stream.iter_json_array), so adding a metric never costs another
+read of the file. A metric is a class registered with @register_metric:
+it sees every entry in observe() and returns its numbers and ID lists from
+result().
+
+The report is written as report.json and report.html, plus one text file
+per ID list, to the output directory.
+
+Usage:
+    python scripts/qc_report.py data.json [--output-dir qc_report] [--metrics gene_names,block_counts]
+    python scripts/qc_report.py --list-metrics
+"""
+import os
+import sys
+import json
+import html
+import time
+import argparse
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from json_stream import iter_json_array
+from repeat_analytics import RepeatStatistics
+
+# Metric name -> metric class, in registration order
+METRICS = {}
+
+def register_metric(cls):
+    """Class decorator adding a metric to the registry under cls.name"""
+    if cls.name in METRICS:
+        raise ValueError(f"Metric already registered: {cls.name}")
+    METRICS[cls.name] = cls
+    return cls
+
+class Metric:
+    """Base class of the QC metrics
+
+    result() returns {"values": {...}, "id_lists": {list_name: [ids]}}.
+    """
+    name = None
+    title = None
+
+    def observe(self, entry):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+def _percentage(count, total):
+    return round(count / total * 100, 2) if total else 0.0
+
+@register_metric
+class GeneNameMetric(Metric):
+    """Entries and proteins without gene names, and their review status"""
+    name = "gene_names"
+    title = "Gene names and review status"
+
+    def __init__(self):
+        self.total = 0
+        self.missing_gene_name = 0
+        self.unreviewed = 0
+        self.missing_gene_and_unreviewed = 0
+        self.missing_aliases = 0
+        self.proteins_without_gene_names = set()
+        self.unreviewed_proteins = set()
+        self.unreviewed_without_gene_names = set()
+
+    def observe(self, entry):
+        self.total += 1
+        has_no_gene_name = entry.get("geneName", "") == ""
+        is_unreviewed = "Unreviewed" in entry.get("status", "")
+        protein_id = entry.get("uniProtId")
+
+        if has_no_gene_name:
+            self.missing_gene_name += 1
+            if protein_id:
+                self.proteins_without_gene_names.add(protein_id)
+        if is_unreviewed:
+            self.unreviewed += 1
+            if protein_id:
+                self.unreviewed_proteins.add(protein_id)
+        if has_no_gene_name and is_unreviewed:
+            self.missing_gene_and_unreviewed += 1
+            if protein_id:
+                self.unreviewed_without_gene_names.add(protein_id)
+        if entry.get("aliases", "") in ("", []):
+            self.missing_aliases += 1
+
+    def result(self):
+        return {
+            "values": {
+                "total_entries": self.total,
+                "entries_without_genename": self.missing_gene_name,
+                "entries_without_genename_pct": _percentage(self.missing_gene_name, self.total),
+                "unique_proteins_without_genename": len(self.proteins_without_gene_names),
+                "entries_unreviewed": self.unreviewed,
+                "entries_unreviewed_pct": _percentage(self.unreviewed, self.total),
+                "entries_without_genename_and_unreviewed": self.missing_gene_and_unreviewed,
+                "unique_unreviewed_proteins_without_genename": len(self.unreviewed_without_gene_names),
+                "entries_without_aliases": self.missing_aliases,
+                "entries_without_aliases_pct": _percentage(self.missing_aliases, self.total),
+            },
+            "id_lists": {
+                "proteins_without_gene_names": sorted(self.proteins_without_gene_names),
+                "unreviewed_proteins": sorted(self.unreviewed_proteins),
+                "unreviewed_proteins_without_gene_names": sorted(self.unreviewed_without_gene_names),
+            },
+        }
+
+@register_metric
+class MultiProteinGeneMetric(Metric):
+    """Genes whose repeats come from more than one UniProt entry"""
+    name = "multi_protein_genes"
+    title = "Genes with multiple proteins"
+
+    def __init__(self):
+        self.gene_to_uniprot = defaultdict(set)
+
+    def observe(self, entry):
+        gene_name = entry.get("geneName")
+        if gene_name and "uniProtId" in entry:
+            self.gene_to_uniprot[gene_name].add(entry["uniProtId"])
+
+    def multi_protein_genes(self):
+        return {
+            gene: sorted(uniprot_ids) for gene, uniprot_ids in sorted(self.gene_to_uniprot.items())
+            if len(uniprot_ids) > 1
+        }
+
+    def result(self):
+        genes = self.multi_protein_genes()
+        return {
+            "values": {
+                "genes_with_uniprot_ids": len(self.gene_to_uniprot),
+                "genes_with_multiple_proteins": len(genes),
+            },
+            "id_lists": {
+                "multi_protein_genes": [f"{gene}\t{','.join(ids)}" for gene, ids in genes.items()],
+            },
+        }
+
+@register_metric
+class BlockCountMetric(Metric):
+    """Distribution of blockCount values"""
+    name = "block_counts"
+    title = "blockCount distribution"
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def observe(self, entry):
+        self.counts[entry.get("blockCount", "missing")] += 1
+
+    def result(self):
+        # Numbers in numeric order first, then anything else ("missing", strings)
+        def sort_key(item):
+            key = item[0]
+            is_number = isinstance(key, (int, float)) and not isinstance(key, bool)
+            return (not is_number, key if is_number else str(key))
+
+        distribution = {str(key): count for key, count in sorted(self.counts.items(), key=sort_key)}
+        return {"values": {"distribution": distribution}, "id_lists": {}}
+
+@register_metric
+class ExonSkippingMetric(Metric):
+    """The count_json.py statistics (see repeat_analytics.py)"""
+    name = "exon_skipping"
+    title = "Exon skipping criteria"
+
+    def __init__(self):
+        self.statistics = RepeatStatistics()
+
+    def observe(self, entry):
+        self.statistics.add(entry)
+
+    def result(self):
+        values = self.statistics.result()
+        return {
+            "values": {key: value for key, value in values.items() if not isinstance(value, list)},
+            "id_lists": {
+                "genes_satisfying_all": values["genes_satisfying_all"],
+                "genes_satisfying_all_with_canonical": values["genes_satisfying_all_with_canonical"],
+            },
+        }
+
+def run_qc(file_path, metric_names=None):
+    """Run the selected metrics (default: all) over one streamed pass of the dataset
+
+    Returns the report as a dict.
+    """
+    names = metric_names or list(METRICS)
+    unknown = [name for name in names if name not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)} (available: {', '.join(METRICS)})")
+    metrics = [METRICS[name]() for name in names]
+
+    start = time.time()
+    entries = 0
+    observers = [metric.observe for metric in metrics]
+    for entry in iter_json_array(file_path):
+        entries += 1
+        for observe in observers:
+            observe(entry)
+
+    return {
+        "dataset": os.path.abspath(file_path),
+        "entries": entries,
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.time() - start, 2),
+        "metrics": {
+            metric.name: dict(metric.result(), title=metric.title) for metric in metrics
+        },
+    }
+
+def _html_value(value):
+    if isinstance(value, dict):
+        rows = "".join(
+            f"<tr><td>{html.escape(str(key))}</td><td>{_html_value(item)}</td></tr>"
+            for key, item in value.items()
+        )
+        return f"<table>{rows}</table>"
+    return html.escape(str(value))
+
+def render_html(report, id_list_files):
+    """Render the report as a standalone HTML page"""
+    sections = []
+    for name, metric in report["metrics"].items():
+        lists = "".join(
+            f'<li><a href="{html.escape(id_list_files[list_name])}">{html.escape(list_name)}</a>'
+            f' ({len(ids)})</li>'
+            for list_name, ids in metric["id_lists"].items()
+        )
+        sections.append(
+            f"<h2>{html.escape(metric['title'])} <small>({html.escape(name)})</small></h2>"
+            f"{_html_value(metric['values'])}"
+            + (f"<ul>{lists}</ul>" if lists else "")
+        )
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>QC report: {html.escape(os.path.basename(report['dataset']))}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; margin: 0.5em 0; }}
+td {{ border: 1px solid #ccc; padding: 0.2em 0.6em; vertical-align: top; }}
+td:first-child {{ font-weight: bold; }}
+small {{ color: #888; font-weight: normal; }}
+</style>
+</head>
+<body>
+<h1>QC report</h1>
+<p>{html.escape(report['dataset'])}: {report['entries']} entries, generated {html.escape(report['generated'])}
+in {report['seconds']} s</p>
+{''.join(sections)}
+</body>
+</html>
+"""
+
+def write_report(report, output_dir):
+    """Write report.json, report.html and one text file per ID list"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    id_list_files = {}
+    for metric in report["metrics"].values():
+        for list_name, ids in metric["id_lists"].items():
+            file_name = f"{list_name}.txt"
+            with open(os.path.join(output_dir, file_name), "w") as f:
+                for item in ids:
+                    f.write(f"{item}\n")
+            id_list_files[list_name] = file_name
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.join(output_dir, "report.html"), "w") as f:
+        f.write(render_html(report, id_list_files))
+
+def main():
+    parser = argparse.ArgumentParser(description="QC report for an annotated repeats JSON file, in one pass.")
+    parser.add_argument("file", nargs="?", help="JSON array of repeat entries")
+    parser.add_argument("--output-dir", default="qc_report", help="Directory for the report (default qc_report)")
+    parser.add_argument("--metrics", help="Comma separated metrics to run (default: all)")
+    parser.add_argument("--list-metrics", action="store_true", help="List the available metrics and exit")
+    args = parser.parse_args()
+
+    if args.list_metrics:
+        for name, cls in METRICS.items():
+            print(f"{name:<22} {cls.__doc__}")
+        return
+    if not args.file:
+        parser.error("the dataset file is required")
+    if not os.path.exists(args.file):
+        print(f"Error: File not found at {args.file}")
+        sys.exit(1)
+
+    metric_names = [name.strip() for name in args.metrics.split(",")] if args.metrics else None
+    try:
+        report = run_qc(args.file, metric_names)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    write_report(report, args.output_dir)
+    print(f"Analysed {report['entries']} entries in {report['seconds']} s")
+    for name, metric in report["metrics"].items():
+        print(f"\n{metric['title']}:")
+        for key, value in metric["values"].items():
+            if isinstance(value, dict):
+                value = ", ".join(f"{item_key}: {item}" for item_key, item in value.items())
+            print(f"  {key}: {value}")
+    print(f"\nReport written to {os.path.join(args.output_dir, 'report.html')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Single-pass statistics over annotated repeat datasets.
+
+RepeatStatistics consumes repeat entries one at a time (for example from
+json_stream.iter_json_array) and keeps one accumulator per
+(gene, repeat type). The gene-level criterion (at least MIN_REPEATS repeats
+of a type with blockCount = 1) is only known once every entry has been
+seen, so result() resolves it from the accumulators at the end instead of
+re-reading the data.
+
+Usage:
+    python scripts/repeat_analytics.py data.json [--min-repeats 5]
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from json_stream import iter_json_array
+
+MIN_REPEATS = 5
+
+# Accumulator slots per (gene, repeat type): entries with blockCount = 1,
+# of those the ones with an in-frame exon, and the ones with an in-frame
+# exon in a canonical transcript
+SINGLE_BLOCK, IN_FRAME, CANONICAL_IN_FRAME = range(3)
+
+def in_frame_flags(entry):
+    """(has an in-frame exon, has an in-frame exon in a canonical transcript)"""
+    exon_info = entry.get("ensembl_exon_info")
+    if not isinstance(exon_info, dict):
+        return False, False
+    transcripts = exon_info.get("transcripts")
+    if not isinstance(transcripts, list):
+        return False, False
+
+    has_in_frame = False
+    for transcript in transcripts:
+        exons = transcript.get("containing_exons")
+        if not isinstance(exons, list):
+            continue
+        if any(exon.get("frame_status") == "in_frame" for exon in exons):
+            if transcript.get("is_canonical"):
+                return True, True
+            has_in_frame = True
+    return has_in_frame, False
+
+class RepeatStatistics:
+    """Accumulates the dataset statistics of count_json.py in one pass"""
+
+    def __init__(self, min_repeats=MIN_REPEATS):
+        self.min_repeats = min_repeats
+        self.total_entries = 0
+        self.entries_without_genename = 0
+        self.entries_with_blockcount_1 = 0
+        self.entries_without_blockcount = 0
+        self.entries_with_blockcount_1_and_inframe = 0
+        self.gene_type_counts = {}
+
+    def add(self, entry):
+        """Account for one repeat entry"""
+        self.total_entries += 1
+        if "geneName" not in entry:
+            self.entries_without_genename += 1
+        if "blockCount" not in entry:
+            self.entries_without_blockcount += 1
+            return
+        if entry["blockCount"] != 1:
+            return
+
+        self.entries_with_blockcount_1 += 1
+        has_in_frame, has_canonical_in_frame = in_frame_flags(entry)
+        if has_in_frame:
+            self.entries_with_blockcount_1_and_inframe += 1
+
+        if "geneName" in entry and "repeatType" in entry:
+            key = (entry["geneName"], entry["repeatType"])
+            counts = self.gene_type_counts.get(key)
+            if counts is None:
+                counts = self.gene_type_counts[key] = [0, 0, 0]
+            counts[SINGLE_BLOCK] += 1
+            if has_in_frame:
+                counts[IN_FRAME] += 1
+            if has_canonical_in_frame:
+                counts[CANONICAL_IN_FRAME] += 1
+
+    def add_all(self, entries):
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def result(self):
+        """Resolve the gene-level criteria and return all statistics"""
+        qualifying = {
+            key: counts for key, counts in self.gene_type_counts.items()
+            if counts[SINGLE_BLOCK] >= self.min_repeats
+        }
+        genes_satisfying_all = {gene for (gene, _), counts in qualifying.items() if counts[IN_FRAME]}
+        genes_satisfying_all_with_canonical = {
+            gene for (gene, _), counts in qualifying.items() if counts[CANONICAL_IN_FRAME]
+        }
+
+        return {
+            "total_entries": self.total_entries,
+            "entries_without_genename": self.entries_without_genename,
+            "entries_with_genename": self.total_entries - self.entries_without_genename,
+            "entries_with_blockcount_1": self.entries_with_blockcount_1,
+            "entries_without_blockcount": self.entries_without_blockcount,
+            "entries_with_blockcount_1_and_inframe": self.entries_with_blockcount_1_and_inframe,
+            "entries_satisfying_all_criteria": sum(counts[IN_FRAME] for counts in qualifying.values()),
+            "entries_satisfying_all_with_canonical": sum(
+                counts[CANONICAL_IN_FRAME] for counts in qualifying.values()
+            ),
+            "genes_with_5plus_repeats_count": len(qualifying),
+            "genes_satisfying_all_criteria_count": len(genes_satisfying_all),
+            "genes_satisfying_all_with_canonical_count": len(genes_satisfying_all_with_canonical),
+            "genes_satisfying_all": sorted(genes_satisfying_all),
+            "genes_satisfying_all_with_canonical": sorted(genes_satisfying_all_with_canonical),
+        }
+
+def analyze_file(file_path, min_repeats=MIN_REPEATS):
+    """Statistics of a JSON array file of repeat entries, in one streaming pass"""
+    return RepeatStatistics(min_repeats).add_all(iter_json_array(file_path)).result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-pass statistics over an annotated repeats JSON file.")
+    parser.add_argument("file", help="JSON array of repeat entries")
+    parser.add_argument("--min-repeats", type=int, default=MIN_REPEATS,
+                        help=f"Repeats of one type (blockCount = 1) a gene needs (default {MIN_REPEATS})")
+    args = parser.parse_args()
+
+    print(json.dumps(analyze_file(args.file, args.min_repeats), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests of json_stream.iter_json_array at chunk boundaries.
+
+Run with: python -m pytest scripts/test_json_stream.py
+(or python scripts/test_json_stream.py)
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from json_stream import iter_json_array, NotAJsonArray
+
+class IterJsonArrayTest(unittest.TestCase):
+    def write(self, text):
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def assert_chunk_sizes(self, text, chunk_sizes=range(1, 17)):
+        """Every chunk size yields the elements json.loads finds"""
+        expected = json.loads(text)
+        path = self.write(text)
+        for chunk_size in chunk_sizes:
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_json_array(path, chunk_size)), expected)
+
+    def test_scalars_across_chunk_boundaries(self):
+        # Numbers whose first part is itself a valid number ("7" of "7e5", "1" of "1.5")
+        self.assert_chunk_sizes('[7e5]')
+        self.assert_chunk_sizes('[{"a": 1}, 1.5, -2.25e-3, 10, 0, -0.5E+10, 123456789, 3]')
+        self.assert_chunk_sizes('[1,2.0,3e1,-4,5E-1]')
+        self.assert_chunk_sizes('["x", true, false, null, 1e2, [1.0, 2e3], {"b": -7.25}]')
+
+    def test_whitespace_and_nesting(self):
+        self.assert_chunk_sizes('  [\n  {"repeat": [1, 2, {"c": "]"}]},\n  12 ,\t"s" \n]\n')
+
+    def test_empty_array(self):
+        self.assert_chunk_sizes('[]')
+        self.assert_chunk_sizes(' [ ] ')
+
+    def test_not_an_array(self):
+        path = self.write('{"a": 1}')
+        with self.assertRaises(NotAJsonArray):
+            list(iter_json_array(path, 3))
+
+    def test_invalid_json(self):
+        for text in ('', '[1, 2', '[1 2]', '[1e]'):
+            with self.subTest(text=text):
+                path = self.write(text)
+                with self.assertRaises(json.JSONDecodeError):
+                    list(iter_json_array(path, 3))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,7 @@
 -- Database schema for Tandem Repeat Domain Database
 
 -- Genes table
-CREATE TABLE genes (
+CREATE TABLE IF NOT EXISTS genes (
     gene_id INTEGER PRIMARY KEY,
     gene_name VARCHAR(50) NOT NULL,
     chromosome VARCHAR(10),
@@ -11,7 +11,7 @@ CREATE TABLE genes (
 );
 
 -- Gene aliases table
-CREATE TABLE gene_aliases (
+CREATE TABLE IF NOT EXISTS gene_aliases (
     alias_id INTEGER PRIMARY KEY,
     gene_id INTEGER NOT NULL,
     alias_name VARCHAR(100) NOT NULL,
@@ -19,7 +19,7 @@ CREATE TABLE gene_aliases (
 );
 
 -- Proteins table 
-CREATE TABLE proteins (
+CREATE TABLE IF NOT EXISTS proteins (
     protein_id VARCHAR(20) PRIMARY KEY,
     gene_id INTEGER,
     length INTEGER,
@@ -29,7 +29,7 @@ CREATE TABLE proteins (
 );
 
 -- Repeats table
-CREATE TABLE repeats (
+CREATE TABLE IF NOT EXISTS repeats (
     repeat_id INTEGER PRIMARY KEY,
     protein_id VARCHAR(20),
     repeat_type VARCHAR(50),
@@ -49,7 +49,7 @@ CREATE TABLE repeats (
 );
 
 -- Transcripts table
-CREATE TABLE transcripts (
+CREATE TABLE IF NOT EXISTS transcripts (
     transcript_id VARCHAR(20) PRIMARY KEY,
     gene_id INTEGER,
     description TEXT,
@@ -63,7 +63,7 @@ CREATE TABLE transcripts (
 );
 
 -- Relationship between repeats and transcripts
-CREATE TABLE repeat_transcripts (
+CREATE TABLE IF NOT EXISTS repeat_transcripts (
     repeat_id INTEGER,
     transcript_id VARCHAR(20),
     genomic_start INTEGER,
@@ -76,7 +76,7 @@ CREATE TABLE repeat_transcripts (
 );
 
 -- Exons table
-CREATE TABLE exons (
+CREATE TABLE IF NOT EXISTS exons (
     exon_id INTEGER PRIMARY KEY,
     ensembl_exon_id VARCHAR(50),
     phase INTEGER,
@@ -88,7 +88,7 @@ CREATE TABLE exons (
 );
 
 -- Transcript exons junction table
-CREATE TABLE transcript_exons (
+CREATE TABLE IF NOT EXISTS transcript_exons (
     transcript_id VARCHAR(20),
     exon_id INTEGER,
     exon_number INTEGER,
@@ -101,7 +101,7 @@ CREATE TABLE transcript_exons (
 );
 
 -- Relationship between repeats and exons
-CREATE TABLE repeat_exons (
+CREATE TABLE IF NOT EXISTS repeat_exons (
     repeat_id INTEGER,
     exon_id INTEGER,
     PRIMARY KEY (repeat_id, exon_id),
@@ -110,10 +110,72 @@ CREATE TABLE repeat_exons (
 );
 
 -- Create indexes for improved query performance
-CREATE INDEX idx_exons_ensembl_id ON exons(ensembl_exon_id);
-CREATE INDEX idx_repeats_protein_id ON repeats(protein_id);
-CREATE INDEX idx_repeats_type ON repeats(repeat_type);
-CREATE INDEX idx_transcript_exons_transcript ON transcript_exons(transcript_id);
-CREATE INDEX idx_transcript_exons_exon ON transcript_exons(exon_id);
-CREATE INDEX idx_repeat_exons_repeat ON repeat_exons(repeat_id);
-CREATE INDEX idx_repeat_exons_exon ON repeat_exons(exon_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_exons_ensembl_id ON exons(ensembl_exon_id);
+CREATE INDEX IF NOT EXISTS idx_repeats_protein_id ON repeats(protein_id);
+CREATE INDEX IF NOT EXISTS idx_repeats_type ON repeats(repeat_type);
+-- A repeat is stored once per protein and position, so re-ingesting the same
+-- records (populate_database.py --append) adds nothing. Rows whose protein
+-- position could not be parsed (NULL start_pos) are not deduplicated.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_repeats_unique
+    ON repeats(protein_id, start_pos, end_pos, chrom, chrom_start, chrom_end);
+CREATE INDEX IF NOT EXISTS idx_transcript_exons_transcript ON transcript_exons(transcript_id);
+CREATE INDEX IF NOT EXISTS idx_transcript_exons_exon ON transcript_exons(exon_id);
+CREATE INDEX IF NOT EXISTS idx_repeat_exons_repeat ON repeat_exons(repeat_id);
+CREATE INDEX IF NOT EXISTS idx_repeat_exons_exon ON repeat_exons(exon_id);
+
+-- Denormalised exon skipping candidates: one row per (repeat, exon, transcript)
+-- with the per-(gene, repeat_type) repeat counts folded in, so searches are
+-- indexed lookups instead of the 7-table join. Maintained on ingest by
+-- populate_database.refresh_exon_skipping_candidates().
+CREATE TABLE IF NOT EXISTS exon_skipping_candidates (
+    repeat_id INTEGER,
+    exon_id INTEGER,
+    transcript_id VARCHAR(20),
+    gene_id INTEGER,
+    gene_name VARCHAR(50),
+    repeat_type VARCHAR(50),
+    repeat_count INTEGER,          -- repeats of this type in the gene
+    single_block_count INTEGER,    -- of which block_count = 1
+    length_block_count INTEGER,    -- of which block_count = repeat_length
+    position TEXT,
+    block_count INTEGER,
+    repeat_length INTEGER,
+    ensembl_exon_id VARCHAR(50),
+    frame_status VARCHAR(50),
+    is_in_frame BOOLEAN,
+    overlap_percentage FLOAT,
+    overlap_bp INTEGER,
+    exon_position_in_transcript VARCHAR(50),
+    transcript_name VARCHAR(100),
+    exon_number INTEGER,
+    PRIMARY KEY (repeat_id, exon_id, transcript_id),
+    FOREIGN KEY (repeat_id) REFERENCES repeats(repeat_id),
+    FOREIGN KEY (gene_id) REFERENCES genes(gene_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_candidates_gene_type ON exon_skipping_candidates(gene_id, repeat_type);
+CREATE INDEX IF NOT EXISTS idx_candidates_in_frame ON exon_skipping_candidates(is_in_frame, block_count, overlap_percentage);
+CREATE INDEX IF NOT EXISTS idx_candidates_frame_status ON exon_skipping_candidates(frame_status, overlap_percentage);
+
+-- One row per (protein, repeat_type) backing the viewer's paginated protein
+-- table, with repeat_type normalised as the static viewer groups it ("LRR 1"
+-- counts as "LRR"). Maintained on ingest by
+-- populate_database.refresh_protein_repeat_summary().
+CREATE TABLE IF NOT EXISTS protein_repeat_summary (
+    protein_id VARCHAR(20),
+    repeat_type VARCHAR(50),
+    gene_id INTEGER,
+    gene_name VARCHAR(50),
+    chrom VARCHAR(10),
+    status VARCHAR(100),
+    repeat_count INTEGER,
+    has_in_frame_exons BOOLEAN,
+    has_non_spanning_repeats BOOLEAN,
+    PRIMARY KEY (protein_id, repeat_type),
+    FOREIGN KEY (protein_id) REFERENCES proteins(protein_id),
+    FOREIGN KEY (gene_id) REFERENCES genes(gene_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_summary_gene ON protein_repeat_summary(gene_id);
+CREATE INDEX IF NOT EXISTS idx_summary_gene_name ON protein_repeat_summary(gene_name);
+CREATE INDEX IF NOT EXISTS idx_summary_repeat_type ON protein_repeat_summary(repeat_type, repeat_count);
@@ -1,18 +1,202 @@
 import sqlite3
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
-import pandas as pd
 import os
 import json
+import queue
+import threading
 from datetime import datetime
 
+from query_service import QueryService
+from result_export import EXPORT_FORMATS, ExportCancelled, count_rows, export_query
+
+# Rows per page streamed from the search worker, and how often the GUI polls for pages
+PAGE_SIZE = 500
+POLL_INTERVAL_MS = 30
+
+class SearchJob:
+    """A search query running on a worker thread
+
+    The worker streams the result rows in pages onto a queue, which the Tk
+    main thread drains with after() callbacks. cancel() stops the worker and
+    interrupts a statement that is still running.
+    """
+
+    def __init__(self, service, query, params):
+        self.service = service
+        self.query = query
+        self.params = params
+        self.pages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        rows = self.service.iterate(self.query, self.params, batch_size=PAGE_SIZE,
+                                    cancel_event=self.cancel_event)
+        try:
+            page = []
+            for row in rows:
+                page.append(dict(row))
+                if len(page) >= PAGE_SIZE:
+                    if self.cancel_event.is_set():
+                        return
+                    self.pages.put(('rows', page))
+                    page = []
+            if page:
+                self.pages.put(('rows', page))
+            self.pages.put(('done', None))
+        except sqlite3.Error as e:
+            if not self.cancel_event.is_set():
+                self.pages.put(('error', e))
+        finally:
+            rows.close()
+
+class ExportJob:
+    """An export of a search query running on a worker thread
+
+    The query is re-run and its rows streamed straight into the file
+    (see result_export.py). Progress messages go onto a queue that the Tk
+    main thread polls.
+    """
+
+    def __init__(self, service, query, params, path):
+        self.service = service
+        self.query = query
+        self.params = params
+        self.path = path
+        self.total = None
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            self.messages.put(('total', count_rows(self.service, self.query, self.params)))
+            written = export_query(
+                self.service, self.query, self.params, self.path,
+                progress=lambda rows: self.messages.put(('progress', rows)),
+                cancel_event=self.cancel_event
+            )
+            self.messages.put(('done', written))
+        except ExportCancelled:
+            self.messages.put(('cancelled', None))
+        except Exception as e:
+            self.messages.put(('error', e))
+
+class ResultSet:
+    """Search result rows with dict indexes by gene, exon and transcript
+
+    Built incrementally as result pages arrive. The gene index keeps the
+    display order of the genes, so sorting reorders it in place; filtering
+    matches against one lowercased search text per gene.
+    """
+
+    # Result columns that describe the gene rather than a single exon
+    GENE_FIELDS = ('gene_name', 'repeat_type', 'repeat_count')
+    # Result columns searched by filter_genes()
+    FILTER_FIELDS = ('gene_name', 'repeat_type', 'ensembl_exon_id', 'frame_status',
+                     'transcript_id', 'transcript_name')
+
+    def __init__(self):
+        self.rows = []
+        self.by_gene = {}
+        self.by_exon = {}
+        self.by_transcript = {}
+        self._gene_text = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def extend(self, rows):
+        """Add result rows to the indexes; returns the genes seen for the first time"""
+        new_genes = []
+        for row in rows:
+            self.rows.append(row)
+            gene_name = row['gene_name']
+            if gene_name not in self.by_gene:
+                self.by_gene[gene_name] = []
+                self._gene_text[gene_name] = ""
+                new_genes.append(gene_name)
+            self.by_gene[gene_name].append(row)
+            self.by_exon.setdefault(row['ensembl_exon_id'], []).append(row)
+            self.by_transcript.setdefault(row['transcript_id'], []).append(row)
+            self._gene_text[gene_name] += " " + " ".join(
+                str(row[field]).lower() for field in self.FILTER_FIELDS if row[field] is not None
+            )
+        return new_genes
+
+    def genes(self):
+        """Gene names in display order"""
+        return list(self.by_gene)
+
+    def gene_rows(self, gene_name):
+        return self.by_gene.get(gene_name, [])
+
+    def exon_row(self, exon_id, gene_name=None, transcript_name=None):
+        """The result row of an exon, preferring the given gene and transcript"""
+        rows = self.by_exon.get(exon_id, [])
+        for row in rows:
+            if ((gene_name is None or row['gene_name'] == gene_name)
+                    and (transcript_name is None or row['transcript_name'] == transcript_name)):
+                return row
+        return rows[0] if rows else None
+
+    def transcript_rows(self, transcript_id):
+        return self.by_transcript.get(transcript_id, [])
+
+    def sort(self, field, reverse=False):
+        """Sort genes by a gene field, or the exons within each gene by an exon field"""
+        def sort_key(row):
+            value = row[field]
+            return (value is None, value if value is not None else 0)
+
+        if field in self.GENE_FIELDS:
+            genes = sorted(self.by_gene.items(), key=lambda item: sort_key(item[1][0]), reverse=reverse)
+            self.by_gene = dict(genes)
+        else:
+            for rows in self.by_gene.values():
+                rows.sort(key=sort_key, reverse=reverse)
+
+    def filter_genes(self, text):
+        """Genes in display order whose rows contain text (case-insensitive)"""
+        text = text.strip().lower()
+        if not text:
+            return self.genes()
+        return [gene for gene in self.by_gene if text in self._gene_text[gene]]
+
 class ExonSkippingGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Exon Skipping Targets Search Tool")
         self.root.geometry("1100x800")
-        self.conn = None
-        self.results_data = []
+        self.service = None
+        self.has_candidates_table = False
+        self.results = ResultSet()
+        self.search_job = None
+        self.export_job = None
+        # Query and parameters of the last search, re-run by exports
+        self.last_query = None
+        # Gene tree nodes, and the genes whose exon rows are inserted
+        self.gene_nodes = {}
+        self.populated_genes = set()
+        # Result field the tree is sorted by, and its direction
+        self.sort_field = None
+        self.sort_reverse = False
         self.db_path = "test_sqlite/repeats.db"
         
         # Create frames
@@ -133,6 +317,8 @@ class ExonSkippingGUI:
         
         # Buttons
         ttk.Button(self.button_frame, text="Search", command=self.search).pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(self.button_frame, text="Cancel", command=self.cancel_search, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
         ttk.Button(self.button_frame, text="Clear", command=self.clear_criteria).pack(side=tk.LEFT, padx=5)
         ttk.Button(self.button_frame, text="Export Results", command=self.export_results).pack(side=tk.RIGHT, padx=5)
 
@@ -145,6 +331,14 @@ class ExonSkippingGUI:
         self.results_tab = ttk.Frame(self.results_notebook)
         self.results_notebook.add(self.results_tab, text="Results")
         
+        # Filter for the loaded results
+        self.filter_frame = ttk.Frame(self.results_tab)
+        self.filter_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(self.filter_frame, text="Filter results:").pack(side=tk.LEFT)
+        self.result_filter_var = tk.StringVar()
+        self.result_filter_var.trace_add("write", lambda *args: self.arrange_tree())
+        ttk.Entry(self.filter_frame, textvariable=self.result_filter_var, width=30).pack(side=tk.LEFT, padx=5)
+        
         # Create treeview for results
         self.tree_frame = ttk.Frame(self.results_tab)
         self.tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -170,13 +364,17 @@ class ExonSkippingGUI:
         self.tree.column("overlap", width=70)
         self.tree.column("transcript", width=150)
         
-        self.tree.heading("gene", text="Gene")
-        self.tree.heading("repeat_type", text="Repeat Type")
-        self.tree.heading("count", text="Count")
-        self.tree.heading("exon_id", text="Exon ID")
-        self.tree.heading("frame", text="Frame Status")
-        self.tree.heading("overlap", text="Overlap %")
-        self.tree.heading("transcript", text="Transcript")
+        headings = [
+            ("gene", "Gene", "gene_name"),
+            ("repeat_type", "Repeat Type", "repeat_type"),
+            ("count", "Count", "repeat_count"),
+            ("exon_id", "Exon ID", "ensembl_exon_id"),
+            ("frame", "Frame Status", "frame_status"),
+            ("overlap", "Overlap %", "overlap_percentage"),
+            ("transcript", "Transcript", "transcript_name"),
+        ]
+        for column, text, field in headings:
+            self.tree.heading(column, text=text, command=lambda f=field: self.sort_results(f))
         
         self.tree.pack(fill=tk.BOTH, expand=True)
         self.tree_scroll_y.config(command=self.tree.yview)
@@ -185,6 +383,9 @@ class ExonSkippingGUI:
         # Bind double click to show details
         self.tree.bind("<Double-1>", self.show_details)
         
+        # Exon rows are only inserted when their gene is expanded
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
+        
         # SQL Query tab
         self.sql_tab = ttk.Frame(self.results_notebook)
         self.results_notebook.add(self.sql_tab, text="SQL Query")
@@ -203,8 +404,13 @@ class ExonSkippingGUI:
         """Connect to the SQLite database"""
         try:
             if os.path.exists(self.db_path):
-                self.conn = sqlite3.connect(self.db_path)
-                self.conn.row_factory = sqlite3.Row
+                self.cancel_search()
+                if self.export_job:
+                    self.export_job.cancel()
+                if self.service:
+                    self.service.close()
+                self.service = QueryService(self.db_path)
+                self.has_candidates_table = self.service.table_exists('exon_skipping_candidates')
                 self.status_var.set(f"Connected to {self.db_path}")
                 
                 # Populate combo boxes with data from database
@@ -229,23 +435,103 @@ class ExonSkippingGUI:
     def populate_combo_boxes(self):
         """Populate combo boxes with data from database"""
         try:
-            cursor = self.conn.cursor()
-            
             # Get repeat types
-            cursor.execute("SELECT DISTINCT repeat_type FROM repeats ORDER BY repeat_type")
-            repeat_types = ["Any"] + [row[0] for row in cursor.fetchall()]
+            rows = self.service.fetch_all("SELECT DISTINCT repeat_type FROM repeats ORDER BY repeat_type")
+            repeat_types = ["Any"] + [row[0] for row in rows]
             self.repeat_type_combo['values'] = repeat_types
             
             # Get frame statuses
-            cursor.execute("SELECT DISTINCT frame_status FROM exons WHERE frame_status IS NOT NULL ORDER BY frame_status")
-            frame_statuses = ["Any"] + [row[0] for row in cursor.fetchall()]
+            rows = self.service.fetch_all(
+                "SELECT DISTINCT frame_status FROM exons WHERE frame_status IS NOT NULL ORDER BY frame_status"
+            )
+            frame_statuses = ["Any"] + [row[0] for row in rows]
             self.frame_status_combo['values'] = frame_statuses
             
         except sqlite3.Error as e:
             self.status_var.set(f"Error populating combo boxes: {e}")
 
     def build_query(self):
-        """Build the SQL query based on search criteria"""
+        """Build the SQL query based on search criteria
+
+        Standard searches are lookups in the materialised exon_skipping_candidates
+        table. Custom block count conditions and custom WHERE clauses are written
+        against the base table aliases (g, r, e, te, t), so those searches run
+        against the live join instead.
+        """
+        block_count_selection = self.block_count_var.get()
+        custom_sql = self.custom_sql_var.get().strip()
+        if (self.has_candidates_table and not custom_sql
+                and not block_count_selection.startswith("Custom")):
+            return self.build_candidate_query()
+        return self.build_live_query()
+
+    def build_candidate_query(self):
+        """Build a lookup query on the exon_skipping_candidates table"""
+        where_clauses = []
+        params = []
+
+        # The block count selection decides which materialised count is compared
+        count_column = "repeat_count"
+        block_count_selection = self.block_count_var.get()
+        if block_count_selection == "block_count = 1":
+            count_column = "single_block_count"
+            where_clauses.append("block_count = 1")
+        elif block_count_selection == "block_count = repeat_length":
+            count_column = "length_block_count"
+            where_clauses.append("block_count = repeat_length")
+
+        where_clauses.append(f"{count_column} > ?")
+        params.append(self.min_repeats_var.get())
+
+        repeat_type = self.repeat_type_var.get()
+        if repeat_type and repeat_type != "Any":
+            where_clauses.append("repeat_type = ?")
+            params.append(repeat_type)
+
+        gene_name = self.gene_name_var.get().strip()
+        if gene_name:
+            where_clauses.append("gene_name LIKE ?")
+            params.append(f"%{gene_name}%")
+
+        min_overlap = self.min_overlap_var.get()
+        if min_overlap > 0:
+            where_clauses.append("overlap_percentage >= ?")
+            params.append(min_overlap)
+
+        frame_status = self.frame_status_var.get()
+        if frame_status == "in_frame":
+            where_clauses.append("is_in_frame = 1")
+        elif frame_status and frame_status != "Any":
+            where_clauses.append("frame_status = ?")
+            params.append(frame_status)
+
+        query = f"""
+        -- Lookup in the materialised exon skipping candidates table
+        SELECT 
+            gene_name,
+            repeat_type,
+            {count_column} AS repeat_count,
+            ensembl_exon_id,
+            frame_status,
+            repeat_id,
+            position,
+            overlap_percentage,
+            overlap_bp,
+            exon_position_in_transcript,
+            transcript_id,
+            transcript_name,
+            exon_number,
+            block_count,
+            repeat_length
+        FROM exon_skipping_candidates
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY gene_name, repeat_count DESC, overlap_percentage DESC
+        """
+
+        return query, params
+
+    def build_live_query(self):
+        """Build the SQL query on the base tables based on search criteria"""
         # Base query with the gene_repeat_counts CTE
         query_parts = ["""
         -- Step 1: Find genes with multiple repeats of the same type
@@ -374,17 +660,25 @@ class ExonSkippingGUI:
         return full_query, params
     
     def search(self):
-        """Execute the search query"""
-        if not self.conn:
+        """Start the search query on a worker thread"""
+        if not self.service:
             messagebox.showerror("Error", "Not connected to a database")
             return
         
+        # Stop a search that is still running
+        if self.search_job:
+            self.search_job.cancel()
+            self.search_job = None
+        
         # Clear previous results
         for item in self.tree.get_children():
             self.tree.delete(item)
         self.sql_text.delete(1.0, tk.END)
         self.details_text.delete(1.0, tk.END)
-        self.results_data = []
+        self.results = ResultSet()
+        self.gene_nodes = {}
+        self.populated_genes = set()
+        self.sort_field = None
         
         # Build the query
         query, params = self.build_query()
@@ -393,57 +687,137 @@ class ExonSkippingGUI:
         self.sql_text.insert(tk.END, query)
         self.sql_text.insert(tk.END, "\n\nParameters: " + str(params))
         
-        # Execute the query
+        # Execute the query in the background and poll for result pages
+        self.last_query = (query, params)
+        self.search_job = SearchJob(self.service, query, params)
+        self.search_job.start()
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_var.set("Searching...")
+        
+        # Switch to results tab
+        self.results_notebook.select(0)
+        
+        self.root.after(POLL_INTERVAL_MS, self.poll_search, self.search_job)
+
+    def poll_search(self, job):
+        """Move one page of results from a running search into the tree"""
+        if job is not self.search_job:
+            return  # cancelled or replaced by a newer search
+        
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            
-            # Store results for later use
-            self.results_data = [dict(row) for row in results]
-            
-            # Group results by gene
-            gene_results = {}
-            for row in self.results_data:
-                gene_name = row['gene_name']
-                
-                if gene_name not in gene_results:
-                    # Insert main gene row
-                    gene_id = self.tree.insert("", tk.END, text=gene_name, values=(
-                        gene_name,
-                        row['repeat_type'],
-                        row['repeat_count'],
-                        f"{row['repeat_count']} repeats",
-                        "",
-                        "",
-                        ""
-                    ))
-                    
-                    gene_results[gene_name] = {
-                        'tree_id': gene_id,
-                        'exons': []
-                    }
-                
-                # Add exon as child of gene
-                exon_id = self.tree.insert(gene_results[gene_name]['tree_id'], tk.END, text=row['ensembl_exon_id'], values=(
-                    "",
-                    "",
-                    "",
-                    row['ensembl_exon_id'],
-                    row['frame_status'],
-                    f"{row['overlap_percentage']}%",
-                    row['transcript_name']
-                ))
-                gene_results[gene_name]['exons'].append(exon_id)
-            
-            self.status_var.set(f"Found {len(gene_results)} genes with suitable exons")
-            
-            # Switch to results tab
-            self.results_notebook.select(0)
-            
-        except sqlite3.Error as e:
-            self.status_var.set(f"Search error: {e}")
-            messagebox.showerror("Error", f"Search error: {e}")
+            kind, payload = job.pages.get_nowait()
+        except queue.Empty:
+            self.root.after(POLL_INTERVAL_MS, self.poll_search, job)
+            return
+        
+        if kind == 'rows':
+            self.add_result_page(payload)
+            self.status_var.set(f"Searching... {len(self.results)} exons in {len(self.gene_nodes)} genes")
+            # Yield to the event loop between pages
+            self.root.after(1, self.poll_search, job)
+            return
+        
+        self.search_job = None
+        self.cancel_button.config(state=tk.DISABLED)
+        if kind == 'done':
+            if self.sort_field:
+                self.sort_results(self.sort_field, toggle=False)
+            self.status_var.set(f"Found {len(self.gene_nodes)} genes with suitable exons")
+        else:
+            self.status_var.set(f"Search error: {payload}")
+            messagebox.showerror("Error", f"Search error: {payload}")
+
+    def cancel_search(self):
+        """Cancel the running search, keeping the rows loaded so far"""
+        if not self.search_job:
+            return
+        self.search_job.cancel()
+        self.search_job = None
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_var.set(f"Search cancelled after {len(self.results)} exons in {len(self.gene_nodes)} genes")
+
+    def add_result_page(self, rows):
+        """Index a page of result rows and insert nodes for new genes"""
+        new_genes = set(self.results.extend(rows))
+        
+        for gene_name in new_genes:
+            row = self.results.gene_rows(gene_name)[0]
+            # Insert main gene row
+            gene_node = self.tree.insert("", tk.END, text=gene_name, values=(
+                gene_name,
+                row['repeat_type'],
+                row['repeat_count'],
+                f"{row['repeat_count']} repeats",
+                "",
+                "",
+                ""
+            ))
+            # Placeholder child, so the gene can be expanded before its exons exist
+            self.tree.insert(gene_node, tk.END, values=("", "", "", "Loading...", "", "", ""))
+            self.gene_nodes[gene_name] = gene_node
+        
+        # Exons arriving for genes that are already expanded
+        for row in rows:
+            gene_name = row['gene_name']
+            if gene_name in self.populated_genes and gene_name not in new_genes:
+                self.insert_exon_row(self.gene_nodes[gene_name], row)
+        
+        if self.result_filter_var.get().strip():
+            self.arrange_tree()
+
+    def insert_exon_row(self, gene_node, row):
+        """Add an exon as child of its gene"""
+        self.tree.insert(gene_node, tk.END, text=row['ensembl_exon_id'], values=(
+            "",
+            "",
+            "",
+            row['ensembl_exon_id'],
+            row['frame_status'],
+            f"{row['overlap_percentage']}%",
+            row['transcript_name']
+        ))
+
+    def on_tree_open(self, event):
+        """Insert the exon rows of a gene the first time it is expanded"""
+        gene_node = self.tree.focus()
+        if not gene_node or self.tree.parent(gene_node):
+            return
+        
+        gene_name = str(self.tree.item(gene_node, 'text'))
+        if gene_name in self.populated_genes:
+            return
+        
+        self.populate_gene(gene_node, gene_name)
+        self.populated_genes.add(gene_name)
+
+    def populate_gene(self, gene_node, gene_name):
+        """(Re)insert the exon rows of a gene in the result set's order"""
+        self.tree.delete(*self.tree.get_children(gene_node))
+        for row in self.results.gene_rows(gene_name):
+            self.insert_exon_row(gene_node, row)
+
+    def sort_results(self, field, toggle=True):
+        """Sort the tree by a result field; clicking the same heading again reverses it"""
+        if toggle:
+            self.sort_reverse = (field == self.sort_field) and not self.sort_reverse
+        self.sort_field = field
+        self.results.sort(field, self.sort_reverse)
+        
+        if field in ResultSet.GENE_FIELDS:
+            self.arrange_tree()
+        else:
+            for gene_name in self.populated_genes:
+                self.populate_gene(self.gene_nodes[gene_name], gene_name)
+
+    def arrange_tree(self):
+        """Show the genes matching the result filter, in the result set's order"""
+        visible = self.results.filter_genes(self.result_filter_var.get())
+        visible_set = set(visible)
+        for index, gene_name in enumerate(visible):
+            self.tree.move(self.gene_nodes[gene_name], "", index)
+        hidden = [self.gene_nodes[gene] for gene in self.gene_nodes if gene not in visible_set]
+        if hidden:
+            self.tree.detach(*hidden)
 
     def show_details(self, event):
         """Show details for the selected item"""
@@ -457,10 +831,10 @@ class ExonSkippingGUI:
         parent = self.tree.parent(selected_item)
         
         if not parent:  # This is a gene row
-            gene_name = self.tree.item(selected_item)['values'][0]
+            gene_name = str(self.tree.item(selected_item)['text'])
             
             # Find all results for this gene
-            gene_results = [r for r in self.results_data if r['gene_name'] == gene_name]
+            gene_results = self.results.gene_rows(gene_name)
             if not gene_results:
                 return
                 
@@ -487,14 +861,16 @@ class ExonSkippingGUI:
             
         else:  # This is an exon row
             # Find the corresponding exon in the results
-            exon_id = self.tree.item(selected_item)['values'][3]
+            exon_id = str(self.tree.item(selected_item)['text'])
             
             # Find this specific exon in the results
-            exon_results = [r for r in self.results_data if r['ensembl_exon_id'] == exon_id]
-            if not exon_results:
+            row = self.results.exon_row(
+                exon_id,
+                gene_name=str(self.tree.item(parent)['text']),
+                transcript_name=self.tree.item(selected_item)['values'][6]
+            )
+            if row is None:
                 return
-                
-            row = exon_results[0]
             
             # Display detailed exon information
             self.details_text.insert(tk.END, f"Exon ID: {row['ensembl_exon_id']}\n")
@@ -531,26 +907,75 @@ class ExonSkippingGUI:
         self.custom_sql_var.set("")
 
     def export_results(self):
-        """Export results to CSV file"""
-        if not self.results_data:
+        """Export the last search's results, streamed from the database in the background"""
+        if not self.results or not self.last_query:
             messagebox.showinfo("Export", "No results to export")
             return
+        if self.export_job:
+            messagebox.showinfo("Export", "An export is already running")
+            return
             
         filename = filedialog.asksaveasfilename(
             title="Save Results",
-            filetypes=(("CSV files", "*.csv"), ("All files", "*.*")),
+            filetypes=[(label, f"*{extension}") for label, extension in EXPORT_FORMATS.values()]
+                      + [("All files", "*.*")],
             defaultextension=".csv"
         )
         
         if not filename:
             return
+        
+        query, params = self.last_query
+        self.export_job = ExportJob(self.service, query, params, filename)
+        self.show_export_progress(filename)
+        self.export_job.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_export, self.export_job)
+
+    def show_export_progress(self, filename):
+        """Open a small window with the export's progress and a Cancel button"""
+        self.export_window = tk.Toplevel(self.root)
+        self.export_window.title("Exporting Results")
+        self.export_window.transient(self.root)
+        self.export_window.resizable(False, False)
+        self.export_window.protocol("WM_DELETE_WINDOW", self.export_job.cancel)
+        
+        ttk.Label(self.export_window, text=f"Exporting to {os.path.basename(filename)}").pack(padx=10, pady=(10, 5))
+        self.export_progress = ttk.Progressbar(self.export_window, length=300, mode='indeterminate')
+        self.export_progress.pack(padx=10, pady=5)
+        self.export_progress.start()
+        self.export_status_var = tk.StringVar(value="Counting rows...")
+        ttk.Label(self.export_window, textvariable=self.export_status_var).pack(padx=10, pady=5)
+        ttk.Button(self.export_window, text="Cancel", command=self.export_job.cancel).pack(pady=(5, 10))
+
+    def poll_export(self, job):
+        """Apply the progress messages of a running export"""
+        while True:
+            try:
+                kind, payload = job.messages.get_nowait()
+            except queue.Empty:
+                self.root.after(POLL_INTERVAL_MS, self.poll_export, job)
+                return
             
-        try:
-            df = pd.DataFrame(self.results_data)
-            df.to_csv(filename, index=False)
-            self.status_var.set(f"Results exported to {filename}")
-        except Exception as e:
-            messagebox.showerror("Export Error", str(e))
+            if kind == 'total':
+                job.total = payload
+                self.export_progress.stop()
+                self.export_progress.config(mode='determinate', maximum=max(payload, 1), value=0)
+                self.export_status_var.set(f"0 / {payload} rows")
+            elif kind == 'progress':
+                self.export_progress.config(value=payload)
+                self.export_status_var.set(f"{payload} / {job.total} rows")
+            else:
+                break
+        
+        self.export_window.destroy()
+        self.export_job = None
+        if kind == 'done':
+            self.status_var.set(f"Exported {payload} rows to {job.path}")
+        elif kind == 'cancelled':
+            self.status_var.set("Export cancelled")
+        else:
+            self.status_var.set(f"Export error: {payload}")
+            messagebox.showerror("Export Error", str(payload))
 
     def show_about(self):
         """Show about dialog"""
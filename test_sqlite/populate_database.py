@@ -7,6 +7,9 @@ import sys
 from collections import defaultdict
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from normalize_repeat_types import normalize_repeat_type
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -77,53 +80,33 @@ def insert_or_get_protein(cursor, uniprot_id, gene_id, length=None, description=
     )
     return uniprot_id
 
-def insert_repeat(cursor, protein_id, repeat_data):
-    """Insert repeat and return repeat_id"""
-    cursor.execute(
-        """
-        INSERT INTO repeats 
-        (protein_id, repeat_type, chrom, chrom_start, chrom_end, 
-        strand, position, repeat_length, reserved) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            protein_id, 
-            repeat_data.get('repeatType'), 
-            repeat_data.get('chrom'), 
-            repeat_data.get('chromStart'), 
-            repeat_data.get('chromEnd'),
-            repeat_data.get('strand'), 
-            repeat_data.get('position'), 
-            repeat_data.get('repeatLength'),
-            json.dumps(repeat_data.get('reserved', []))
-        )
-    )
-    repeat_id = cursor.lastrowid
-    
-    # Extract start and end positions from position field
-    position = repeat_data.get('position', '')
-    start_pos = None
-    end_pos = None
-    
+def parse_protein_position(position):
+    """(start, end) from a position like "amino acids 10-50 on protein ...", else (None, None)"""
     if position and 'amino acids' in position:
         try:
             pos_part = position.split('amino acids ')[1].split(' on')[0]
             if '-' in pos_part:
                 start_pos, end_pos = map(int, pos_part.split('-'))
+                return start_pos, end_pos
         except (IndexError, ValueError):
             pass
-    
-    # Update start_pos and end_pos
-    if start_pos is not None and end_pos is not None:
-        cursor.execute(
-            "UPDATE repeats SET start_pos = ?, end_pos = ? WHERE repeat_id = ?",
-            (start_pos, end_pos, repeat_id)
-        )
+    return None, None
+
+def insert_repeat(cursor, protein_id, repeat_data):
+    """Insert repeat and return repeat_id, or None if the repeat is stored already
+
+    A repeat is identified by its protein and position (protein_id,
+    start_pos, end_pos, chrom, chrom_start, chrom_end; see
+    idx_repeats_unique), so appending the same records twice adds nothing.
+    """
+    start_pos, end_pos = parse_protein_position(repeat_data.get('position', ''))
     
     # Add block data if available
     block_count = repeat_data.get('blockCount', 0)
     block_sizes = repeat_data.get('blockSizes', [])
     block_starts = repeat_data.get('chromStarts', [])
+    block_sizes_str = None
+    block_starts_str = None
     
     if block_count and block_sizes and block_starts:
         if isinstance(block_sizes, list):
@@ -135,13 +118,67 @@ def insert_repeat(cursor, protein_id, repeat_data):
             block_starts_str = ','.join(map(str, block_starts))
         else:
             block_starts_str = str(block_starts)
-            
-        cursor.execute(
-            "UPDATE repeats SET block_count = ?, block_sizes = ?, block_starts = ? WHERE repeat_id = ?",
-            (block_count, block_sizes_str, block_starts_str, repeat_id)
+    else:
+        block_count = None
+    
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO repeats 
+        (protein_id, repeat_type, chrom, chrom_start, chrom_end, 
+        strand, position, repeat_length, reserved, start_pos, end_pos,
+        block_count, block_sizes, block_starts) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            protein_id, 
+            repeat_data.get('repeatType'), 
+            repeat_data.get('chrom'), 
+            repeat_data.get('chromStart'), 
+            repeat_data.get('chromEnd'),
+            repeat_data.get('strand'), 
+            repeat_data.get('position'), 
+            repeat_data.get('repeatLength'),
+            json.dumps(repeat_data.get('reserved', [])),
+            start_pos,
+            end_pos,
+            block_count,
+            block_sizes_str,
+            block_starts_str
         )
+    )
+    if cursor.rowcount == 0:
+        return None
+    return cursor.lastrowid
+
+def remove_duplicate_repeats(conn):
+    """Delete repeats stored more than once (by databases older than
+    idx_repeats_unique), keeping the first, so the unique index can be created
+
+    Returns the gene ids of the deleted repeats, whose derived rows need
+    refreshing.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'repeats'").fetchone():
+        return set()
+    duplicates = conn.execute(
+        """
+        SELECT r.repeat_id, p.gene_id
+        FROM repeats r
+        LEFT JOIN proteins p ON r.protein_id = p.protein_id
+        WHERE r.repeat_id NOT IN (
+            SELECT MIN(repeat_id) FROM repeats
+            GROUP BY protein_id, start_pos, end_pos, chrom, chrom_start, chrom_end
+        )
+        """
+    ).fetchall()
+    if not duplicates:
+        return set()
     
-    return repeat_id
+    repeat_ids = [(repeat_id,) for repeat_id, _ in duplicates]
+    for table in ("repeat_exons", "repeat_transcripts", "exon_skipping_candidates", "repeats"):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+            conn.executemany(f"DELETE FROM {table} WHERE repeat_id = ?", repeat_ids)
+    logger.info(f"Removed {len(duplicates)} duplicate repeats")
+    return {gene_id for _, gene_id in duplicates if gene_id is not None}
 
 def insert_or_get_transcript(cursor, transcript_data, gene_id):
     """Insert transcript if not exists and return transcript_id"""
@@ -313,8 +350,125 @@ def process_ensembl_info(cursor, repeat_id, ensembl_info, gene_id):
                  ensembl_info_dict.get('overlap_percentage'))
             )
 
-def populate_database(json_file, db_file, schema_file):
-    """Populate the database with data from JSON file"""
+CANDIDATE_COLUMNS = [
+    'repeat_id', 'exon_id', 'transcript_id', 'gene_id', 'gene_name', 'repeat_type',
+    'repeat_count', 'single_block_count', 'length_block_count',
+    'position', 'block_count', 'repeat_length',
+    'ensembl_exon_id', 'frame_status', 'is_in_frame',
+    'overlap_percentage', 'overlap_bp', 'exon_position_in_transcript',
+    'transcript_name', 'exon_number'
+]
+
+# SQLite's default limit on bound parameters is 999
+GENE_ID_BATCH_SIZE = 500
+
+def _refresh_batches(cursor, table, gene_ids):
+    """Delete the rows of the given genes (all rows if None) from a derived table
+
+    Yields a (gene_filter, params) pair per batch of gene ids, with
+    gene_filter restricting a re-insert query on p.gene_id.
+    """
+    if gene_ids is None:
+        cursor.execute(f"DELETE FROM {table}")
+        yield "", []
+        return
+
+    gene_ids = sorted(set(gene_ids))
+    for i in range(0, len(gene_ids), GENE_ID_BATCH_SIZE):
+        batch = gene_ids[i:i + GENE_ID_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        cursor.execute(f"DELETE FROM {table} WHERE gene_id IN ({placeholders})", batch)
+        yield f"WHERE p.gene_id IN ({placeholders})", batch
+
+def refresh_exon_skipping_candidates(cursor, gene_ids=None):
+    """Rebuild the materialised exon skipping candidates for the given genes
+
+    Every row of a gene carries that gene's per-repeat-type counts, so a
+    gene is always refreshed as a whole. Pass gene_ids=None to rebuild the
+    whole table. Returns the number of candidate rows written.
+    """
+    written = 0
+    for gene_filter, params in _refresh_batches(cursor, "exon_skipping_candidates", gene_ids):
+        cursor.execute(
+            f"""
+            INSERT INTO exon_skipping_candidates ({', '.join(CANDIDATE_COLUMNS)})
+            WITH gene_repeat_counts AS (
+                SELECT p.gene_id, r.repeat_type,
+                       COUNT(DISTINCT r.repeat_id) AS repeat_count,
+                       COUNT(DISTINCT CASE WHEN r.block_count = 1
+                                           THEN r.repeat_id END) AS single_block_count,
+                       COUNT(DISTINCT CASE WHEN r.block_count = r.repeat_length
+                                           THEN r.repeat_id END) AS length_block_count
+                FROM proteins p
+                JOIN repeats r ON p.protein_id = r.protein_id
+                {gene_filter}
+                GROUP BY p.gene_id, r.repeat_type
+            )
+            SELECT
+                r.repeat_id, e.exon_id, te.transcript_id, g.gene_id, g.gene_name, r.repeat_type,
+                grc.repeat_count, grc.single_block_count, grc.length_block_count,
+                r.position, r.block_count, r.repeat_length,
+                e.ensembl_exon_id, e.frame_status, e.frame_status = 'in_frame',
+                te.overlap_percentage, te.overlap_bp, te.exon_position_in_transcript,
+                t.transcript_name, te.exon_number
+            FROM gene_repeat_counts grc
+            JOIN genes g ON grc.gene_id = g.gene_id
+            JOIN proteins p ON g.gene_id = p.gene_id
+            JOIN repeats r ON p.protein_id = r.protein_id AND r.repeat_type = grc.repeat_type
+            JOIN repeat_exons re ON r.repeat_id = re.repeat_id
+            JOIN exons e ON re.exon_id = e.exon_id
+            JOIN transcript_exons te ON e.exon_id = te.exon_id
+            JOIN transcripts t ON te.transcript_id = t.transcript_id
+            """,
+            params
+        )
+        written += cursor.rowcount
+
+    return written
+
+def refresh_protein_repeat_summary(cursor, gene_ids=None):
+    """Rebuild the per-(protein, repeat_type) summary rows for the given genes
+
+    Repeat types are grouped by normalize_repeat_type, as in the static
+    viewer ("LRR 1" and "LRR 2" count as "LRR"). Pass gene_ids=None to
+    rebuild the whole table. Returns the number of rows written.
+    """
+    cursor.connection.create_function("normalize_repeat_type", 1, normalize_repeat_type, deterministic=True)
+    written = 0
+    for gene_filter, params in _refresh_batches(cursor, "protein_repeat_summary", gene_ids):
+        cursor.execute(
+            f"""
+            INSERT INTO protein_repeat_summary
+            (protein_id, repeat_type, gene_id, gene_name, chrom, status,
+             repeat_count, has_in_frame_exons, has_non_spanning_repeats)
+            SELECT
+                p.protein_id, normalize_repeat_type(r.repeat_type), g.gene_id, g.gene_name, MIN(r.chrom), p.status,
+                COUNT(*),
+                MAX(EXISTS (
+                    SELECT 1 FROM repeat_exons re
+                    JOIN exons e ON re.exon_id = e.exon_id
+                    WHERE re.repeat_id = r.repeat_id AND e.frame_status = 'in_frame'
+                )),
+                COALESCE(MAX(r.block_count = 1), 0)
+            FROM proteins p
+            JOIN genes g ON p.gene_id = g.gene_id
+            JOIN repeats r ON p.protein_id = r.protein_id
+            {gene_filter}
+            GROUP BY p.protein_id, normalize_repeat_type(r.repeat_type)
+            """,
+            params
+        )
+        written += cursor.rowcount
+
+    return written
+
+def populate_database(json_file, db_file, schema_file, append=False):
+    """Populate the database with data from JSON file
+
+    With append=True the existing database is kept and the JSON is ingested
+    on top of it; only the genes touched by the new records get their
+    derived rows (exon skipping candidates, protein repeat summary) refreshed.
+    """
     # Check if files exist
     if not os.path.exists(json_file):
         logger.error(f"JSON file not found: {json_file}")
@@ -325,7 +479,7 @@ def populate_database(json_file, db_file, schema_file):
         return False
     
     # Remove existing database if it exists
-    if os.path.exists(db_file):
+    if os.path.exists(db_file) and not append:
         os.remove(db_file)
         logger.info(f"Removed existing database: {db_file}")
     
@@ -341,14 +495,19 @@ def populate_database(json_file, db_file, schema_file):
     # Connect to database and create tables
     conn = sqlite3.connect(db_file)
     conn.execute("PRAGMA foreign_keys = ON")
+    # Persistent: QueryService readers keep reading while the database is updated
+    conn.execute("PRAGMA journal_mode = WAL")
     cursor = conn.cursor()
     
     try:
+        # Genes whose candidate rows need refreshing after ingest
+        touched_gene_ids = remove_duplicate_repeats(conn)
         create_tables(conn, schema_file)
         
         # Track processed genes and proteins to avoid duplicates
         processed_genes = {}
         processed_proteins = {}
+        skipped_repeats = 0
         
         # Process each item
         for i, item in enumerate(data):
@@ -387,44 +546,54 @@ def populate_database(json_file, db_file, schema_file):
             protein_length = item.get('length')
             protein_description = item.get('description')
             
-            # Insert or get protein
+            # Insert or get protein, with the gene it is stored under (an
+            # existing protein keeps its gene)
             if uniprot_id in processed_proteins:
-                protein_id = processed_proteins[uniprot_id]
+                protein_id, protein_gene_id = processed_proteins[uniprot_id]
             else:
                 protein_id = insert_or_get_protein(
                     cursor, uniprot_id, gene_id, 
                     protein_length, protein_description, status
                 )
-                processed_proteins[uniprot_id] = protein_id
+                protein_gene_id = cursor.execute(
+                    "SELECT gene_id FROM proteins WHERE protein_id = ?", (protein_id,)
+                ).fetchone()[0]
+                processed_proteins[uniprot_id] = (protein_id, protein_gene_id)
             
-            # Insert repeat
+            # Insert repeat; one stored already is skipped with its exon information
             repeat_id = insert_repeat(cursor, protein_id, item)
-            
+            if repeat_id is None:
+                skipped_repeats += 1
+                continue
+            touched_gene_ids.add(protein_gene_id)
+
             # Process ensembl exon information
             ensembl_info = item.get('ensembl_exon_info')
             if ensembl_info:
                 process_ensembl_info(cursor, repeat_id, ensembl_info, gene_id)
-        
+
+        candidate_count = refresh_exon_skipping_candidates(cursor, touched_gene_ids)
+        logger.info(f"Refreshed {candidate_count} exon skipping candidates for {len(touched_gene_ids)} genes")
+        summary_count = refresh_protein_repeat_summary(cursor, touched_gene_ids)
+        logger.info(f"Refreshed {summary_count} protein repeat summary rows")
+
         conn.commit()
+        if skipped_repeats:
+            logger.info(f"Skipped {skipped_repeats} repeats that were stored already")
         logger.info(f"Database populated successfully with data from {len(processed_genes)} genes and {len(processed_proteins)} proteins")
-        
+
         # Create example query for exon skipping subjects
         logger.info("\nExample SQL query for exon skipping subjects:")
         example_query = """
         -- Find genes with more than 5 of the same repeat type and exons with significant overlap
-        SELECT g.gene_name, r.repeat_type, COUNT(DISTINCT r.repeat_id) as repeat_count,
-               e.ensembl_exon_id, e.frame_status, te.overlap_percentage
-        FROM genes g
-        JOIN proteins p ON g.gene_id = p.gene_id
-        JOIN repeats r ON p.protein_id = r.protein_id
-        JOIN repeat_exons re ON r.repeat_id = re.repeat_id
-        JOIN exons e ON re.exon_id = e.exon_id
-        JOIN transcript_exons te ON e.exon_id = te.exon_id
-        WHERE e.frame_status = 'in_frame'
-          AND te.overlap_percentage >= 70
-        GROUP BY g.gene_id, r.repeat_type
-        HAVING COUNT(DISTINCT r.repeat_id) > 5
-        ORDER BY g.gene_name, repeat_count DESC;
+        SELECT gene_name, repeat_type, repeat_count,
+               ensembl_exon_id, frame_status, overlap_percentage
+        FROM exon_skipping_candidates
+        WHERE is_in_frame = 1
+          AND block_count = 1
+          AND overlap_percentage >= 70
+          AND repeat_count > 5
+        ORDER BY gene_name, repeat_count DESC, overlap_percentage DESC;
         """
         logger.info(example_query)
         
@@ -437,19 +606,51 @@ def populate_database(json_file, db_file, schema_file):
     finally:
         conn.close()
 
+def rebuild_derived_tables(db_file, schema_file):
+    """Create any missing tables and rebuild the derived tables of an existing database"""
+    if not os.path.exists(db_file):
+        logger.error(f"Database file not found: {db_file}")
+        return False
+
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        remove_duplicate_repeats(conn)
+        create_tables(conn, schema_file)
+        cursor = conn.cursor()
+        candidate_count = refresh_exon_skipping_candidates(cursor)
+        summary_count = refresh_protein_repeat_summary(cursor)
+        conn.commit()
+        logger.info(f"Rebuilt {candidate_count} exon skipping candidates and "
+                    f"{summary_count} protein repeat summary rows in {db_file}")
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"SQLite error: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
 def main():
-    json_file = 'output/1000_test_exons_hg38_repeats.json'
-    db_file = 'test_sqlite/repeats.db'
-    schema_file = 'test_sqlite/database_schema.sql'
-    
-    if len(sys.argv) > 1:
-        json_file = sys.argv[1]
-    if len(sys.argv) > 2:
-        db_file = sys.argv[2]
-    if len(sys.argv) > 3:
-        schema_file = sys.argv[3]
-        
-    success = populate_database(json_file, db_file, schema_file)
+    import argparse
+    parser = argparse.ArgumentParser(description="Populate the repeats database from annotated repeat JSON.")
+    parser.add_argument("json_file", nargs="?", default='output/1000_test_exons_hg38_repeats.json',
+                        help="Annotated repeats JSON file")
+    parser.add_argument("db_file", nargs="?", default='test_sqlite/repeats.db',
+                        help="SQLite database file")
+    parser.add_argument("schema_file", nargs="?", default='test_sqlite/database_schema.sql',
+                        help="SQL schema file")
+    parser.add_argument("--append", action="store_true",
+                        help="Ingest into the existing database instead of recreating it")
+    parser.add_argument("--rebuild-derived", metavar="DB_FILE",
+                        help="Only rebuild the derived tables (exon skipping candidates, "
+                             "protein repeat summary) of an existing database")
+    args = parser.parse_args()
+
+    if args.rebuild_derived:
+        success = rebuild_derived_tables(args.rebuild_derived, args.schema_file)
+    else:
+        success = populate_database(args.json_file, args.db_file, args.schema_file, append=args.append)
     if success:
         logger.info("Database population completed successfully")
     else:
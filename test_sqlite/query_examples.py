@@ -1,96 +1,81 @@
-import sqlite3
 import json
 import os
 
+from query_service import QueryService, CandidateRow
+
 def connect_to_database(db_path):
-    """Connect to the database"""
+    """Open a read-only query service on the database"""
     if not os.path.exists(db_path):
         print(f"Database file not found: {db_path}")
         return None
     
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-    return conn
+    return QueryService(db_path)
 
-def display_database_stats(conn):
+def display_database_stats(service):
     """Display basic statistics about the database"""
-    cursor = conn.cursor()
-    
     # Count records in each table
     tables = ['genes', 'gene_aliases', 'proteins', 'repeats', 'transcripts', 'repeat_transcripts', 'exons']
     print("Database Statistics:")
     print("===================")
     
     for table in tables:
-        cursor.execute(f"SELECT COUNT(*) as count FROM {table}")
-        count = cursor.fetchone()['count']
+        count = service.scalar(f"SELECT COUNT(*) as count FROM {table}")
         print(f"{table.capitalize()}: {count} records")
     
     # Count unique repeat types
-    cursor.execute("SELECT repeat_type, COUNT(*) as count FROM repeats GROUP BY repeat_type ORDER BY count DESC")
-    repeat_types = cursor.fetchall()
+    repeat_types = service.fetch_all(
+        "SELECT repeat_type, COUNT(*) as count FROM repeats GROUP BY repeat_type ORDER BY count DESC"
+    )
     
     print("\nRepeat Types:")
     for rt in repeat_types:
         print(f"  {rt['repeat_type']}: {rt['count']} repeats")
 
-def find_exon_skipping_subjects(conn, min_repeats=5, min_overlap_percentage=70):
+def find_exon_skipping_subjects(service, min_repeats=5, min_overlap_percentage=70):
     """Find genes with exon skipping potential
     
     This finds genes that have:
     1. More than 'min_repeats' of the same repeat type
     2. At least one exon with 'min_overlap_percentage' or more overlap
     3. Exons that are in frame
-    4. Repeats with block_count = 1 (single-block repeats)eats)
+    4. Repeats with block_count = 1 (single-block repeats)
+
+    Reads the exon_skipping_candidates table, so the database must have been
+    built (or refreshed) by populate_database.py.
     """
-    cursor = conn.cursor()
-    
+    if not service.table_exists('exon_skipping_candidates'):
+        print("\nThe exon_skipping_candidates table is missing from this database.")
+        print("Build it with: python test_sqlite/populate_database.py --rebuild-derived <db_file>")
+        return
+
+    # Lookup in the table materialised by populate_database.py
     query = """
-    -- Step 1: Find genes with multiple repeats of the same type
-    WITH gene_repeat_counts AS (
-        SELECT g.gene_id, g.gene_name, r.repeat_type, COUNT(DISTINCT r.repeat_id) as repeat_count
-        FROM genes g
-        JOIN proteins p ON g.gene_id = p.gene_id
-        JOIN repeats r ON p.protein_id = r.protein_id
-        -- WHERE r.block_count = 1  -- Only include repeats with block_count = 1
-        GROUP BY g.gene_id, r.repeat_type
-        HAVING COUNT(DISTINCT r.repeat_id) > ?
-    )
-    
-    -- Step 2: Find exons with significant overlap and in-frame status
-    SELECT 
-        grc.gene_name,
-        grc.repeat_type,
-        grc.repeat_count,
-        e.ensembl_exon_id,
-        e.frame_status,
-        r.repeat_id,
-        r.position,
-        te.overlap_percentage,
-        te.overlap_bp,
-        te.exon_position_in_transcript,
-        te.transcript_id,
-        t.transcript_name,
-        te.exon_number,
-        r.block_count,
-        r.repeat_length
-    FROM gene_repeat_counts grc
-    JOIN genes g ON grc.gene_id = g.gene_id
-    JOIN proteins p ON g.gene_id = p.gene_id
-    JOIN repeats r ON p.protein_id = r.protein_id AND r.repeat_type = grc.repeat_type
-    JOIN repeat_exons re ON r.repeat_id = re.repeat_id
-    JOIN exons e ON re.exon_id = e.exon_id
-    JOIN transcript_exons te ON e.exon_id = te.exon_id
-    JOIN transcripts t ON te.transcript_id = t.transcript_id
-    WHERE 
-        e.frame_status = 'in_frame'
-        AND te.overlap_percentage >= ?
-        AND r.block_count = 1  -- Only include repeats with block_count = 1ude repeats with block_count = 1
-    ORDER BY grc.gene_name, grc.repeat_count DESC, te.overlap_percentage DESC
+    SELECT
+        gene_name,
+        repeat_type,
+        repeat_count,
+        ensembl_exon_id,
+        frame_status,
+        repeat_id,
+        position,
+        overlap_percentage,
+        overlap_bp,
+        exon_position_in_transcript,
+        transcript_id,
+        transcript_name,
+        exon_number,
+        block_count,
+        repeat_length
+    FROM exon_skipping_candidates
+    WHERE
+        repeat_count > ?
+        AND is_in_frame = 1
+        AND overlap_percentage >= ?
+        AND block_count = 1  -- Only include repeats with block_count = 1
+    ORDER BY gene_name, repeat_count DESC, overlap_percentage DESC
     """
     
-    cursor.execute(query, (min_repeats, min_overlap_percentage))
-    results = cursor.fetchall()
+    results = service.fetch_all(query, (min_repeats, min_overlap_percentage), row_type=CandidateRow)
     
     # Organize results by gene
     gene_results = {}
@@ -149,10 +134,8 @@ def find_exon_skipping_subjects(conn, min_repeats=5, min_overlap_percentage=70):
         if len(data['exons']) > 5:
             print(f"   ... and {len(data['exons']) - 5} more exons")
 
-def find_specific_gene_repeats(conn, gene_name):
+def find_specific_gene_repeats(service, gene_name):
     """Find repeats for a specific gene"""
-    cursor = conn.cursor()
-    
     query = """
     SELECT 
         g.gene_name,
@@ -173,8 +156,7 @@ def find_specific_gene_repeats(conn, gene_name):
     ORDER BY r.repeat_type, r.chrom_start
     """
     
-    cursor.execute(query, (gene_name,))
-    results = cursor.fetchall()
+    results = service.fetch_all(query, (gene_name,))
     
     print(f"\nRepeats for gene '{gene_name}':")
     print("=============================")
@@ -203,10 +185,8 @@ def find_specific_gene_repeats(conn, gene_name):
             print(f"   Length: {repeat['repeat_length']}")
             print(f"   Protein: {repeat['protein_id']} ({repeat['status']})")
 
-def debug_exon_info(conn, exon_id=None):
+def debug_exon_info(service, exon_id=None):
     """Debug function to examine specific exon information"""
-    cursor = conn.cursor()
-    
     if exon_id:
         # Query for a specific exon
         query = """
@@ -232,7 +212,7 @@ def debug_exon_info(conn, exon_id=None):
         WHERE e.ensembl_exon_id = ?
         ORDER BY r.repeat_id
         """
-        cursor.execute(query, (exon_id,))
+        results = service.fetch_all(query, (exon_id,))
     else:
         # Get a sample of exons
         query = """
@@ -258,9 +238,7 @@ def debug_exon_info(conn, exon_id=None):
         WHERE e.ensembl_info IS NOT NULL
         LIMIT 5
         """
-        cursor.execute(query)
-    
-    results = cursor.fetchall()
+        results = service.fetch_all(query)
     
     print("\nExon Debug Information:")
     print("======================")
@@ -361,26 +339,26 @@ def debug_exon_info(conn, exon_id=None):
 def main():
     db_path = 'test_sqlite/repeats.db'
     
-    conn = connect_to_database(db_path)
-    if not conn:
+    service = connect_to_database(db_path)
+    if not service:
         return
     
     try:
         # Display database statistics
-        display_database_stats(conn)
+        display_database_stats(service)
         
         # Debug a specific exon by its Ensembl ID
-        # debug_exon_info(conn, "ENSE00000769655")  # Check this specific exon
+        # debug_exon_info(service, "ENSE00000769655")  # Check this specific exon
         
         # Also check a few other exons to see if the issue is widespread
         # print("\nChecking other exons for possible indexing issues:")
-        # debug_exon_info(conn, "ENSE00001368267")  # Another exon to check
+        # debug_exon_info(service, "ENSE00001368267")  # Another exon to check
         
         # Find exon skipping subjects
-        find_exon_skipping_subjects(conn, min_repeats=5, min_overlap_percentage=70)
+        find_exon_skipping_subjects(service, min_repeats=5, min_overlap_percentage=70)
         
     finally:
-        conn.close()
+        service.close()
 
 if __name__ == "__main__":
     main()
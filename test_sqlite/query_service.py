@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Read-only query service over the Tandem Repeat Domain Database (repeats.db).
+
+The GUI, the command line examples and the viewer's HTTP server share one
+QueryService instead of each opening its own sqlite3 connection. The service
+keeps a small pool of read-only connections and never writes to the database
+file. populate_database.py writes the database in WAL mode, so the readers
+do not block while it is being updated. Each connection keeps a large
+prepared statement cache, which works because callers use constant SQL text
+with bound parameters. Rows come back as typed, immutable tuples.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "repeats.db")
+DEFAULT_POOL_SIZE = 4
+# Per-connection prepared statement cache (sqlite3 keeps it keyed by SQL text)
+STATEMENT_CACHE_SIZE = 256
+# SQLite VM instructions between checks of a cancel event
+CANCEL_CHECK_INTERVAL = 10000
+
+
+class _RowAccess:
+    """Mixin giving typed rows the mapping interface of sqlite3.Row
+
+    Rows support attribute access (row.gene_name), name lookup
+    (row['gene_name']), index lookup (row[0]) and dict(row). Name lookup
+    and keys() use the column names as SQLite reports them, so
+    row['COUNT(*)'] works even though the attribute is renamed (row._0).
+    As with sqlite3.Row, name lookup ignores case (row['count(*)']) and
+    the first of several columns with the same name wins.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            index = self._column_index.get(key)
+            if index is None:
+                index = self._folded_index.get(key.lower())
+            if index is None:
+                raise KeyError(key)
+            return tuple.__getitem__(self, index)
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return self._columns
+
+
+def row_type(name, fields):
+    """Create a typed row class with the given column names
+
+    Columns that are not valid identifiers get positional attribute names
+    (_0, _1, ...) but keep their own name for row['...'] lookup.
+    """
+    fields = tuple(fields)
+    base = namedtuple(name, fields, rename=True)
+    column_index = {}
+    folded_index = {}
+    for i, field in enumerate(fields):
+        column_index.setdefault(field, i)
+        folded_index.setdefault(field.lower(), i)
+    return type(name, (_RowAccess, base), {
+        "__slots__": (),
+        "_columns": fields,
+        "_column_index": column_index,
+        "_folded_index": folded_index
+    })
+
+
+# Row types of the shared queries
+CandidateRow = row_type("CandidateRow", [
+    "gene_name", "repeat_type", "repeat_count", "ensembl_exon_id", "frame_status",
+    "repeat_id", "position", "overlap_percentage", "overlap_bp",
+    "exon_position_in_transcript", "transcript_id", "transcript_name",
+    "exon_number", "block_count", "repeat_length"
+])
+
+# Row classes derived from cursor descriptions, keyed by column names
+_row_types = {}
+_row_types_lock = threading.Lock()
+
+
+def _row_type_for(columns):
+    """Return the (cached) row class for a tuple of column names"""
+    cls = _row_types.get(columns)
+    if cls is None:
+        with _row_types_lock:
+            cls = _row_types.get(columns)
+            if cls is None:
+                cls = row_type("Row", columns)
+                _row_types[columns] = cls
+    return cls
+
+
+def _typed_row_factory(cursor, row):
+    columns = tuple(column[0] for column in cursor.description)
+    return _row_type_for(columns)._make(row)
+
+
+def enable_wal(db_path):
+    """Switch the database to WAL journal mode (persistent, needs write access)
+
+    Changes the database file, so only writers should call it (see
+    populate_database.py). Returns the journal mode in effect afterwards.
+    """
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not enable WAL mode on {db_path}: {e}")
+        return None
+
+
+class QueryService:
+    """Pool of read-only connections to a repeats database
+
+    wal=True switches the database to WAL mode first, which writes to the
+    file; readers leave it False and use the database as it is.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, pool_size=DEFAULT_POOL_SIZE, wal=False):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Database file not found: {db_path}")
+
+        self.db_path = os.path.abspath(db_path)
+        self.pool_size = pool_size
+        self.journal_mode = enable_wal(self.db_path) if wal else None
+
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        """Open a new read-only connection"""
+        uri = f"file:{pathname2url(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,  # connections move between threads via the pool
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = _typed_row_factory
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("QueryService is closed")
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._created -= 1
+                    raise
+
+        # Pool exhausted: wait for another reader to hand a connection back
+        return self._pool.get()
+
+    def _release(self, conn):
+        if self._closed:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of a with-block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def fetch_all(self, sql, params=(), row_type=None):
+        """Run a query and return all rows, optionally as a given row type"""
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            if row_type is not None:
+                cursor.row_factory = lambda cur, row: row_type._make(row)
+            return cursor.fetchall()
+
+    def fetch_one(self, sql, params=(), row_type=None):
+        """Run a query and return its first row (or None)"""
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            if row_type is not None:
+                cursor.row_factory = lambda cur, row: row_type._make(row)
+            return cursor.fetchone()
+
+    def scalar(self, sql, params=()):
+        """Run a query and return the first column of its first row"""
+        row = self.fetch_one(sql, params)
+        return row[0] if row is not None else None
+
+    def iterate(self, sql, params=(), batch_size=500, row_type=None, cancel_event=None):
+        """Yield rows in batches of fetchmany() without materialising the result
+
+        The pooled connection is held until the generator is exhausted or closed.
+        If cancel_event (a threading.Event) is set, the running statement is
+        interrupted, even in the middle of a sort, and sqlite3.OperationalError
+        is raised.
+        """
+        with self.connection() as conn:
+            if cancel_event is not None:
+                conn.set_progress_handler(cancel_event.is_set, CANCEL_CHECK_INTERVAL)
+            try:
+                cursor = conn.execute(sql, params)
+                if row_type is not None:
+                    cursor.row_factory = lambda cur, row: row_type._make(row)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield from rows
+                finally:
+                    cursor.close()
+            finally:
+                if cancel_event is not None:
+                    conn.set_progress_handler(None, 0)
+
+    def table_exists(self, table_name):
+        """Check whether a table exists in the database"""
+        return self.fetch_one(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table_name,)
+        ) is not None
+
+    def close(self):
+        """Close all idle connections; borrowed ones are closed on return"""
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Streaming export of query results to CSV, TSV, Excel and Parquet.
+
+The query is re-run on the database and its rows are written to the output
+file batch by batch (QueryService.iterate), so an export never holds the
+whole result in memory. The file is written under a temporary name and only
+renamed into place once complete.
+
+Excel export needs openpyxl (write-only workbooks) and Parquet export needs
+pyarrow; each is imported only when that format is used.
+"""
+import os
+import csv
+import sqlite3
+
+# Export format -> (file dialog label, extension)
+EXPORT_FORMATS = {
+    'csv': ('CSV files', '.csv'),
+    'tsv': ('TSV files', '.tsv'),
+    'xlsx': ('Excel files', '.xlsx'),
+    'parquet': ('Parquet files', '.parquet'),
+}
+
+BATCH_SIZE = 1000
+# Rows per Excel worksheet, including the header row
+EXCEL_MAX_ROWS = 1048576
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled through its cancel event"""
+
+def format_for_path(path):
+    """Export format for a file name, by extension (CSV if unknown)"""
+    extension = os.path.splitext(path)[1].lower()
+    for fmt, (_, fmt_extension) in EXPORT_FORMATS.items():
+        if extension == fmt_extension:
+            return fmt
+    return 'csv'
+
+def column_names(service, query, params=()):
+    """Column names of a query, without running it"""
+    with service.connection() as conn:
+        cursor = conn.execute(f"SELECT * FROM (\n{query}\n) LIMIT 0", params)
+        return [column[0] for column in cursor.description]
+
+def count_rows(service, query, params=()):
+    """Number of rows a query returns"""
+    return service.scalar(f"SELECT COUNT(*) FROM (\n{query}\n)", params)
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _write_delimited(path, columns, batches, delimiter):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+
+def _write_csv(path, columns, batches):
+    _write_delimited(path, columns, batches, ',')
+
+def _write_tsv(path, columns, batches):
+    _write_delimited(path, columns, batches, '\t')
+
+def _write_xlsx(path, columns, batches):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Excel export needs the openpyxl package (pip install openpyxl)") from None
+
+    # Write-only workbooks stream rows to disk instead of keeping cell objects
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = EXCEL_MAX_ROWS
+    for batch in batches:
+        for row in batch:
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                title = "Results" if sheet is None else f"Results {len(workbook.worksheets) + 1}"
+                sheet = workbook.create_sheet(title)
+                sheet.append(columns)
+                sheet_rows = 1
+            sheet.append(list(row))
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet("Results").append(columns)
+    workbook.save(path)
+
+def storage_classes(service, query, params=(), column_count=0, cancel_event=None):
+    """SQLite storage classes (typeof) found in each column of a query's result
+
+    One pass over the result inside SQLite; returns a set per column, e.g.
+    {'integer', 'real'}, without 'null'. Columns are renamed positionally,
+    so any column names (duplicates, expressions) work.
+    """
+    if column_count == 0:
+        return []
+    names = [f"c{index}" for index in range(column_count)]
+    scan = (f"WITH q({', '.join(names)}) AS (\n{query}\n) SELECT "
+            + ", ".join(f"group_concat(DISTINCT typeof({name}))" for name in names)
+            + " FROM q")
+    rows = service.iterate(scan, params, batch_size=1, cancel_event=cancel_event)
+    try:
+        row = next(rows)
+    finally:
+        rows.close()
+    return [set(kinds.split(',')) - {'null'} if kinds else set() for kinds in row]
+
+def _arrow_type(pa, kinds):
+    """Arrow type that holds every value of a column with these storage classes"""
+    if kinds == {'integer'}:
+        return pa.int64()
+    if kinds and kinds <= {'integer', 'real'}:
+        return pa.float64()
+    if kinds == {'blob'}:
+        return pa.binary()
+    # Text, mixed columns, and columns that are NULL throughout
+    return pa.string()
+
+def _to_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+def _to_float(value):
+    return None if value is None else float(value)
+
+def _write_parquet(path, columns, batches, column_kinds=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)") from None
+
+    # The schema covers the whole result (storage_classes), not just the first batch
+    column_kinds = column_kinds or [set() for _ in columns]
+    schema = pa.schema([pa.field(name, _arrow_type(pa, kinds)) for name, kinds in zip(columns, column_kinds)])
+    converters = []
+    for field in schema:
+        if field.type == pa.string():
+            converters.append(_to_string)
+        elif field.type == pa.float64():
+            converters.append(_to_float)
+        else:
+            converters.append(None)
+
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        for batch in batches:
+            arrays = []
+            for index, field in enumerate(schema):
+                values = [row[index] for row in batch]
+                if converters[index] is not None:
+                    values = [converters[index](value) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            # From arrays, so columns with the same name are kept apart
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+    finally:
+        writer.close()
+
+_WRITERS = {
+    'csv': _write_csv,
+    'tsv': _write_tsv,
+    'xlsx': _write_xlsx,
+    'parquet': _write_parquet,
+}
+
+def export_query(service, query, params, path, fmt=None, progress=None, cancel_event=None):
+    """Stream the rows of a query into a CSV, TSV, Excel or Parquet file
+
+    progress, if given, is called as progress(rows_written) after every
+    batch. Setting cancel_event (a threading.Event) stops the export with
+    ExportCancelled and leaves no partial file behind.
+
+    Returns the number of rows written.
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    columns = column_names(service, query, params)
+    written = 0
+
+    def tracked_batches():
+        nonlocal written
+        rows = service.iterate(query, params, batch_size=BATCH_SIZE, cancel_event=cancel_event)
+        try:
+            for batch in _batches(rows, BATCH_SIZE):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExportCancelled()
+                yield batch
+                written += len(batch)
+                if progress:
+                    progress(written)
+        finally:
+            rows.close()
+
+    tmp_path = f"{path}.part"
+    try:
+        options = {}
+        if fmt == 'parquet':
+            options['column_kinds'] = storage_classes(service, query, params, len(columns), cancel_event)
+        _WRITERS[fmt](tmp_path, columns, tracked_batches(), **options)
+        os.replace(tmp_path, path)
+    except sqlite3.OperationalError:
+        # A cancel event interrupts the running statement
+        if cancel_event is not None and cancel_event.is_set():
+            raise ExportCancelled() from None
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return written